@@ -2,28 +2,38 @@ from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Response
-from fastapi_pagination import add_pagination
 from tortoise.contrib.fastapi import RegisterTortoise
 
-from discovery.routes import runs, tasks
+from discovery.core import config
+from discovery.core.compression import CompressionMiddleware
+from discovery.core.conditional import ETagMiddleware
+from discovery.routes import metrics, runs, tasks
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    from discovery.core import config
+    from discovery.db import migrations
 
     async with RegisterTortoise(
         app,
         db_url=config.database_url,
         modules={"models": ["discovery.db.models"]},
-        generate_schemas=True,
     ):
-        yield
+        if config.database_migrate:
+            await migrations.upgrade()
+        await runs.manager.relay.start()
+        try:
+            yield
+        finally:
+            await runs.manager.relay.stop()
+            await runs.manager.close()
 
 
 app: FastAPI = FastAPI(title="Discovery", version="1.0.0", lifespan=lifespan)
-
-add_pagination(app)
+# The last middleware added runs first: entity tags are computed on the
+# uncompressed body, and 304 responses are never compressed.
+app.add_middleware(ETagMiddleware, prefixes=("/runs",))
+app.add_middleware(CompressionMiddleware, minimum_size=config.compression_minimum_size)
 
 
 @app.get("/health")
@@ -33,3 +43,4 @@ async def check_health() -> Response:
 
 app.include_router(runs.router)
 app.include_router(tasks.router)
+app.include_router(metrics.router)
@@ -1,18 +1,29 @@
-from typing import Callable
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable
 
 import docker
 
 from ..core.config import DockerConfig
+from ..core.logger import logger
 from .volume import Volume
 
+# Set on the containers of the tasks, to the image they run.
+IMAGE_LABEL = "discovery.image"
+# Set on the containers of the tasks, to the node name of the worker that started
+# them, as several workers can share a Docker host.
+WORKER_LABEL = "discovery.worker"
+
 
 class Container:
     def __init__(
         self,
         docker_config: DockerConfig,
         docker_client: docker.DockerClient = None,
+        worker: str | None = None,
     ) -> None:
         self._docker_config = docker_config
+        self._worker = worker
         self._docker_client = docker_client or self._init_docker_client()
 
     def _init_docker_client(self) -> docker.DockerClient:
@@ -39,6 +50,7 @@ class Container:
         on_create: Callable | None = None,
         on_start: Callable | None = None,
         on_finish: Callable | None = None,
+        on_output: Callable[[str], Awaitable[None]] | None = None,
     ) -> None:
         self._validate_image(image)
 
@@ -47,14 +59,87 @@ class Container:
 
         container = self._create_container(image=image, command=command, volume=volume)
 
-        if on_start:
-            await on_start()
+        try:
+            if on_start:
+                await on_start()
+
+            if on_output:
+                await self._stream_output(container, on_output)
 
-        container.wait()
+            container.wait()
+        except BaseException:
+            # Interrupted, e.g. by the soft time limit of the task: the scanner
+            # must not outlive the run, nor the volume cleaned up after it.
+            self._kill(container)
+            raise
 
         if on_finish:
             await on_finish()
 
+    async def _stream_output(
+        self,
+        container: any,
+        on_output: Callable[[str], Awaitable[None]],
+    ) -> None:
+        """Forward each non-empty stdout line of the container to `on_output`.
+
+        The Docker log stream is blocking, so it is consumed in a worker thread and
+        handed over to the event loop through a queue. This keeps the loop free to
+        run timers (e.g. batch windows) while the container is still producing output.
+        """
+        loop = asyncio.get_running_loop()
+        lines: asyncio.Queue[str | None] = asyncio.Queue()
+
+        def pump() -> None:
+            buffer = b""
+            try:
+                for chunk in container.logs(
+                    stream=True, follow=True, stdout=True, stderr=False
+                ):
+                    buffer += chunk
+                    *complete, buffer = buffer.split(b"\n")
+                    for line in complete:
+                        loop.call_soon_threadsafe(
+                            lines.put_nowait, line.decode("utf-8", "replace")
+                        )
+                if buffer:
+                    loop.call_soon_threadsafe(
+                        lines.put_nowait, buffer.decode("utf-8", "replace")
+                    )
+            finally:
+                loop.call_soon_threadsafe(lines.put_nowait, None)
+
+        reader = loop.run_in_executor(None, pump)
+        while (line := await lines.get()) is not None:
+            if line := line.strip():
+                await on_output(line)
+        await reader
+
+    @staticmethod
+    def _kill(container: any) -> None:
+        try:
+            container.remove(force=True)
+        except docker.errors.DockerException as err:
+            logger.warning(f"Failed to remove container {container.id}: {err}")
+
+    def running(self) -> Counter[str]:
+        """Count the running task containers, per image.
+
+        Only the containers started by the worker are counted when it is set, all
+        the task containers of the Docker host otherwise.
+        """
+        labels = [IMAGE_LABEL]
+        if self._worker:
+            labels.append(f"{WORKER_LABEL}={self._worker}")
+        containers = self._docker_client.containers.list(
+            filters={"label": labels}, sparse=True
+        )
+        # Sparse listings skip inspecting each container, labels are top-level.
+        return Counter(
+            (container.attrs.get("Labels") or {}).get(IMAGE_LABEL, "")
+            for container in containers
+        )
+
     def _create_container(
         self,
         image: str,
@@ -62,6 +147,9 @@ class Container:
         volume: Volume,
     ) -> any:
         docker_config = self._docker_config
+        labels = {IMAGE_LABEL: image}
+        if self._worker:
+            labels[WORKER_LABEL] = self._worker
         return self._docker_client.containers.run(
             detach=True,
             image=image,
@@ -71,6 +159,7 @@ class Container:
             mem_limit=docker_config.limits.memory,
             volumes={v.host: {"bind": v.guest, "mode": v.mode.value} for v in [volume]},
             command=command,
+            labels=labels,
         )
 
     def _validate_image(self, image: str) -> None:
@@ -0,0 +1,232 @@
+import json
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from discovery.core.logger import logger
+
+PREFIX = "discovery:cache:"
+
+
+@dataclass
+class CacheMetrics:
+    hits: int = 0
+    local_hits: int = 0
+    remote_hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def snapshot(self) -> dict[str, float]:
+        return {**asdict(self), "hit_ratio": self.hit_ratio}
+
+
+class Cache:
+    def __init__(
+        self,
+        size: int = 1024,
+        ttl: float = 60.0,
+        local_ttl: float = 2.0,
+        redis: Optional[Redis] = None,
+    ) -> None:
+        """Two-tier read-through cache: an in-process LRU in front of Redis.
+
+        Values are stored as JSON and tagged with the IDs they were built from, so
+        that a change to an object invalidates every entry that contains it.
+        Entries of the in-process tier expire after `local_ttl` seconds, which
+        bounds how stale a process can be when the invalidation happened in
+        another process (e.g. a Celery worker). The Redis tier, when configured,
+        is shared and invalidated explicitly.
+
+        Args:
+            size (int, optional): Maximum number of entries of the in-process tier.
+            0 disables it. Defaults to 1024.
+            ttl (float, optional): Lifetime in seconds of the Redis entries.
+            Defaults to 60.0.
+            local_ttl (float, optional): Lifetime in seconds of the in-process
+            entries. Defaults to 2.0.
+            redis (Optional[Redis], optional): The client of the Redis tier.
+            Defaults to no Redis tier.
+        """
+        self._size = size
+        self._ttl = ttl
+        self._local_ttl = local_ttl
+        self._redis = redis
+        self._entries: OrderedDict[
+            str, tuple[float, str, tuple[str, ...]]
+        ] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+        self._metrics = CacheMetrics()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a value, from the in-process tier first then from Redis.
+
+        Args:
+            key (str): The key of the value.
+
+        Returns:
+            Optional[Any]: The decoded value, or None on a miss.
+        """
+        payload = self._get_local(key)
+        if payload is not None:
+            self._metrics.hits += 1
+            self._metrics.local_hits += 1
+            return json.loads(payload)
+
+        if self._redis is not None:
+            try:
+                payload, tags = await self._get_remote(key)
+            except RedisError as err:
+                self._metrics.errors += 1
+                logger.warning(f"Cache read failed: {err}")
+            if payload is not None:
+                self._metrics.hits += 1
+                self._metrics.remote_hits += 1
+                self._set_local(key, payload, tags)
+                return json.loads(payload)
+
+        self._metrics.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, tags: Iterable[str] = ()) -> None:
+        """Store a value in every tier.
+
+        Args:
+            key (str): The key of the value.
+            value (Any): The value, encoded to JSON with `jsonable_encoder`.
+            tags (Iterable[str], optional): The tags invalidating the value.
+        """
+        payload = json.dumps(jsonable_encoder(value), separators=(",", ":"))
+        tags = tuple(dict.fromkeys(tags))
+        self._metrics.sets += 1
+        self._set_local(key, payload, tags)
+
+        if self._redis is not None:
+            try:
+                await self._set_remote(key, payload, tags)
+            except RedisError as err:
+                self._metrics.errors += 1
+                logger.warning(f"Cache write failed: {err}")
+
+    async def invalidate(self, *tags: str) -> None:
+        """Drop every entry tagged with one of the given tags.
+
+        Args:
+            *tags (str): The tags to invalidate.
+        """
+        self._metrics.invalidations += 1
+        for tag in tags:
+            for key in self._tags.pop(tag, set()):
+                self._pop_local(key)
+
+        if self._redis is not None and tags:
+            try:
+                await self._invalidate_remote(tags)
+            except RedisError as err:
+                self._metrics.errors += 1
+                logger.warning(f"Cache invalidation failed: {err}")
+
+    def clear(self) -> None:
+        """Drop every entry of the in-process tier."""
+        self._entries.clear()
+        self._tags.clear()
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload, _ = entry
+        if expires_at < time.monotonic():
+            self._pop_local(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def _set_local(self, key: str, payload: str, tags: tuple[str, ...]) -> None:
+        if self._size <= 0:
+            return
+        self._pop_local(key)
+        self._entries[key] = (time.monotonic() + self._local_ttl, payload, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self._size:
+            self._pop_local(next(iter(self._entries)))
+            self._metrics.evictions += 1
+
+    def _pop_local(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def _get_remote(self, key: str) -> tuple[Optional[str], tuple[str, ...]]:
+        raw = await self._redis.get(PREFIX + key)
+        if raw is None:
+            return None, ()
+        entry = json.loads(raw)
+        return entry["payload"], tuple(entry["tags"])
+
+    async def _set_remote(self, key: str, payload: str, tags: tuple[str, ...]) -> None:
+        entry = json.dumps({"payload": payload, "tags": tags})
+        async with self._redis.pipeline(transaction=False) as pipeline:
+            pipeline.set(PREFIX + key, entry, ex=int(self._ttl))
+            for tag in tags:
+                pipeline.sadd(f"{PREFIX}tag:{tag}", key)
+                pipeline.expire(f"{PREFIX}tag:{tag}", int(self._ttl))
+            await pipeline.execute()
+
+    async def _invalidate_remote(self, tags: Iterable[str]) -> None:
+        tag_keys = [f"{PREFIX}tag:{tag}" for tag in tags]
+        async with self._redis.pipeline(transaction=False) as pipeline:
+            for tag_key in tag_keys:
+                pipeline.smembers(tag_key)
+            members = await pipeline.execute()
+        keys = {
+            PREFIX + (key.decode() if isinstance(key, bytes) else key)
+            for keys in members
+            for key in keys
+        }
+        await self._redis.delete(*keys, *tag_keys)
+
+    @property
+    def metrics(self) -> CacheMetrics:
+        """Return the hit, miss and invalidation counters of the cache."""
+        return self._metrics
+
+
+_cache: Optional[Cache] = None
+
+
+def get_cache() -> Cache:
+    """Return the cache of the current process, creating it from the config."""
+    global _cache
+    if _cache is None:
+        from discovery.core import config
+
+        cache_config = config.cache_config
+        _cache = Cache(
+            size=cache_config.size,
+            ttl=cache_config.ttl,
+            local_ttl=cache_config.local_ttl,
+            redis=Redis.from_url(cache_config.redis_url)
+            if cache_config.redis_url
+            else None,
+        )
+    return _cache
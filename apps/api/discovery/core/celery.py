@@ -1,29 +1,64 @@
-import asyncio
+import time
 
 from celery import Celery
-from celery.signals import worker_process_init, worker_process_shutdown
+from celery.signals import (
+    before_task_publish,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_ready,
+)
 from tortoise import Tortoise
 
-from discovery.core import config
+from discovery.core import config, loop
 from discovery.db import init as init_database
+from discovery.runs.capacity import PUBLISHED_AT
+from discovery.runs.registry import apply_prefetch_multiplier, registry
 
 celery = Celery(
     "discovery",
     broker=config.celery_config.broker_url,
     backend=config.celery_config.result_backend,
-    include=["discovery.runs.registry"],
+    include=["discovery.runs.retention"],
     broker_connection_retry_on_startup=True,
 )
+# Declares the task queues, needed before a worker selects the ones it consumes.
+registry.register_discovered_tasks(celery)
+worker_init.connect(apply_prefetch_multiplier)
+
+if config.retention_config.max_age_days > 0:
+    celery.conf.beat_schedule = {
+        "compact-runs": {
+            "task": "discovery.runs.retention.compact",
+            "schedule": config.retention_config.interval,
+        },
+    }
+
+
+@before_task_publish.connect
+def stamp_published_at(headers: dict, **kwargs) -> None:
+    headers.setdefault(PUBLISHED_AT, time.time())
+
+
+@worker_ready.connect
+def serve_metrics(sender, **kwargs) -> None:
+    if config.metrics_config.worker_port > 0:
+        from discovery.runs.capacity import serve_worker_metrics
+
+        serve_worker_metrics(sender.controller, config.metrics_config.worker_port)
 
 
 @worker_process_init.connect
 def worker_init(**kwargs) -> None:
-    asyncio.run(init_database())
+    loop.run(init_database())
 
 
 @worker_process_shutdown.connect
 def worker_shutdown(**kwargs) -> None:
-    asyncio.run(Tortoise.close_connections())
+    try:
+        loop.run(Tortoise.close_connections())
+    finally:
+        loop.close()
 
 
 __all__ = [
@@ -0,0 +1,204 @@
+import zlib
+from typing import Optional, Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+DEFAULT_MINIMUM_SIZE = 1024
+
+# Responses that never carry a body.
+BODILESS_STATUSES = (204, 304)
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk, flushing it so that it can be decoded right away."""
+
+    def finish(self) -> bytes:
+        """Return the end of the compressed stream."""
+
+
+class GzipCompressor:
+    def __init__(self, level: int = 6) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = 4) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int = 3) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def codecs() -> dict[str, type[Compressor]]:
+    """Return the content codings usable in this process, preferred first."""
+    available: dict[str, type[Compressor]] = {}
+    if zstandard is not None:
+        available["zstd"] = ZstdCompressor
+    if brotli is not None:
+        available["br"] = BrotliCompressor
+    available["gzip"] = GzipCompressor
+    return available
+
+
+def negotiate(accept_encoding: str, available: dict[str, type]) -> Optional[str]:
+    """Pick the content coding of a response from an `Accept-Encoding` header.
+
+    The coding with the highest quality wins, ties are broken by the order of
+    `available`. `*` stands for the codings the header does not name.
+
+    Args:
+        accept_encoding (str): The `Accept-Encoding` request header.
+        available (dict[str, type]): The supported codings, preferred first.
+
+    Returns:
+        Optional[str]: The coding to use, or None to send the response as is.
+    """
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            qualities[name.strip().lower()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in available:
+        quality = qualities.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = DEFAULT_MINIMUM_SIZE) -> None:
+        """Compress HTTP responses with zstd, brotli or gzip.
+
+        The coding is negotiated with `Accept-Encoding`; zstd and brotli are only
+        offered when `zstandard` and `brotli` are installed. Responses smaller than
+        `minimum_size`, bodiless responses and responses that already have a
+        `Content-Encoding` are sent as is. Streamed responses are compressed chunk
+        by chunk, each chunk being flushed so that clients can decode it without
+        waiting for the end of the stream.
+
+        Args:
+            app (ASGIApp): The application.
+            minimum_size (int, optional): The size in bytes under which responses
+            are not compressed. Defaults to 1024.
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.codecs = codecs()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.codecs)
+        if coding is None:
+            return await self.app(scope, receive, send)
+        await CompressionResponder(
+            self.app, self.codecs[coding], coding, self.minimum_size
+        )(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(
+        self,
+        app: ASGIApp,
+        codec: type[Compressor],
+        coding: str,
+        minimum_size: int,
+    ) -> None:
+        self.app = app
+        self.codec = codec
+        self.coding = coding
+        self.minimum_size = minimum_size
+        self.send: Send
+        self.start: Optional[Message] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                start["status"] in BODILESS_STATUSES
+                or "content-encoding" in headers
+                or (not more_body and len(body) < self.minimum_size)
+            ):
+                self.passthrough = True
+                await self.send(start)
+                return await self.send(message)
+
+            self.compressor = self.codec()
+            headers["Content-Encoding"] = self.coding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                return await self.send({**message, "body": body})
+            await self.send(start)
+
+        if self.passthrough:
+            return await self.send(message)
+        body = self.compressor.compress(body) if body else b""
+        if not more_body:
+            body += self.compressor.finish()
+        await self.send({**message, "body": body})
@@ -0,0 +1,141 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Clients may store the responses but must revalidate them before reuse.
+CACHE_CONTROL = "no-cache"
+
+
+def run_etag(run_id: str, updated_at: datetime) -> str:
+    """Return the entity tag of a run, which changes with its `updated_at`.
+
+    Entity tags are weak, so that they hold for every content coding of the
+    response.
+    """
+    return f'W/"{run_id}-{int(updated_at.timestamp() * 1_000_000)}"'
+
+
+def body_etag(body: bytes) -> str:
+    """Return a weak entity tag derived from a response body."""
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> dict[str, str]:
+    """Return the `ETag`, `Last-Modified` and `Cache-Control` response headers."""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def is_conditional(headers: Headers) -> bool:
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def not_modified(
+    headers: Headers, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    """Evaluate the conditional headers of a GET request (RFC 9110, 13.2.2).
+
+    `If-Modified-Since` is only used when there is no `If-None-Match`. Entity
+    tags are compared weakly.
+
+    Args:
+        headers (Headers): The request headers.
+        etag (str): The current entity tag of the resource.
+        last_modified (Optional[datetime]): The last modification of the resource.
+
+    Returns:
+        bool: True if the client's copy is current and a 304 should be returned.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        current = etag.removeprefix("W/")
+        return any(
+            tag.strip().removeprefix("W/") == current
+            for tag in if_none_match.split(",")
+        )
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a one second precision.
+    return last_modified.replace(microsecond=0) <= since
+
+
+class ETagMiddleware:
+    def __init__(self, app: ASGIApp, prefixes: tuple[str, ...] = ("/",)) -> None:
+        """Add entity tags to GET responses and answer 304 when they match.
+
+        The entity tag is a hash of the body, so the response is still built but
+        not transferred again when unchanged. Responses that already have an
+        `ETag` (e.g. derived from `Run.updated_at`), that are not 200 or that are
+        streamed are sent as is.
+
+        Args:
+            app (ASGIApp): The application.
+            prefixes (tuple[str, ...], optional): The path prefixes to tag.
+            Defaults to every path.
+        """
+        self.app = app
+        self.prefixes = prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            return await self.app(scope, receive, send)
+
+        request_headers = Headers(scope=scope)
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_tagged(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] != 200 or "etag" in headers:
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            etag = body_etag(body)
+            if not_modified(request_headers, etag):
+                return await send_not_modified(send, etag)
+            headers = MutableHeaders(raw=start["headers"])
+            headers.update(validators(etag))
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_tagged)
+
+
+async def send_not_modified(send: Send, etag: str) -> None:
+    headers = MutableHeaders(headers=validators(etag))
+    await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+    await send({"type": "http.response.body", "body": b""})
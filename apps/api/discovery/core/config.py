@@ -48,15 +48,69 @@ class S3Config:
     verify_ssl: bool
 
 
+@dataclass
+class CacheConfig:
+    redis_url: str
+    size: int
+    ttl: float
+    local_ttl: float
+
+
+@dataclass
+class SubmissionConfig:
+    idempotency_ttl: int
+    inflight_ttl: int
+
+
+@dataclass
+class QuotaConfig:
+    rate: float
+    burst: int
+    max_running: int
+    slot_ttl: int
+    retry_delay: float
+
+
+@dataclass
+class RetentionConfig:
+    max_age_days: float
+    batch_size: int
+    interval: float
+
+
+@dataclass
+class MetricsConfig:
+    worker_port: int
+
+
+@dataclass
+class WebSocketConfig:
+    max_connections: int
+    queue_size: int
+    send_timeout: float
+    heartbeat_interval: float
+    idle_timeout: float
+    max_inflight: int
+
+
 class Config:
     def __init__(self) -> None:
         self._celery_config = self._get_celery_config()
         self._docker_config = self._get_docker_config()
         self._database_url = getenv("DATABASE_URL", "")
+        self._database_migrate = getenv("DATABASE_MIGRATE", "True") == "True"
         self._base_url = getenv("BASE_URL", "http://127.0.0.1:8000")
         self._timezone = getenv("TIMEZONE", "UTC")
         self._pusher_config = self._get_pusher_config()
         self._s3_config = self._get_s3_config()
+        self._cache_config = self._get_cache_config()
+        self._retention_config = self._get_retention_config()
+        self._submission_config = self._get_submission_config()
+        self._quota_config = self._get_quota_config()
+        self._websocket_config = self._get_websocket_config()
+        self._metrics_config = self._get_metrics_config()
+        self._compression_minimum_size = int(getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+        self._redis_url = getenv("REDIS_URL", self._celery_config.broker_url)
 
     def _get_celery_config(self) -> CeleryConfig:
         return CeleryConfig(
@@ -102,6 +156,51 @@ class Config:
             verify_ssl=(getenv("AWS_S3_VERIFY_SSL", "False") == "True"),
         )
 
+    def _get_cache_config(self) -> CacheConfig:
+        return CacheConfig(
+            redis_url=getenv("CACHE_REDIS_URL", ""),
+            size=int(getenv("CACHE_SIZE", 1024)),
+            ttl=float(getenv("CACHE_TTL", 60)),
+            local_ttl=float(getenv("CACHE_LOCAL_TTL", 2)),
+        )
+
+    def _get_retention_config(self) -> RetentionConfig:
+        return RetentionConfig(
+            max_age_days=float(getenv("RETENTION_DAYS", 0)),
+            batch_size=int(getenv("RETENTION_BATCH_SIZE", 100)),
+            interval=float(getenv("RETENTION_INTERVAL", 3600)),
+        )
+
+    def _get_submission_config(self) -> SubmissionConfig:
+        return SubmissionConfig(
+            idempotency_ttl=int(getenv("IDEMPOTENCY_TTL", 86400)),
+            inflight_ttl=int(getenv("INFLIGHT_TTL", 3600)),
+        )
+
+    def _get_quota_config(self) -> QuotaConfig:
+        return QuotaConfig(
+            rate=float(getenv("RATE_LIMIT", 0)),
+            burst=int(getenv("RATE_LIMIT_BURST", 20)),
+            max_running=int(getenv("MAX_RUNNING_TASKS", 0)),
+            slot_ttl=int(getenv("RUNNING_SLOT_TTL", 3600)),
+            retry_delay=float(getenv("RUNNING_RETRY_DELAY", 5)),
+        )
+
+    def _get_websocket_config(self) -> WebSocketConfig:
+        return WebSocketConfig(
+            max_connections=int(getenv("WS_MAX_CONNECTIONS", 10000)),
+            queue_size=int(getenv("WS_QUEUE_SIZE", 256)),
+            send_timeout=float(getenv("WS_SEND_TIMEOUT", 10)),
+            heartbeat_interval=float(getenv("WS_HEARTBEAT_INTERVAL", 30)),
+            idle_timeout=float(getenv("WS_IDLE_TIMEOUT", 0)),
+            max_inflight=int(getenv("WS_MAX_INFLIGHT", 8)),
+        )
+
+    def _get_metrics_config(self) -> MetricsConfig:
+        return MetricsConfig(
+            worker_port=int(getenv("WORKER_METRICS_PORT", 0)),
+        )
+
     @property
     def celery_config(self) -> CeleryConfig:
         return self._celery_config
@@ -114,6 +213,10 @@ class Config:
     def database_url(self) -> str:
         return self._database_url
 
+    @property
+    def database_migrate(self) -> bool:
+        return self._database_migrate
+
     @property
     def base_url(self) -> str:
         return self._base_url
@@ -130,6 +233,38 @@ class Config:
     def s3_config(self) -> S3Config:
         return self._s3_config
 
+    @property
+    def cache_config(self) -> CacheConfig:
+        return self._cache_config
+
+    @property
+    def retention_config(self) -> RetentionConfig:
+        return self._retention_config
+
+    @property
+    def submission_config(self) -> SubmissionConfig:
+        return self._submission_config
+
+    @property
+    def quota_config(self) -> QuotaConfig:
+        return self._quota_config
+
+    @property
+    def websocket_config(self) -> WebSocketConfig:
+        return self._websocket_config
+
+    @property
+    def metrics_config(self) -> MetricsConfig:
+        return self._metrics_config
+
+    @property
+    def compression_minimum_size(self) -> int:
+        return self._compression_minimum_size
+
+    @property
+    def redis_url(self) -> str:
+        return self._redis_url if self._redis_url.startswith("redis") else ""
+
     def _parse_env_list(self, key: str) -> list[str]:
         value = getenv(key, None)
         return value.strip().split(",") if value else []
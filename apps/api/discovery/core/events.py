@@ -0,0 +1,273 @@
+import asyncio
+import itertools
+import json
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Hashable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from redis.asyncio import Redis
+
+from discovery.core.logger import logger
+
+# Redis pub/sub channels are named after the event channel, e.g.
+# `discovery:events:runs`.
+PREFIX = "discovery:events:"
+
+# Pusher accepts at most 10 events per batch request.
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_WINDOW = 0.1
+DEFAULT_MAX_PENDING = 1000
+
+
+@dataclass
+class Event:
+    channel: str
+    name: str
+    data: dict[str, Any]
+    # Pending events with the same channel, name and key are coalesced.
+    key: Optional[Hashable] = None
+
+    def merge(self, newer: "Event") -> "Event":
+        """Coalesce a newer event into this one.
+
+        The newer data wins, except for `status` changes (`[previous, new]`), which
+        are chained so that the coalesced event goes from the first previous status
+        to the last new one.
+
+        Args:
+            newer (Event): The newer event.
+
+        Returns:
+            Event: The coalesced event.
+        """
+        data = {**self.data, **newer.data}
+        if isinstance(self.data.get("status"), list) and isinstance(
+            newer.data.get("status"), list
+        ):
+            data["status"] = [self.data["status"][0], newer.data["status"][-1]]
+        return replace(newer, data=data)
+
+
+def encode(event: Event) -> str:
+    """Encode an event for Redis pub/sub."""
+    return json.dumps(
+        jsonable_encoder({"name": event.name, "data": event.data}),
+        separators=(",", ":"),
+    )
+
+
+def decode(payload: str | bytes) -> tuple[str, dict[str, Any]]:
+    """Decode an event published to Redis pub/sub.
+
+    Returns:
+        tuple[str, dict[str, Any]]: The event name and its data.
+    """
+    event = json.loads(payload)
+    return event["name"], event["data"]
+
+
+class Sink(ABC):
+    @abstractmethod
+    async def send(self, events: list[Event]) -> None:
+        """Deliver a batch of events."""
+
+
+class PusherSink(Sink):
+    def __init__(self) -> None:
+        """Deliver events with Pusher's batch trigger API, off the event loop."""
+        from discovery.core.pusher import get_pusher_client
+
+        self._client = get_pusher_client()
+
+    async def send(self, events: list[Event]) -> None:
+        batch = [
+            {"channel": event.channel, "name": event.name, "data": event.data}
+            for event in events
+        ]
+        await asyncio.to_thread(self._client.trigger_batch, batch)
+
+
+class RedisSink(Sink):
+    def __init__(self, redis: Redis) -> None:
+        """Publish events to Redis pub/sub, for the API instances to fan out."""
+        self._redis = redis
+
+    async def send(self, events: list[Event]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipeline:
+            for event in events:
+                pipeline.publish(PREFIX + event.channel, encode(event))
+            await pipeline.execute()
+
+
+class FanoutSink(Sink):
+    def __init__(self, sinks: list[Sink]) -> None:
+        """Deliver events to several sinks concurrently.
+
+        A failing sink does not prevent the delivery to the others; the first
+        failure is raised once every sink was tried.
+        """
+        self._sinks = sinks
+
+    async def send(self, events: list[Event]) -> None:
+        results = await asyncio.gather(
+            *(sink.send(events) for sink in self._sinks), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+
+class MemorySink(Sink):
+    def __init__(self) -> None:
+        """Keep delivered events in memory, for tests and benchmarks."""
+        self.batches: list[list[Event]] = []
+
+    async def send(self, events: list[Event]) -> None:
+        self.batches.append(list(events))
+
+    @property
+    def events(self) -> list[Event]:
+        """Return every delivered event, in delivery order."""
+        return [event for batch in self.batches for event in batch]
+
+
+@dataclass
+class DispatcherMetrics:
+    published: int = 0
+    coalesced: int = 0
+    delivered: int = 0
+    batches: int = 0
+    failed: int = 0
+    waits: int = 0
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        sink: Sink,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        window: float = DEFAULT_WINDOW,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ) -> None:
+        """Queue events and deliver them in batches from a background task.
+
+        Publishing never waits for the delivery, unless `max_pending` events are
+        already queued: the publisher then waits for a flush, which bounds the
+        memory used when the sink is slower than the producers.
+
+        Args:
+            sink (Sink): Where the events are delivered.
+            batch_size (int, optional): Maximum number of events per delivery.
+            Defaults to 10.
+            window (float, optional): Time in seconds to wait for more events
+            before a background delivery. Defaults to 0.1.
+            max_pending (int, optional): Maximum number of queued events. Defaults
+            to 1000.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        if max_pending < 1:
+            raise ValueError("Max pending must be at least 1")
+
+        self._sink = sink
+        self._batch_size = batch_size
+        self._window = window
+        self._max_pending = max_pending
+        self._pending: OrderedDict[Hashable, Event] = OrderedDict()
+        self._counter = itertools.count()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = DispatcherMetrics()
+
+    async def publish(self, event: Event) -> None:
+        """Queue an event, coalescing it with a pending event of the same key.
+
+        Args:
+            event (Event): The event to deliver.
+        """
+        self._metrics.published += 1
+        if event.key is not None:
+            key = (event.channel, event.name, event.key)
+            pending = self._pending.get(key)
+            if pending is not None:
+                self._pending[key] = pending.merge(event)
+                self._metrics.coalesced += 1
+                return
+        else:
+            key = next(self._counter)
+
+        while len(self._pending) >= self._max_pending:
+            self._metrics.waits += 1
+            await self.flush()
+        self._pending[key] = event
+        self._schedule()
+
+    async def flush(self) -> None:
+        """Deliver every queued event now."""
+        async with self._lock:
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self._batch_size:
+                    batch.append(self._pending.popitem(last=False)[1])
+                try:
+                    await self._sink.send(batch)
+                    self._metrics.batches += 1
+                    self._metrics.delivered += len(batch)
+                except Exception as err:
+                    self._metrics.failed += len(batch)
+                    logger.warning(f"Failed to deliver {len(batch)} events: {err}")
+
+    async def close(self) -> None:
+        """Stop the background task and deliver the queued events."""
+        task, self._task = self._task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        await self.flush()
+
+    def _schedule(self) -> None:
+        if (
+            self._task is None
+            or self._task.done()
+            or self._task.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._task = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self._window)
+        await self.flush()
+
+    @property
+    def pending(self) -> int:
+        """Return the number of queued events."""
+        return len(self._pending)
+
+    @property
+    def metrics(self) -> DispatcherMetrics:
+        """Return the delivery counters of the dispatcher."""
+        return self._metrics
+
+
+_dispatcher: Optional[Dispatcher] = None
+
+
+def get_dispatcher() -> Dispatcher:
+    """Return the event dispatcher of the current process.
+
+    Events are delivered to Pusher when it is configured (`PUSHER_APP_ID`) and to
+    Redis pub/sub when Redis is configured (`REDIS_URL`).
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        from discovery.core import config
+        from discovery.core.redis import get_redis_client
+
+        sinks: list[Sink] = []
+        if config.pusher_config.app_id:
+            sinks.append(PusherSink())
+        redis = get_redis_client()
+        if redis is not None:
+            sinks.append(RedisSink(redis))
+        _dispatcher = Dispatcher(sinks[0] if len(sinks) == 1 else FanoutSink(sinks))
+    return _dispatcher
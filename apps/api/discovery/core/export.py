@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterable, AsyncIterator, Sequence
+from typing import Any
+
+# Column of the items that are not objects, e.g. the domains of subfinder.
+VALUE_COLUMN = "value"
+
+
+async def ndjson(batches: AsyncIterable[list[Any]]) -> AsyncIterator[bytes]:
+    """Write items as newline-delimited JSON, one chunk per batch."""
+    async for batch in batches:
+        yield "".join(
+            json.dumps(item, separators=(",", ":")) + "\n" for item in batch
+        ).encode()
+
+
+async def csv_rows(
+    batches: AsyncIterable[list[Any]], columns: Sequence[str] = ()
+) -> AsyncIterator[bytes]:
+    """Write items as CSV with a header row, one chunk per batch.
+
+    Args:
+        batches (AsyncIterable[list[Any]]): The items, in batches.
+        columns (Sequence[str]): The columns, defaults to the keys of the first
+        item, or `value` if it is not an object. Other keys are left out.
+
+    Yields:
+        bytes: The header, then the rows of each batch. Nested values are written
+        as JSON, booleans as `true`/`false` and nulls as empty cells.
+    """
+    header = list(columns)
+    started = False
+    async for batch in batches:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not started:
+            if not header and batch:
+                first = batch[0]
+                header = list(first) if isinstance(first, dict) else [VALUE_COLUMN]
+            writer.writerow(header)
+            started = True
+        for item in batch:
+            row = item if isinstance(item, dict) else {VALUE_COLUMN: item}
+            writer.writerow([_cell(row.get(column)) for column in header])
+        yield buffer.getvalue().encode()
+    if not started and header:
+        yield _line(header)
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def _line(row: Sequence[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().encode()
@@ -0,0 +1,49 @@
+import asyncio
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop of the current process, creating it if needed.
+
+    Celery tasks are synchronous, so every coroutine they need is run on this
+    long-lived loop instead of a new one per `asyncio.run` call. Database
+    connections (and their pools) are bound to the loop they were opened on, which
+    lets them be reused across tasks.
+
+    Returns:
+        asyncio.AbstractEventLoop: The event loop of the current process.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def run(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion on the process event loop.
+
+    Args:
+        coroutine (Coroutine[Any, Any, T]): The coroutine to run.
+
+    Returns:
+        T: The result of the coroutine.
+    """
+    return get_loop().run_until_complete(coroutine)
+
+
+def close() -> None:
+    """Close the process event loop, if it was created."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        _loop.run_until_complete(_loop.shutdown_asyncgens())
+    finally:
+        _loop.close()
+        _loop = None
@@ -0,0 +1,102 @@
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+from discovery.core.logger import logger
+
+# Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclass
+class Metric:
+    """A metric family in the Prometheus text format.
+
+    Attributes:
+        name (str): The metric name, e.g. `discovery_queue_messages`.
+        type (str): `gauge` or `counter`.
+        help (str): The description of the metric.
+        samples (list[tuple[dict[str, str], float]]): The labels and value of
+        each sample.
+    """
+
+    name: str
+    type: str
+    help: str
+    samples: list[tuple[dict[str, str], float]] = field(default_factory=list)
+
+    def add(self, value: float, **labels: str) -> "Metric":
+        self.samples.append((labels, value))
+        return self
+
+
+def render(metrics: Iterable[Metric]) -> str:
+    """Render metrics in the Prometheus text format."""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {_escape(metric.help, quote=False)}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for labels, value in metric.samples:
+            lines.append(f"{metric.name}{_labels(labels)} {_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def serve(collect: Callable[[], list[Metric]], port: int) -> ThreadingHTTPServer:
+    """Serve the metrics returned by `collect` on `/metrics`, from a daemon
+    thread, for processes without an HTTP server such as workers.
+
+    Args:
+        collect (Callable[[], list[Metric]]): Returns the metrics, called on
+        each scrape.
+        port (int): The port to listen on, on all interfaces.
+
+    Returns:
+        ThreadingHTTPServer: The server, stopped with `shutdown()`.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                body = render(collect()).encode()
+            except Exception as err:
+                logger.error(f"Failed to collect metrics: {err}")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on port {server.server_address[1]}")
+    return server
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str, quote: bool = True) -> str:
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -1,6 +1,8 @@
 from enum import Enum
+from typing import TYPE_CHECKING
 
-from pusher import Pusher
+if TYPE_CHECKING:
+    from pusher import Pusher
 
 
 class Channels(str, Enum):
@@ -12,7 +14,9 @@ class Events(str, Enum):
     RUN_STATUS_CHANGED = "run.status.changed"
 
 
-def get_pusher_client() -> Pusher:
+def get_pusher_client() -> "Pusher":
+    from pusher import Pusher
+
     from discovery.core import config
 
     pusher_config = config.pusher_config
@@ -0,0 +1,18 @@
+from typing import Optional
+
+from redis.asyncio import Redis
+
+_client: Optional[Redis] = None
+
+
+def get_redis_client() -> Optional[Redis]:
+    """Return the Redis client of the current process, or None if Redis is not
+    configured (`REDIS_URL` is empty)."""
+    global _client
+    if _client is None:
+        from discovery.core import config
+
+        if not config.redis_url:
+            return None
+        _client = Redis.from_url(config.redis_url)
+    return _client
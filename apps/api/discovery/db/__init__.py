@@ -7,6 +7,8 @@ from discovery.core import config, handler
 
 
 async def init() -> None:
+    if Tortoise._inited:
+        return
     await Tortoise.init(
         db_url=config.database_url, modules={"models": ["discovery.db.models"]}
     )
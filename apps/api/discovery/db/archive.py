@@ -0,0 +1,95 @@
+import asyncio
+import gzip
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+
+def archive_key(run_id: str) -> str:
+    """Return the object key of the archive of a run."""
+    return f"runs/{run_id}/archive.json.gz"
+
+
+def encode(payload: dict[str, Any]) -> bytes:
+    """Encode an archive payload to gzipped JSON."""
+    return gzip.compress(
+        json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+    )
+
+
+def decode(data: bytes) -> dict[str, Any]:
+    """Decode an archive payload encoded by `encode`."""
+    return json.loads(gzip.decompress(data))
+
+
+class ArchiveStore(ABC):
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None:
+        """Store an archive."""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Read an archive."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete an archive."""
+
+
+class S3ArchiveStore(ArchiveStore):
+    def __init__(self, bucket_name: Optional[str] = None) -> None:
+        """Store archives in the S3 bucket used for the run files.
+
+        boto3 is synchronous, so every call runs in a thread.
+
+        Args:
+            bucket_name (Optional[str], optional): The bucket to use. Defaults to
+            the configured bucket.
+        """
+        from discovery.core.s3 import BUCKET_NAME, get_s3_client
+
+        self._bucket = get_s3_client().Bucket(bucket_name or BUCKET_NAME)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(
+            self._bucket.put_object,
+            Key=key,
+            Body=data,
+            ContentType="application/json",
+            ContentEncoding="gzip",
+        )
+
+    async def get(self, key: str) -> bytes:
+        response = await asyncio.to_thread(self._bucket.Object(key).get)
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._bucket.Object(key).delete)
+
+
+class MemoryArchiveStore(ArchiveStore):
+    def __init__(self) -> None:
+        """Keep archives in memory, for tests and local development."""
+        self.objects: dict[str, bytes] = {}
+
+    async def put(self, key: str, data: bytes) -> None:
+        self.objects[key] = data
+
+    async def get(self, key: str) -> bytes:
+        return self.objects[key]
+
+    async def delete(self, key: str) -> None:
+        self.objects.pop(key, None)
+
+
+_store: Optional[ArchiveStore] = None
+
+
+def get_archive_store() -> ArchiveStore:
+    """Return the archive store of the current process, creating it if needed."""
+    global _store
+    if _store is None:
+        _store = S3ArchiveStore()
+    return _store
@@ -0,0 +1,89 @@
+import importlib
+import pkgutil
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+
+from discovery.core.logger import logger
+
+MIGRATIONS_TABLE = "discovery_migrations"
+
+
+def discover() -> list[str]:
+    """Return the names of the available migrations, in the order they apply.
+
+    Migrations are the modules of this package named `mNNNN_<description>`. Each one
+    exposes an `upgrade(connection)` coroutine.
+
+    Returns:
+        list[str]: The migration names.
+    """
+    return sorted(
+        module.name
+        for module in pkgutil.iter_modules(__path__)
+        if module.name[:1] == "m" and module.name[1:5].isdigit()
+    )
+
+
+async def applied(connection_name: str = "default") -> list[str]:
+    """Return the names of the migrations already applied to the database.
+
+    Args:
+        connection_name (str, optional): The Tortoise connection to use.
+        Defaults to "default".
+
+    Returns:
+        list[str]: The applied migration names.
+    """
+    connection = connections.get(connection_name)
+    await _create_migrations_table(connection)
+    rows = await connection.execute_query_dict(
+        f'SELECT "name" FROM "{MIGRATIONS_TABLE}" ORDER BY "name"'
+    )
+    return [row["name"] for row in rows]
+
+
+async def upgrade(connection_name: str = "default") -> list[str]:
+    """Apply the pending migrations, each one in its own transaction.
+
+    Args:
+        connection_name (str, optional): The Tortoise connection to use.
+        Defaults to "default".
+
+    Returns:
+        list[str]: The names of the migrations applied by this call.
+    """
+    done = set(await applied(connection_name))
+    dialect = connections.get(connection_name).capabilities.dialect
+    placeholder = {"postgres": "$1", "mysql": "%s"}.get(dialect, "?")
+    names = []
+    for name in discover():
+        if name in done:
+            continue
+        module = importlib.import_module(f"{__name__}.{name}")
+        try:
+            async with in_transaction(connection_name) as connection:
+                await module.upgrade(connection)
+                await connection.execute_query(
+                    f'INSERT INTO "{MIGRATIONS_TABLE}" ("name") VALUES ({placeholder})',
+                    [name],
+                )
+        except IntegrityError:
+            logger.info(f"Migration {name} was applied concurrently, skipping.")
+            continue
+        logger.info(f"Applied migration {name}")
+        names.append(name)
+    return names
+
+
+async def _create_migrations_table(connection: BaseDBAsyncClient) -> None:
+    await connection.execute_script(
+        f'CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" ('
+        '"name" VARCHAR(255) NOT NULL PRIMARY KEY, '
+        '"applied_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)'
+    )
+
+
+__all__ = ["applied", "discover", "upgrade"]
@@ -0,0 +1,30 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from discovery.db import init
+from discovery.db.migrations import applied, discover, upgrade
+
+
+async def main(command: str) -> None:
+    await init()
+    try:
+        if command == "upgrade":
+            names = await upgrade()
+            print("\n".join(names) if names else "Database is up to date.")
+        elif command == "status":
+            done = set(await applied())
+            for name in discover():
+                print(f"[{'x' if name in done else ' '}] {name}")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m discovery.db.migrations",
+        description="Apply or inspect the database migrations.",
+    )
+    parser.add_argument("command", choices=["upgrade", "status"], nargs="?")
+    asyncio.run(main(parser.parse_args().command or "upgrade"))
@@ -0,0 +1,52 @@
+"""Create the run table.
+
+Databases created before migrations were introduced already have this table, so the
+statements are no-ops there.
+"""
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+SQLITE = """
+CREATE TABLE IF NOT EXISTS "run" (
+    "id" VARCHAR(36) NOT NULL PRIMARY KEY,
+    "name" TEXT NOT NULL,
+    "owner_id" VARCHAR(255),
+    "parameters" JSON NOT NULL,
+    "status" VARCHAR(7) NOT NULL DEFAULT 'PENDING',
+    "result" JSON NOT NULL,
+    "files" JSON NOT NULL,
+    "errors" JSON NOT NULL,
+    "started_at" TIMESTAMP,
+    "failed_at" TIMESTAMP,
+    "completed_at" TIMESTAMP,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "parent_id" VARCHAR(36) REFERENCES "run" ("id") ON DELETE CASCADE
+);
+"""
+
+POSTGRES = """
+CREATE TABLE IF NOT EXISTS "run" (
+    "id" VARCHAR(36) NOT NULL PRIMARY KEY,
+    "name" TEXT NOT NULL,
+    "owner_id" VARCHAR(255),
+    "parameters" JSONB NOT NULL,
+    "status" VARCHAR(7) NOT NULL DEFAULT 'PENDING',
+    "result" JSONB NOT NULL,
+    "files" JSONB NOT NULL,
+    "errors" JSONB NOT NULL,
+    "started_at" TIMESTAMPTZ,
+    "failed_at" TIMESTAMPTZ,
+    "completed_at" TIMESTAMPTZ,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "parent_id" VARCHAR(36) REFERENCES "run" ("id") ON DELETE CASCADE
+);
+"""
+
+
+async def upgrade(connection: BaseDBAsyncClient) -> None:
+    if connection.capabilities.dialect == "postgres":
+        await connection.execute_script(POSTGRES)
+    else:
+        await connection.execute_script(SQLITE)
@@ -0,0 +1,24 @@
+"""Index the run columns used to filter, sort and walk runs.
+
+The index names are the ones Tortoise generates for `Run.Meta.indexes`, so schemas
+created with `generate_schemas` and migrated databases are identical.
+"""
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+INDEXES = {
+    # Listing and paginating the runs of an owner, newest first.
+    "idx_run_owner_i_2883c0": ("owner_id", "created_at"),
+    # Filtering the runs of an owner by status.
+    "idx_run_owner_i_6cfd88": ("owner_id", "status"),
+    # Loading the children of a run.
+    "idx_run_parent__2a659b": ("parent_id",),
+}
+
+
+async def upgrade(connection: BaseDBAsyncClient) -> None:
+    for name, columns in INDEXES.items():
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        await connection.execute_script(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "run" ({quoted})'
+        )
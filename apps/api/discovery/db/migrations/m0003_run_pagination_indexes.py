@@ -0,0 +1,18 @@
+"""Index the keyset used to paginate runs, newest first."""
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+INDEXES = {
+    # Paginating all runs over (created_at, id).
+    "idx_run_created_c584c4": ("created_at", "id"),
+    # Paginating the runs filtered by status alone.
+    "idx_run_status_d437ac": ("status", "created_at"),
+}
+
+
+async def upgrade(connection: BaseDBAsyncClient) -> None:
+    for name, columns in INDEXES.items():
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        await connection.execute_script(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "run" ({quoted})'
+        )
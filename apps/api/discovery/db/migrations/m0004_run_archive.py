@@ -0,0 +1,16 @@
+"""Add the pointer to the archived result and errors of a run."""
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+
+async def upgrade(connection: BaseDBAsyncClient) -> None:
+    if connection.capabilities.dialect == "postgres":
+        await connection.execute_script(
+            'ALTER TABLE "run" ADD COLUMN IF NOT EXISTS "archive" JSONB'
+        )
+        return
+
+    # SQLite has no ADD COLUMN IF NOT EXISTS.
+    columns = await connection.execute_query_dict('PRAGMA table_info("run")')
+    if all(column["name"] != "archive" for column in columns):
+        await connection.execute_script('ALTER TABLE "run" ADD COLUMN "archive" JSON')
@@ -28,8 +28,60 @@ class Run(Model):
     result = fields.JSONField(default={})
     files = fields.JSONField(default=[])
     errors = fields.JSONField(default=[])
+    # Pointer to the result and errors moved to object storage by the retention job.
+    archive = fields.JSONField(null=True)
     started_at = fields.DatetimeField(null=True)
     failed_at = fields.DatetimeField(null=True)
     completed_at = fields.DatetimeField(null=True)
     created_at = DatetimeField(auto_now_add=True)
     updated_at = DatetimeField(auto_now=True)
+
+    class Meta:
+        # Keep in sync with discovery.db.migrations.
+        indexes = (
+            ("owner_id", "created_at"),
+            ("owner_id", "status"),
+            ("parent_id",),
+            ("created_at", "id"),
+            ("status", "created_at"),
+        )
+
+
+# Counters maintained incrementally by the runs repository on every creation and
+# status transition, so statistics never scan the run table.
+
+
+class RunStatusCount(Model):
+    owner_id = fields.CharField(max_length=255, default="")
+    name = fields.TextField()
+    status = fields.CharEnumField(RunStatus)
+    count = fields.IntField(default=0)
+
+    class Meta:
+        table = "run_status_count"
+        unique_together = (("owner_id", "name", "status"),)
+
+
+class RunDailyCount(Model):
+    owner_id = fields.CharField(max_length=255, default="")
+    name = fields.TextField()
+    day = fields.DateField()
+    created = fields.IntField(default=0)
+    succeeded = fields.IntField(default=0)
+    failed = fields.IntField(default=0)
+
+    class Meta:
+        table = "run_daily_count"
+        unique_together = (("owner_id", "name", "day"),)
+
+
+class RunDurationCount(Model):
+    owner_id = fields.CharField(max_length=255, default="")
+    name = fields.TextField()
+    # Upper bound of the duration bucket, in seconds.
+    bucket = fields.IntField()
+    count = fields.IntField(default=0)
+
+    class Meta:
+        table = "run_duration_count"
+        unique_together = (("owner_id", "name", "bucket"),)
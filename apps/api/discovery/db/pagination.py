@@ -0,0 +1,86 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Generic, Optional, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Total(str, Enum):
+    NONE = "none"
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class InvalidCursorError(ValueError):
+    def __init__(self) -> None:
+        self.message = "Invalid cursor."
+        super().__init__(self.message)
+
+
+def encode_cursor(created_at: datetime, _id: str) -> str:
+    """Encode the position of an item into an opaque cursor.
+
+    Args:
+        created_at (datetime): The creation date of the item.
+        _id (str): The ID of the item.
+
+    Returns:
+        str: The URL-safe cursor.
+    """
+    payload = json.dumps([created_at.isoformat(), _id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor created by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor to decode.
+
+    Returns:
+        tuple[datetime, str]: The creation date and ID of the item.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, _id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(_id)
+    except (binascii.Error, TypeError, ValueError) as err:
+        raise InvalidCursorError from err
+
+
+def estimated_rows(plan: Any) -> Optional[int]:
+    """Read the estimated number of rows from a Postgres JSON query plan.
+
+    Args:
+        plan (Any): The result of `EXPLAIN (FORMAT JSON)`.
+
+    Returns:
+        Optional[int]: The planner estimate, or None if it is not available.
+    """
+    try:
+        if isinstance(plan, list) and (
+            not isinstance(plan[0], dict) or "QUERY PLAN" in plan[0]
+        ):
+            plan = plan[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
@@ -1,10 +1,98 @@
-from typing import Literal, NotRequired, TypedDict, Unpack
+import asyncio
+import json
+import re
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Literal, NotRequired, Optional, Sequence, TypedDict, Unpack
 
-from fastapi_pagination.ext.tortoise import paginate
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import RawSQL
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
 
+from discovery.core.cache import Cache, get_cache
+
+from ..archive import ArchiveStore, decode, get_archive_store
 from ..models import Run
 from ..models import RunStatus as Status
+from ..pagination import CursorPage, Total
 from ..repository import Repository as BaseRepository
+from .stats import Repository as StatsRepository
+
+# Statuses a run may move to, mapped to the statuses it may come from. The order of
+# the sources is the order in which they are tried.
+TRANSITIONS: dict[Status, tuple[Status, ...]] = {
+    Status.RUNNING: (Status.PENDING,),
+    Status.SUCCESS: (Status.RUNNING,),
+    Status.FAILED: (Status.RUNNING, Status.PENDING),
+}
+
+# Scalar columns of a run, returned by transitions and listings. The JSON blobs are
+# left out on purpose.
+SCALAR_COLUMNS = (
+    "id",
+    "name",
+    "owner_id",
+    "parent_id",
+    "status",
+    "started_at",
+    "failed_at",
+    "completed_at",
+    "created_at",
+    "updated_at",
+)
+RETURNING_COLUMNS = SCALAR_COLUMNS
+
+# Sizes of the JSON columns, computed by the database instead of loading them. The
+# sizes of archived columns are read from the archive pointer; errors appended
+# after archiving stay in the row and are counted on top.
+SIZE_EXPRESSIONS = {
+    "sqlite": {
+        "result_size": "COALESCE(json_extract(\"archive\", '$.result_size'), "
+        'length("result"))',
+        "files_count": 'json_array_length("files")',
+        "errors_count": "COALESCE(json_extract(\"archive\", '$.errors_count'), 0) "
+        '+ json_array_length("errors")',
+    },
+    "postgres": {
+        "result_size": "COALESCE((\"archive\"->>'result_size')::int, "
+        'octet_length("result"::text))',
+        "files_count": 'jsonb_array_length("files")',
+        "errors_count": "COALESCE((\"archive\"->>'errors_count')::int, 0) "
+        '+ jsonb_array_length("errors")',
+    },
+}
+
+SUMMARY_FIELDS = (*SCALAR_COLUMNS, "result_size", "files_count", "errors_count")
+SELECTABLE_FIELDS = (*SUMMARY_FIELDS, "parameters")
+TREE_FIELDS = (*SELECTABLE_FIELDS, "result", "files", "errors")
+
+MAX_TREE_DEPTH = 10
+
+# Items of a run result yielded at a time when streaming it.
+RESULT_BATCH_SIZE = 500
+
+# Items of a run result read per query when streaming it. Each query expands the
+# result again, so reading N items costs about N / RESULT_QUERY_SIZE passes over
+# the stored result; a larger size means fewer passes but more items in memory.
+RESULT_QUERY_SIZE = 10000
+
+# Keys of the result items that can be selected or filtered on.
+RESULT_FIELD = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Key of the first list of a result object, e.g. `items` or `domains`, computed by
+# the database instead of loading the result.
+COLLECTION_EXPRESSIONS = {
+    "sqlite": '(SELECT "key" FROM json_each(CASE WHEN json_type("result") = '
+    "'object' THEN \"result\" END) WHERE \"type\" = 'array' LIMIT 1)",
+    "postgres": '(SELECT "key" FROM jsonb_each(CASE WHEN jsonb_typeof("result") '
+    "= 'object' THEN \"result\" END) WHERE jsonb_typeof(\"value\") = 'array' "
+    "LIMIT 1)",
+}
 
 
 class FilterableColumns(TypedDict):
@@ -13,6 +101,67 @@ class FilterableColumns(TypedDict):
     parent_id: NotRequired[str] = None
 
 
+class RunSummary(BaseModel):
+    id: str
+    name: Optional[str] = None
+    owner_id: Optional[str] = None
+    parent_id: Optional[str] = None
+    status: Optional[Status] = None
+    parameters: Optional[dict[str, Any]] = None
+    started_at: Optional[datetime] = None
+    failed_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    result_size: Optional[int] = None
+    files_count: Optional[int] = None
+    errors_count: Optional[int] = None
+
+
+class RunTreeNode(RunSummary):
+    depth: int
+    result: Optional[dict[str, Any]] = None
+    files: Optional[list[Any]] = None
+    errors: Optional[list[Any]] = None
+
+
+class InvalidFieldsError(ValueError):
+    def __init__(
+        self, fields: Sequence[str], available: Sequence[str] = SELECTABLE_FIELDS
+    ) -> None:
+        self.message = (
+            f"Invalid fields: {', '.join(fields)}. "
+            f"Available fields: {', '.join(available)}."
+        )
+        super().__init__(self.message)
+
+
+class InvalidResultFieldsError(ValueError):
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.message = (
+            f"Invalid result fields: {', '.join(fields)}. Fields are keys of the "
+            "result items, made of letters, digits, `_` and `-`."
+        )
+        super().__init__(self.message)
+
+
+@dataclass
+class ResultSource:
+    run_id: str
+    # The key of the list of items in the result, None if there is none.
+    collection: Optional[str]
+    # The archive pointer of the run, if its result was archived.
+    archive: Optional[dict[str, Any]] = None
+    fields: Sequence[str] = ()
+    filters: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Transition:
+    run: Run
+    previous: Status
+
+
 class Repository(
     BaseRepository[
         Run,
@@ -32,13 +181,677 @@ class Repository(
         FilterableColumns,
     ],
 ):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        archive_store: Optional[ArchiveStore] = None,
+    ) -> None:
         super().__init__(Run)
+        self._cache = cache if cache is not None else get_cache()
+        self._archive_store = archive_store
+        self._stats = StatsRepository()
+
+    async def add(self, *runs: Run) -> None:
+        """Save new runs and count them in the run statistics, in one transaction.
+
+        Several runs are inserted with a single bulk INSERT.
+
+        Args:
+            *runs (Run): The runs to save.
+        """
+        async with in_transaction() as connection:
+            if len(runs) == 1:
+                await runs[0].save(using_db=connection)
+            else:
+                await self.model.bulk_create(runs, using_db=connection)
+            await self.stats.record_created(runs, connection)
+
+    async def get_by_id(self, _id: str) -> Optional[Run]:
+        """Get a run by its ID, through the cache.
+
+        Args:
+            _id (str): The ID of the run.
+
+        Returns:
+            Optional[Run]: The run or None if not found, with its archived result
+            and errors read back from object storage. Missing runs are not cached.
+        """
+        key = f"run:{_id}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            run = self.model(**self._decode(cached))
+            run._saved_in_db = True
+            return run
+
+        run = await super().get_by_id(_id)
+        if run is not None:
+            await self.rehydrate(run)
+            columns = self.model._meta.fields_db_projection
+            await self.cache.set(
+                key, {field: getattr(run, field) for field in columns}, tags=[_id]
+            )
+        return run
+
+    async def last_modified(self, _id: str) -> Optional[datetime]:
+        """Get when a run was last modified, without reading its result.
+
+        Args:
+            _id (str): The ID of the run.
+
+        Returns:
+            Optional[datetime]: The `updated_at` of the run, or None if not found.
+        """
+        return (
+            await self.model.filter(id=_id).first().values_list("updated_at", flat=True)
+        )
+
+    async def result_source(
+        self,
+        _id: str,
+        owner_id: Optional[str] = None,
+        fields: Sequence[str] = (),
+        filters: Optional[dict[str, str]] = None,
+    ) -> Optional[ResultSource]:
+        """Locate the items of a run result, without reading the result.
+
+        The items are the first list of the result object, e.g. the `items` of
+        httpx or the `domains` of subfinder.
+
+        Args:
+            _id (str): The ID of the run.
+            owner_id (Optional[str]): Only return the run if it belongs to this
+            owner.
+            fields (Sequence[str]): The keys of the items to select, all of them if
+            empty. Items that are not objects are returned as is.
+            filters (Optional[dict[str, str]]): Only return the object items whose
+            keys have these values, compared as text (`true`, `false`, `200`...).
+
+        Returns:
+            Optional[ResultSource]: Where to read the items from with `results`, or
+            None if the run is not found.
+
+        Raises:
+            InvalidResultFieldsError: If a field or filter key is malformed.
+        """
+        filters = filters or {}
+        invalid = [key for key in (*fields, *filters) if not RESULT_FIELD.match(key)]
+        if invalid:
+            raise InvalidResultFieldsError(invalid)
+
+        db: BaseDBAsyncClient = self.model._meta.db
+        dialect = self._result_dialect(db)
+        executor = db.executor_class(model=self.model, db=db)
+        values: list[Any] = []
+
+        def parameter(value: Any) -> str:
+            values.append(value)
+            return str(executor.parameter(len(values) - 1))
+
+        conditions = [f'"id" = {parameter(_id)}']
+        if owner_id is not None:
+            conditions.append(f'"owner_id" = {parameter(owner_id)}')
+        query = (
+            f'SELECT "archive", {COLLECTION_EXPRESSIONS[dialect]} AS "collection" '
+            f'FROM "{self.model._meta.db_table}" WHERE {" AND ".join(conditions)}'
+        )
+        rows = await db.execute_query_dict(query, values)
+        if not rows:
+            return None
+        row = self._decode(rows[0])
+        return ResultSource(
+            run_id=_id,
+            collection=row["collection"],
+            archive=row["archive"],
+            fields=list(dict.fromkeys(fields)),
+            filters=filters,
+        )
+
+    async def results(
+        self,
+        source: ResultSource,
+        batch_size: int = RESULT_BATCH_SIZE,
+        query_size: int = RESULT_QUERY_SIZE,
+    ) -> AsyncIterator[list[Any]]:
+        """Read the items of a run result in batches.
+
+        Items are read by keyset queries on their position that project and filter
+        them in the database, `query_size` at a time. Each query releases its
+        connection before the items are yielded, so a slow reader never holds a
+        connection, and at most `query_size` items are held in memory. Archived
+        results are read back from object storage at once, then projected and
+        filtered in batches.
+
+        Args:
+            source (ResultSource): The items to read, from `result_source`.
+            batch_size (int): The maximum number of items per batch. Defaults to
+            RESULT_BATCH_SIZE.
+            query_size (int): The maximum number of items per query. Defaults to
+            RESULT_QUERY_SIZE.
+
+        Yields:
+            list[Any]: The next items, in the order of the result.
+        """
+        if source.archive:
+            async for batch in self._archived_results(source, batch_size):
+                yield batch
+            return
+        if source.collection is None:
+            return
+
+        db: BaseDBAsyncClient = self.model._meta.db
+        query_size = max(query_size, batch_size)
+        position = -1
+        while True:
+            query, values = self._results_query(db, source, position, query_size)
+            rows = await db.execute_query_dict(query, values)
+            for start in range(0, len(rows), batch_size):
+                yield [
+                    _result_item(row["value"])
+                    for row in rows[start : start + batch_size]
+                ]
+            if len(rows) < query_size:
+                return
+            position = rows[-1]["position"]
+
+    async def rehydrate(self, run: Run) -> Run:
+        """Read back the archived result and errors of a run, if any.
+
+        The run is not saved: its row keeps pointing to the archive. Errors
+        appended after archiving stay in the row and follow the archived ones.
+
+        Args:
+            run (Run): The run to rehydrate.
+
+        Returns:
+            Run: The same run.
+        """
+        if run.archive:
+            payload = decode(await self.archive_store.get(run.archive["key"]))
+            run.result = payload["result"]
+            run.errors = payload["errors"] + (run.errors or [])
+        return run
+
+    async def archivable(self, before: datetime, size: int = 100) -> list[Run]:
+        """Get the finished runs created before a date that are not archived yet.
+
+        Args:
+            before (datetime): Only return runs created before this date.
+            size (int): The maximum number of runs to return. Defaults to 100.
+
+        Returns:
+            list[Run]: The runs, oldest first.
+        """
+        return (
+            await self.model.filter(
+                status__in=[Status.SUCCESS, Status.FAILED],
+                archive__isnull=True,
+                created_at__lt=before,
+            )
+            .order_by("created_at", "id")
+            .limit(size)
+        )
+
+    async def archive(self, run: Run, pointer: dict[str, Any]) -> bool:
+        """Replace the result and errors of a run by a pointer to their archive.
+
+        The update only applies if the run was not modified since it was read, so
+        errors appended in the meantime are never lost.
+
+        Args:
+            run (Run): The run, as read before archiving it.
+            pointer (dict[str, Any]): The archive key and summary.
+
+        Returns:
+            bool: True if the run was updated, False otherwise.
+        """
+        updated = await self.model.filter(
+            id=run.id, archive__isnull=True, updated_at=run.updated_at
+        ).update(result={}, errors=[], archive=pointer)
+        return updated > 0
+
+    async def invalidate(self, *ids: Optional[str]) -> None:
+        """Drop the cached runs and trees containing any of the given runs.
+
+        Args:
+            *ids (Optional[str]): The IDs of the changed runs. None is ignored.
+        """
+        tags = [_id for _id in ids if _id is not None]
+        if tags:
+            await self.cache.invalidate(*tags)
 
     async def filter_by(
         self,
+        cursor: Optional[str] = None,
+        size: int = 50,
+        total: Total = Total.NONE,
+        fields: Sequence[str] = SUMMARY_FIELDS,
         **filters: Unpack[FilterableColumns],
-    ) -> list[Run]:
+    ) -> CursorPage[dict[str, Any]]:
         expressions = self.generate_expressions(join_type="AND", **filters)
 
-        return await paginate(self.model.filter(expressions).all())
+        return await self.summaries(
+            self.model.filter(expressions),
+            cursor=cursor,
+            size=size,
+            total=total,
+            fields=fields,
+        )
+
+    async def summaries(
+        self,
+        query: Optional[QuerySet[Run]] = None,
+        cursor: Optional[str] = None,
+        size: int = 50,
+        total: Total = Total.NONE,
+        fields: Sequence[str] = SUMMARY_FIELDS,
+    ) -> CursorPage[dict[str, Any]]:
+        """Paginate runs without loading their JSON columns.
+
+        Args:
+            query (Optional[QuerySet[Run]]): The query to paginate. Defaults to all
+            runs.
+            cursor (Optional[str]): The `next_cursor` of the previous page.
+            size (int): The maximum number of runs in the page. Defaults to 50.
+            total (Total): Whether to count the matching runs. Defaults to
+            Total.NONE.
+            fields (Sequence[str]): The fields to select, among SELECTABLE_FIELDS.
+            Defaults to SUMMARY_FIELDS.
+
+        Returns:
+            CursorPage[dict[str, Any]]: The page of run summaries.
+
+        Raises:
+            InvalidFieldsError: If a field is not selectable.
+            InvalidCursorError: If the cursor is malformed.
+        """
+        query = query if query is not None else self.model.all()
+        return await self.paginate(
+            self.project(query, fields),
+            cursor=cursor,
+            size=size,
+            total=total,
+            fields=fields,
+        )
+
+    def project(self, query: QuerySet[Run], fields: Sequence[str]) -> QuerySet[Run]:
+        """Annotate a query with the JSON sizes among the requested fields.
+
+        Args:
+            query (QuerySet[Run]): The query to annotate.
+            fields (Sequence[str]): The requested fields.
+
+        Returns:
+            QuerySet[Run]: The annotated query.
+
+        Raises:
+            InvalidFieldsError: If a field is not selectable.
+        """
+        self._validate_fields(fields, SELECTABLE_FIELDS)
+        expressions = self._size_expressions()
+        annotations = {
+            field: RawSQL(expressions[field])
+            for field in fields
+            if field in expressions
+        }
+        return query.annotate(**annotations) if annotations else query
+
+    async def tree(
+        self,
+        _id: str,
+        owner_id: Optional[str] = None,
+        depth: int = MAX_TREE_DEPTH,
+        fields: Sequence[str] = SUMMARY_FIELDS,
+    ) -> list[dict[str, Any]]:
+        """Get a run and all its descendants with a single recursive query.
+
+        Args:
+            _id (str): The ID of the root run.
+            owner_id (Optional[str]): Only return the tree if the root run belongs
+            to this owner.
+            depth (int): How many levels of descendants to walk, capped to
+            MAX_TREE_DEPTH. 0 only returns the root run. Defaults to MAX_TREE_DEPTH.
+            fields (Sequence[str]): The fields to select, among TREE_FIELDS. `id`,
+            `parent_id`, `created_at` and `depth` are always selected. Defaults to
+            SUMMARY_FIELDS. The `result` and `errors` of archived runs are read
+            back from object storage.
+
+        Returns:
+            list[dict[str, Any]]: The runs of the tree ordered by depth, then by
+            creation date, or an empty list if the root run is not found. Trees are
+            cached and invalidated when any of their runs changes.
+
+        Raises:
+            InvalidFieldsError: If a field is not selectable.
+        """
+        self._validate_fields(fields, TREE_FIELDS)
+        depth = min(max(depth, 0), MAX_TREE_DEPTH)
+        key = f"tree:{_id}:{owner_id or ''}:{depth}:{','.join(fields)}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return [self._decode(row) for row in cached]
+
+        db: BaseDBAsyncClient = self.model._meta.db
+        executor = db.executor_class(model=self.model, db=db)
+        table = self.model._meta.db_table
+        expressions = self._size_expressions()
+        values: list[Any] = []
+
+        def parameter(value: Any) -> str:
+            values.append(value)
+            return str(executor.parameter(len(values) - 1))
+
+        archived = [field for field in ("result", "errors") if field in fields]
+        selected = ["id", "parent_id", "created_at", *fields]
+        columns = ", ".join(
+            f'{expressions[field]} AS "{field}"'
+            if field in expressions
+            else f'"{table}"."{field}"'
+            for field in dict.fromkeys([*selected, "archive"] if archived else selected)
+        )
+        anchor = [f'"id" = {parameter(_id)}']
+        if owner_id is not None:
+            anchor.append(f'"owner_id" = {parameter(owner_id)}')
+        max_depth = parameter(depth)
+
+        query = (
+            f'WITH RECURSIVE "tree" ("node", "depth") AS ('
+            f'SELECT "id", 0 FROM "{table}" WHERE {" AND ".join(anchor)} '
+            "UNION ALL "
+            f'SELECT "child"."id", "tree"."depth" + 1 FROM "{table}" AS "child" '
+            'JOIN "tree" ON "child"."parent_id" = "tree"."node" '
+            f'WHERE "tree"."depth" < {max_depth}) '
+            f'SELECT {columns}, "tree"."depth" AS "depth" FROM "tree" '
+            f'JOIN "{table}" ON "{table}"."id" = "tree"."node" '
+            f'ORDER BY "tree"."depth", "{table}"."created_at", "{table}"."id"'
+        )
+        rows = [self._decode(row) for row in await db.execute_query_dict(query, values)]
+        if archived:
+            await self._rehydrate_rows(rows, archived)
+        if rows:
+            await self.cache.set(key, rows, tags=[row["id"] for row in rows])
+        return rows
+
+    async def transition(
+        self,
+        _id: str,
+        status: Status,
+        error: Optional[Any] = None,
+        **changes: Any,
+    ) -> Optional[Transition]:
+        """Move a run to a new status if its current status allows it.
+
+        Every attempt is a single conditional `UPDATE ... WHERE id = ? AND status = ?
+        RETURNING ...` statement, so concurrent transitions cannot overwrite each
+        other. Only `status`, `updated_at` and the given changes are written, and
+        the error, if any, is appended to `errors` by the database.
+
+        Args:
+            _id (str): The ID of the run.
+            status (Status): The status to move the run to.
+            error (Optional[Any]): An error entry to append to the run errors.
+            **changes: Other columns to update along with the status.
+
+        The run statistics are updated in the same transaction.
+
+        Returns:
+            Optional[Transition]: The updated run (without its JSON columns) and its
+            previous status, or None if the run does not exist or its status does
+            not allow the transition.
+        """
+        for source in TRANSITIONS[status]:
+            async with in_transaction() as connection:
+                row = await self._update_returning(
+                    _id, source, status=status, error=error, **changes
+                )
+                if row is not None:
+                    run = self.model._init_from_db(**row)
+                    await self.stats.record_transition(run, source, connection)
+                    return Transition(run=run, previous=source)
+        return None
+
+    async def append_error(self, _id: str, error: Any) -> bool:
+        """Append an error entry to a run without changing its status.
+
+        Args:
+            _id (str): The ID of the run.
+            error (Any): The error entry to append.
+
+        Returns:
+            bool: True if the run exists, False otherwise.
+        """
+        return await self._update_returning(_id, None, error=error) is not None
+
+    @property
+    def archive_store(self) -> ArchiveStore:
+        """Return the object storage of the archived runs."""
+        if self._archive_store is None:
+            self._archive_store = get_archive_store()
+        return self._archive_store
+
+    @property
+    def stats(self) -> StatsRepository:
+        """Return the repository of the run statistics."""
+        return self._stats
+
+    @property
+    def cache(self) -> Cache:
+        """Return the cache of the run reads."""
+        return self._cache
+
+    async def _rehydrate_rows(
+        self, rows: list[dict[str, Any]], fields: Sequence[str]
+    ) -> None:
+        # Like `rehydrate`, for rows selected with their `archive` pointer, which
+        # is dropped from every row.
+        pointers = [(row, row.pop("archive")) for row in rows]
+        archived = [(row, pointer) for row, pointer in pointers if pointer]
+        payloads = await asyncio.gather(
+            *(self.archive_store.get(pointer["key"]) for _, pointer in archived)
+        )
+        for (row, _), payload in zip(archived, payloads):
+            payload = decode(payload)
+            for name in fields:
+                row[name] = (
+                    payload[name] + (row[name] or [])
+                    if name == "errors"
+                    else payload[name]
+                )
+
+    def _decode(self, row: dict[str, Any]) -> dict[str, Any]:
+        fields_map = self.model._meta.fields_map
+        return {
+            key: fields_map[key].to_python_value(value) if key in fields_map else value
+            for key, value in row.items()
+        }
+
+    def _validate_fields(self, fields: Sequence[str], available: Sequence[str]) -> None:
+        invalid = [field for field in fields if field not in available]
+        if invalid:
+            raise InvalidFieldsError(invalid, available)
+
+    def _result_dialect(self, db: BaseDBAsyncClient) -> str:
+        dialect = db.capabilities.dialect
+        if dialect not in ("sqlite", "postgres"):
+            raise NotImplementedError(f"Result streaming is not supported on {dialect}")
+        return dialect
+
+    def _results_query(
+        self,
+        db: BaseDBAsyncClient,
+        source: ResultSource,
+        position: int,
+        size: int,
+    ) -> tuple[str, list[Any]]:
+        dialect = self._result_dialect(db)
+        executor = db.executor_class(model=self.model, db=db)
+        table = self.model._meta.db_table
+        values: list[Any] = []
+
+        def parameter(value: Any, cast: str = "") -> str:
+            values.append(value)
+            return str(executor.parameter(len(values) - 1)) + cast
+
+        # The parameters are numbered in the order of the query text.
+        if dialect == "sqlite":
+            position_column = '"item"."key"'
+            value = 'json_quote("item"."value")'
+            if source.fields:
+                pairs = ", ".join(
+                    f'{parameter(key)}, "item"."value" -> {parameter(_path(key))}'
+                    for key in source.fields
+                )
+                value = (
+                    f'CASE WHEN "item"."type" = \'object\' THEN json_object({pairs}) '
+                    f"ELSE {value} END"
+                )
+            elements = (
+                f'json_each("{table}"."result", {parameter(_path(source.collection))})'
+                ' AS "item"'
+            )
+        else:
+            position_column = '"item"."position"'
+            value = '"item"."value"'
+            if source.fields:
+                pairs = ", ".join(
+                    f'{parameter(key, "::text")}, '
+                    f'"item"."value" -> {parameter(key, "::text")}'
+                    for key in source.fields
+                )
+                value = (
+                    'CASE WHEN jsonb_typeof("item"."value") = \'object\' THEN '
+                    f"jsonb_build_object({pairs}) ELSE {value} END"
+                )
+            elements = (
+                f'jsonb_array_elements("{table}"."result" -> '
+                f"{parameter(source.collection, '::text')}) WITH ORDINALITY "
+                'AS "item" ("value", "position")'
+            )
+
+        conditions = [
+            f'"{table}"."id" = {parameter(source.run_id)}',
+            f"{position_column} > {parameter(position)}",
+        ]
+        if source.filters:
+            # Filters only match objects, the other items have no keys.
+            if dialect == "sqlite":
+                conditions.append('"item"."type" = \'object\'')
+                conditions.extend(
+                    f'CASE json_type("item"."value", {parameter(_path(key))}) '
+                    "WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' "
+                    f'ELSE CAST("item"."value" ->> {parameter(_path(key))} AS TEXT) '
+                    f"END = {parameter(expected)}"
+                    for key, expected in source.filters.items()
+                )
+            else:
+                conditions.append('jsonb_typeof("item"."value") = \'object\'')
+                conditions.extend(
+                    f'"item"."value" ->> {parameter(key, "::text")} = '
+                    f"{parameter(expected, '::text')}"
+                    for key, expected in source.filters.items()
+                )
+
+        query = (
+            f'SELECT {position_column} AS "position", {value} AS "value" '
+            f'FROM "{table}", {elements} WHERE {" AND ".join(conditions)} '
+            f"ORDER BY {position_column} LIMIT {parameter(size)}"
+        )
+        return query, values
+
+    async def _archived_results(
+        self, source: ResultSource, batch_size: int
+    ) -> AsyncIterator[list[Any]]:
+        result = decode(await self.archive_store.get(source.archive["key"]))["result"]
+        items = (
+            next((value for value in result.values() if isinstance(value, list)), [])
+            if isinstance(result, dict)
+            else []
+        )
+        batch: list[Any] = []
+        for item in items:
+            if source.filters and not (
+                isinstance(item, dict)
+                and all(
+                    _as_text(item.get(key)) == expected
+                    for key, expected in source.filters.items()
+                )
+            ):
+                continue
+            if source.fields and isinstance(item, dict):
+                item = {key: item.get(key) for key in source.fields}
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _size_expressions(self) -> dict[str, str]:
+        dialect = self.model._meta.db.capabilities.dialect
+        return SIZE_EXPRESSIONS.get(dialect, SIZE_EXPRESSIONS["postgres"])
+
+    async def _update_returning(
+        self,
+        _id: str,
+        source: Optional[Status],
+        error: Optional[Any] = None,
+        **changes: Any,
+    ) -> Optional[dict[str, Any]]:
+        db: BaseDBAsyncClient = self.model._meta.db
+        dialect = db.capabilities.dialect
+        if dialect not in ("sqlite", "postgres"):
+            raise NotImplementedError(f"Transitions are not supported on {dialect}")
+
+        executor = db.executor_class(model=self.model, db=db)
+        changes["updated_at"] = timezone.now()
+        values: list[Any] = []
+
+        def parameter(value: Any) -> str:
+            values.append(value)
+            return str(executor.parameter(len(values) - 1))
+
+        assignments = [
+            f'"{column}" = ' + parameter(executor.column_map[column](value, self.model))
+            for column, value in changes.items()
+        ]
+        if error is not None:
+            encoded = parameter(json.dumps(jsonable_encoder(error)))
+            assignments.append(
+                "\"errors\" = json_insert(COALESCE(\"errors\", '[]'), '$[#]', "
+                f"json({encoded}))"
+                if dialect == "sqlite"
+                else '"errors" = COALESCE("errors", \'[]\'::jsonb) || '
+                f"jsonb_build_array({encoded}::jsonb)"
+            )
+
+        conditions = [f'"id" = {parameter(_id)}']
+        if source is not None:
+            conditions.append(f'"status" = {parameter(source.value)}')
+
+        returning = ", ".join(f'"{column}"' for column in RETURNING_COLUMNS)
+        query = (
+            f'UPDATE "{self.model._meta.db_table}" SET {", ".join(assignments)} '
+            f'WHERE {" AND ".join(conditions)} RETURNING {returning}'
+        )
+        rows = await db.execute_query_dict(query, values)
+        return rows[0] if rows else None
+
+
+def _path(key: str) -> str:
+    """Return the SQLite JSON path of a key of an object."""
+    return f'$."{key}"'
+
+
+def _result_item(value: Any) -> Any:
+    """Return a result item read from the database, which SQLite returns as text."""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _as_text(value: Any) -> Optional[str]:
+    """Return a JSON value as the database compares it to a filter value."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return str(value)
@@ -0,0 +1,333 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, Optional
+
+from pydantic import BaseModel
+from tortoise import Model, timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.functions import Sum
+
+from discovery.core import config
+
+from ..models import Run, RunDailyCount, RunDurationCount, RunStatusCount
+from ..models import RunStatus as Status
+
+# Upper bounds, in seconds, of the run duration histogram buckets.
+DURATION_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600)
+OVERFLOW_BUCKET = 2**31 - 1
+
+DAILY_COLUMNS = {
+    Status.SUCCESS: "succeeded",
+    Status.FAILED: "failed",
+}
+
+MAX_DAYS = 366
+
+# Rows per upsert statement, to stay under the bind parameter limits.
+CHUNK_SIZE = 500
+
+
+class DailyCount(BaseModel):
+    day: date
+    created: int
+    succeeded: int
+    failed: int
+
+
+class DurationStats(BaseModel):
+    count: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+
+
+class RunStats(BaseModel):
+    statuses: dict[Status, int]
+    daily: list[DailyCount]
+    durations: dict[str, DurationStats]
+
+
+def duration_bucket(seconds: float) -> int:
+    """Return the upper bound of the histogram bucket of a duration."""
+    for bound in DURATION_BUCKETS:
+        if seconds <= bound:
+            return bound
+    return OVERFLOW_BUCKET
+
+
+def percentile(histogram: dict[int, int], q: float) -> Optional[float]:
+    """Estimate a percentile from a duration histogram.
+
+    The value is interpolated linearly inside the bucket holding the rank, the same
+    way Prometheus' `histogram_quantile` does. Durations in the overflow bucket are
+    reported as the last bound.
+
+    Args:
+        histogram (dict[int, int]): The counts by bucket upper bound.
+        q (float): The percentile, between 0 and 1.
+
+    Returns:
+        Optional[float]: The estimated duration in seconds, or None if the
+        histogram is empty.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    rank = q * total
+    cumulative = 0
+    lower = 0
+    for bound in (*DURATION_BUCKETS, OVERFLOW_BUCKET):
+        count = histogram.get(bound, 0)
+        if count and cumulative + count >= rank:
+            if bound == OVERFLOW_BUCKET:
+                return float(lower)
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return float(lower)
+
+
+def day_of(moment: Optional[datetime]) -> date:
+    """Return the day of a moment in the configured timezone, today if unknown."""
+    return (moment or timezone.now()).astimezone(config.timezone).date()
+
+
+@dataclass
+class Deltas:
+    """Counter increments, written with one statement per counter table."""
+
+    statuses: Counter = field(default_factory=Counter)
+    daily: defaultdict = field(default_factory=lambda: defaultdict(Counter))
+    durations: Counter = field(default_factory=Counter)
+
+    def created(self, owner_id: Optional[str], name: str, created_at: datetime) -> None:
+        owner_id = owner_id or ""
+        self.statuses[(owner_id, name, Status.PENDING)] += 1
+        self.daily[(owner_id, name, day_of(created_at))]["created"] += 1
+
+    def transitioned(
+        self,
+        owner_id: Optional[str],
+        name: str,
+        previous: Status,
+        status: Status,
+        started_at: Optional[datetime] = None,
+        finished_at: Optional[datetime] = None,
+    ) -> None:
+        owner_id = owner_id or ""
+        self.statuses[(owner_id, name, previous)] -= 1
+        self.statuses[(owner_id, name, status)] += 1
+        if status in DAILY_COLUMNS:
+            self.daily[(owner_id, name, day_of(finished_at))][
+                DAILY_COLUMNS[status]
+            ] += 1
+        if status == Status.SUCCESS and started_at and finished_at:
+            seconds = (finished_at - started_at).total_seconds()
+            self.durations[(owner_id, name, duration_bucket(seconds))] += 1
+
+
+class Repository:
+    """Incrementally maintained run statistics.
+
+    Counters are updated with `INSERT ... ON CONFLICT DO UPDATE` statements in the
+    transaction of the run change they account for, so reading statistics never
+    scans the run table.
+    """
+
+    async def record_created(
+        self, runs: Iterable[Run], connection: Optional[BaseDBAsyncClient] = None
+    ) -> None:
+        """Count new runs.
+
+        Args:
+            runs (Iterable[Run]): The created runs.
+            connection (Optional[BaseDBAsyncClient]): The connection to use.
+            Defaults to the current one.
+        """
+        deltas = Deltas()
+        for run in runs:
+            deltas.created(run.owner_id, run.name, run.created_at)
+        await self.apply(deltas, connection)
+
+    async def record_transition(
+        self,
+        run: Run,
+        previous: Status,
+        connection: Optional[BaseDBAsyncClient] = None,
+    ) -> None:
+        """Count the status transition of a run.
+
+        Args:
+            run (Run): The run, after the transition.
+            previous (Status): The status the run came from.
+            connection (Optional[BaseDBAsyncClient]): The connection to use.
+            Defaults to the current one.
+        """
+        deltas = Deltas()
+        deltas.transitioned(
+            run.owner_id,
+            run.name,
+            previous,
+            run.status,
+            started_at=run.started_at,
+            finished_at=run.completed_at or run.failed_at,
+        )
+        await self.apply(deltas, connection)
+
+    async def apply(
+        self, deltas: Deltas, connection: Optional[BaseDBAsyncClient] = None
+    ) -> None:
+        """Write accumulated counter increments.
+
+        Args:
+            deltas (Deltas): The increments.
+            connection (Optional[BaseDBAsyncClient]): The connection to use.
+            Defaults to the current one.
+        """
+        await self._increment(
+            RunStatusCount,
+            ("owner_id", "name", "status"),
+            [(*key, {"count": count}) for key, count in deltas.statuses.items()],
+            connection,
+        )
+        await self._increment(
+            RunDailyCount,
+            ("owner_id", "name", "day"),
+            [
+                (
+                    *key,
+                    {
+                        column: counts[column]
+                        for column in ("created", *DAILY_COLUMNS.values())
+                    },
+                )
+                for key, counts in deltas.daily.items()
+            ],
+            connection,
+        )
+        await self._increment(
+            RunDurationCount,
+            ("owner_id", "name", "bucket"),
+            [(*key, {"count": count}) for key, count in deltas.durations.items()],
+            connection,
+        )
+
+    async def get(
+        self,
+        owner_id: Optional[str] = None,
+        name: Optional[str] = None,
+        days: int = 30,
+    ) -> RunStats:
+        """Read the statistics of the runs.
+
+        Args:
+            owner_id (Optional[str]): Only count the runs of this owner.
+            name (Optional[str]): Only count the runs of this task.
+            days (int): The number of days of daily throughput, including today.
+            Defaults to 30.
+
+        Returns:
+            RunStats: The counts by status, the daily throughput and the p50/p95
+            duration of successful runs by task name.
+        """
+        filters = {
+            key: value
+            for key, value in (("owner_id", owner_id), ("name", name))
+            if value is not None
+        }
+        statuses = (
+            await RunStatusCount.filter(**filters)
+            .annotate(total=Sum("count"))
+            .group_by("status")
+            .values("status", "total")
+        )
+        since = day_of(None) - timedelta(days=min(max(days, 1), MAX_DAYS) - 1)
+        daily = (
+            await RunDailyCount.filter(**filters, day__gte=since)
+            .annotate(
+                total_created=Sum("created"),
+                total_succeeded=Sum("succeeded"),
+                total_failed=Sum("failed"),
+            )
+            .group_by("day")
+            .order_by("day")
+            .values("day", "total_created", "total_succeeded", "total_failed")
+        )
+        histograms: dict[str, dict[int, int]] = defaultdict(dict)
+        for row in (
+            await RunDurationCount.filter(**filters)
+            .annotate(total=Sum("count"))
+            .group_by("name", "bucket")
+            .values("name", "bucket", "total")
+        ):
+            histograms[row["name"]][row["bucket"]] = int(row["total"])
+
+        return RunStats(
+            statuses={
+                Status(row["status"]): int(row["total"])
+                for row in statuses
+                if row["total"]
+            },
+            daily=[
+                DailyCount(
+                    day=row["day"],
+                    created=row["total_created"],
+                    succeeded=row["total_succeeded"],
+                    failed=row["total_failed"],
+                )
+                for row in daily
+            ],
+            durations={
+                task: DurationStats(
+                    count=sum(histogram.values()),
+                    p50=percentile(histogram, 0.5),
+                    p95=percentile(histogram, 0.95),
+                )
+                for task, histogram in histograms.items()
+            },
+        )
+
+    async def _increment(
+        self,
+        model: type[Model],
+        keys: tuple[str, ...],
+        rows: list[tuple[Any, ...]],
+        connection: Optional[BaseDBAsyncClient],
+    ) -> None:
+        rows = [row for row in rows if any(row[-1].values())]
+        if not rows:
+            return
+
+        db = connection or model._meta.db
+        executor = db.executor_class(model=model, db=db)
+        table = model._meta.db_table
+        counters = tuple(rows[0][-1])
+        columns = (*keys, *counters)
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        conflict = ", ".join(f'"{key}"' for key in keys)
+        updates = ", ".join(
+            f'"{column}" = "{table}"."{column}" + EXCLUDED."{column}"'
+            for column in counters
+        )
+
+        def parameter(values: list[Any], column: str, value: Any) -> str:
+            values.append(executor.column_map[column](value, model))
+            return str(executor.parameter(len(values) - 1))
+
+        for start in range(0, len(rows), CHUNK_SIZE):
+            values: list[Any] = []
+            tuples = ", ".join(
+                "("
+                + ", ".join(
+                    parameter(values, column, value)
+                    for column, value in zip(columns, (*row[:-1], *row[-1].values()))
+                )
+                + ")"
+                for row in rows[start : start + CHUNK_SIZE]
+            )
+            await db.execute_query(
+                f'INSERT INTO "{table}" ({quoted}) VALUES {tuples} '
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                values,
+            )
@@ -1,8 +1,10 @@
-from typing import Any, Dict, Generic, List, Optional, TypeVar, Unpack
+from typing import Any, Dict, Generic, List, Optional, Sequence, TypeVar, Unpack
 
-from fastapi_pagination.ext.tortoise import paginate
 from tortoise import Model as TortoiseModel
 from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from .pagination import CursorPage, Total, decode_cursor, encode_cursor, estimated_rows
 
 Model = TypeVar("Model", bound=TortoiseModel)
 Columns = TypeVar("Columns")
@@ -38,18 +40,86 @@ class Repository(Generic[Model, Columns, FilterableColumns]):
             query = query.order_by(order_by)
         return await query
 
-    async def paginate(self, order_by: Optional[str] = None) -> Any:
-        """Paginate the results from the data store.
+    async def paginate(
+        self,
+        query: Optional[QuerySet[Model]] = None,
+        cursor: Optional[str] = None,
+        size: int = 50,
+        total: Total = Total.NONE,
+        fields: Optional[Sequence[str]] = None,
+    ) -> CursorPage[Model] | CursorPage[dict[str, Any]]:
+        """Paginate the results from the data store, newest first.
+
+        Pages are read with a keyset over (created_at, id) instead of an offset, so
+        every page costs the same whatever its depth.
 
         Args:
-            order_by (Optional[str]): The column to order the results by.
+            query (Optional[QuerySet[Model]]): The query to paginate. Defaults to
+            all objects.
+            cursor (Optional[str]): The `next_cursor` of the previous page.
+            size (int): The maximum number of items in the page. Defaults to 50.
+            total (Total): Whether to count the matching objects, exactly or with
+            the planner estimate when the database provides one. Defaults to
+            Total.NONE.
+            fields (Optional[Sequence[str]]): Only select these columns (or
+            annotations) and return the items as dictionaries. `id` and
+            `created_at` are always selected. Defaults to the full objects.
 
         Returns:
-            Any: Paginated results.
+            CursorPage[Model] | CursorPage[dict[str, Any]]: The page of objects.
+
+        Raises:
+            InvalidCursorError: If the cursor is malformed.
         """
-        if order_by:
-            return await paginate(self.model, order_by)
-        return await paginate(self.model)
+        query = query if query is not None else self.model.all()
+        page = query.order_by("-created_at", "-id").limit(size + 1)
+        if cursor:
+            created_at, _id = decode_cursor(cursor)
+            page = page.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=_id)
+            )
+
+        if fields is not None:
+            items = await page.values(*dict.fromkeys(["id", "created_at", *fields]))
+        else:
+            items = await page
+        next_cursor = None
+        if len(items) > size:
+            items = items[:size]
+            last = items[-1]
+            next_cursor = (
+                encode_cursor(last["created_at"], last["id"])
+                if fields is not None
+                else encode_cursor(last.created_at, last.id)
+            )
+
+        return CursorPage(
+            items=items, next_cursor=next_cursor, total=await self.count(query, total)
+        )
+
+    async def count(
+        self, query: QuerySet[Model], total: Total = Total.EXACT
+    ) -> Optional[int]:
+        """Count the objects matching a query.
+
+        Args:
+            query (QuerySet[Model]): The query to count.
+            total (Total): How to count. Estimates are only available on Postgres,
+            other databases fall back to an exact count. Defaults to Total.EXACT.
+
+        Returns:
+            Optional[int]: The number of objects, or None for Total.NONE.
+        """
+        if total == Total.NONE:
+            return None
+        if (
+            total == Total.ESTIMATED
+            and self.model._meta.db.capabilities.dialect == "postgres"
+        ):
+            estimate = estimated_rows(await query.explain())
+            if estimate is not None:
+                return estimate
+        return await query.count()
 
     async def create(self, **item: Dict[str, Any]) -> None:
         """Create a new object in the data store.
@@ -0,0 +1,41 @@
+from typing import Optional
+
+from fastapi import APIRouter, Response
+
+from discovery.core.logger import logger
+from discovery.core.metrics import CONTENT_TYPE, render
+from discovery.runs.capacity import QueueStats, get_backlog, queue_metrics
+from discovery.runs.registry import registry
+from discovery.utils import custom_generate_unique_id
+
+router = APIRouter(generate_unique_id_function=custom_generate_unique_id)
+
+
+@router.get(
+    "/metrics",
+    tags=["Metrics"],
+    description="Get the backlog of the task queues in the Prometheus text format, to autoscale the workers.",  # noqa: E501
+    summary="Get Metrics",
+    response_class=Response,
+    responses={
+        200: {
+            "description": "Successfully retrieved the metrics.",
+            "content": {CONTENT_TYPE: {}},
+        },
+    },
+)
+async def metrics() -> Response:
+    """
+    Report the messages waiting in every task queue and the age of the oldest one.
+
+    Returns:
+        Response: The metrics, in the Prometheus text format.
+    """
+    stats: Optional[list[QueueStats]] = None
+    backlog = get_backlog()
+    if backlog is not None:
+        try:
+            stats = await backlog.stats(registry.queues())
+        except Exception as err:
+            logger.warning(f"Failed to read the task queues: {err}")
+    return Response(content=render(queue_metrics(stats)), media_type=CONTENT_TYPE)
@@ -1,20 +1,46 @@
-from typing import Generator
+from enum import Enum
+from typing import Generator, Optional
 
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Query,
+    Request,
+    Response,
     WebSocket,
     WebSocketDisconnect,
     status,
 )
-from fastapi_pagination import Page
+from fastapi.responses import StreamingResponse
 from tortoise.contrib.pydantic import pydantic_model_creator
 from tortoise.exceptions import ValidationError as TortoiseValidationError
 
+from discovery.core.conditional import (
+    is_conditional,
+    not_modified,
+    run_etag,
+    validators,
+)
+from discovery.core.export import csv_rows, ndjson
 from discovery.db.models import Run
-from discovery.db.repositories.runs import FilterableColumns, Repository
+from discovery.db.pagination import CursorPage, InvalidCursorError, Total
+from discovery.db.repositories.runs import (
+    MAX_TREE_DEPTH,
+    SELECTABLE_FIELDS,
+    SUMMARY_FIELDS,
+    TREE_FIELDS,
+    FilterableColumns,
+    InvalidFieldsError,
+    InvalidResultFieldsError,
+    Repository,
+    RunSummary,
+    RunTreeNode,
+)
+from discovery.db.repositories.stats import MAX_DAYS, RunStats
 from discovery.utils import custom_generate_unique_id
+from discovery.ws.encoding import UnsupportedEncodingError, get_encoder
+from discovery.ws.manager import UNSUPPORTED_DATA
 from discovery.ws.runs import RunsWebSocket
 
 router = APIRouter(
@@ -37,31 +63,80 @@ def get_repository() -> Generator[Repository, any, any]:
         del repo
 
 
+class PageParameters:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(  # noqa: B008
+            default=None, description="The `next_cursor` of the previous page."
+        ),
+        size: int = Query(default=50, ge=1, le=100),  # noqa: B008
+        total: Total = Query(  # noqa: B008
+            default=Total.NONE, description="Whether to count the matching runs."
+        ),
+        fields: Optional[str] = Query(  # noqa: B008
+            default=None,
+            description="Comma-separated fields to return. "
+            f"Available fields: {', '.join(SELECTABLE_FIELDS)}. "
+            "`id` and `created_at` are always returned.",
+        ),
+    ) -> None:
+        self.cursor = cursor
+        self.size = size
+        self.total = total
+        self.fields = parse_fields(fields)
+
+
+def parse_fields(fields: Optional[str]) -> list[str] | tuple[str, ...]:
+    if not fields:
+        return SUMMARY_FIELDS
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+INVALID_CURSOR = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Invalid cursor. Please use the next_cursor of a previous page.",
+)
+
+
+def invalid_fields(err: InvalidFieldsError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err.message)
+
+
 @router.get(
     "",
-    response_model=Page[Model],
-    description="Retrieve all runs with pagination. Results are paginated based on the creation date.",  # noqa: E501
+    response_model=CursorPage[RunSummary],
+    response_model_exclude_unset=True,
+    description="Retrieve the summaries of all runs with cursor pagination, newest first.",  # noqa: E501
     summary="Get All Runs",
     tags=["Runs"],
     responses={
         200: {"description": "Successfully retrieved the paginated list of runs."},
+        400: {"description": "Invalid cursor or fields."},
         500: {"description": "Internal server error."},
     },
 )
 async def all(
+    page: PageParameters = Depends(),  # noqa: B008
     repository: Repository = Depends(get_repository),  # noqa: B008
-) -> Page[Run]:
+) -> CursorPage[RunSummary]:
     """
     Retrieve all runs with pagination.
 
     Args:
+        page (PageParameters): The cursor, size, total mode and fields of the page.
         repository (Repository): Dependency that provides a repository instance.
 
     Returns:
-        Page[Run]: Paginated list of runs.
+        CursorPage[RunSummary]: Paginated list of run summaries.
     """
     try:
-        return await repository.paginate()
+        return await repository.summaries(
+            cursor=page.cursor, size=page.size, total=page.total, fields=page.fields
+        )
+    except InvalidCursorError:
+        raise INVALID_CURSOR from None
+    except InvalidFieldsError as err:
+        raise invalid_fields(err) from None
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error"
@@ -70,7 +145,8 @@ async def all(
 
 @router.post(
     "/filters",
-    response_model=Page[Model],
+    response_model=CursorPage[RunSummary],
+    response_model_exclude_unset=True,
     description="Filter runs based on the provided filter criteria.",
     summary="Filter Runs",
     tags=["Runs"],
@@ -78,26 +154,84 @@ async def all(
         200: {
             "description": "Successfully retrieved the paginated list of filtered runs."
         },
-        400: {"description": "Bad request due to invalid filter criteria."},
+        400: {
+            "description": "Bad request due to invalid filter criteria, cursor or fields."  # noqa: E501
+        },
         500: {"description": "Internal server error."},
     },
 )
 async def filter(
     filters: FilterableColumns,
+    page: PageParameters = Depends(),  # noqa: B008
     repository: Repository = Depends(get_repository),  # noqa: B008
-) -> Page[Run]:
+) -> CursorPage[RunSummary]:
     """
     Filter runs based on specified criteria.
 
     Args:
         filters (FilterableColumns): Filter criteria for querying runs.
+        page (PageParameters): The cursor, size, total mode and fields of the page.
         repository (Repository): Dependency that provides a repository instance.
 
     Returns:
-        Page[Run]: Paginated list of filtered runs.
+        CursorPage[RunSummary]: Paginated list of filtered run summaries.
     """
     try:
-        return await repository.filter_by(**filters)
+        return await repository.filter_by(
+            cursor=page.cursor,
+            size=page.size,
+            total=page.total,
+            fields=page.fields,
+            **filters,
+        )
+    except InvalidCursorError:
+        raise INVALID_CURSOR from None
+    except InvalidFieldsError as err:
+        raise invalid_fields(err) from None
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error"
+        ) from None
+
+
+@router.get(
+    "/stats",
+    response_model=RunStats,
+    tags=["Runs"],
+    description="Get the run counts by status, the daily throughput and the p50/p95 duration of successful runs by task name. Statistics are read from counters maintained on every run change, not computed from the runs.",  # noqa: E501
+    summary="Get Run Statistics",
+    responses={
+        200: {"description": "Successfully retrieved the run statistics."},
+        500: {"description": "Server error."},
+    },
+)
+async def stats(
+    owner_id: Optional[str] = None,
+    name: Optional[str] = Query(  # noqa: B008
+        default=None, description="Only count the runs of this task image."
+    ),
+    days: int = Query(  # noqa: B008
+        default=30,
+        ge=1,
+        le=MAX_DAYS,
+        description="The number of days of daily throughput, including today.",
+    ),
+    repository: Repository = Depends(get_repository),  # noqa: B008
+) -> RunStats:
+    """
+    Retrieve the run statistics.
+
+    Args:
+        owner_id (Optional[str]): Only count the runs of this owner.
+        name (Optional[str]): Only count the runs of this task image.
+        days (int): The number of days of daily throughput.
+        repository (Repository): Dependency that provides a repository instance.
+
+    Returns:
+        RunStats: The run statistics.
+    """
+    try:
+        return await repository.stats.get(owner_id=owner_id, name=name, days=days)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error"
@@ -108,10 +242,11 @@ async def filter(
     "/{run_id}",
     response_model=Model,
     tags=["Runs"],
-    description="Get a single run by its id. If the id is not found, a 404 response is returned.",  # noqa: E501
+    description="Get a single run by its id. If the id is not found, a 404 response is returned. The response has an `ETag` and a `Last-Modified` derived from the run's `updated_at`; send them back in `If-None-Match` or `If-Modified-Since` to get a 304 when the run did not change.",  # noqa: E501
     summary="Get Run by ID",
     responses={
         200: {"description": "Successfully retrieved the run."},
+        304: {"description": "The run did not change since the given version."},
         400: {"description": "Invalid run id. Please provide a valid run id."},
         404: {"description": "Run not found. Please provide a valid run id."},
         500: {"description": "Server error."},
@@ -119,12 +254,27 @@ async def filter(
 )
 async def get_by_id(
     run_id: str,
+    request: Request,
+    response: Response,
     repository: Repository = Depends(get_repository),  # noqa: B008
 ) -> Run:
     try:
+        if is_conditional(request.headers):
+            # Only read the run's result once it is known to have changed.
+            updated_at = await repository.last_modified(run_id)
+            if updated_at is not None and not_modified(
+                request.headers, run_etag(run_id, updated_at), updated_at
+            ):
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers=validators(run_etag(run_id, updated_at), updated_at),
+                )
         run = await repository.get_by_id(run_id)
         if run is None:
             raise repository.ItemNotFoundError
+        response.headers.update(
+            validators(run_etag(run.id, run.updated_at), run.updated_at)
+        )
         return run
     except repository.ItemNotFoundError:
         raise HTTPException(
@@ -142,14 +292,192 @@ async def get_by_id(
         ) from None
 
 
+@router.get(
+    "/{run_id}/tree",
+    response_model=list[RunTreeNode],
+    response_model_exclude_unset=True,
+    tags=["Runs"],
+    description="Get a run and all its descendants, ordered by depth then creation date. If the id is not found, a 404 response is returned.",  # noqa: E501
+    summary="Get Run Tree",
+    responses={
+        200: {"description": "Successfully retrieved the run tree."},
+        400: {"description": "Invalid fields."},
+        404: {"description": "Run not found. Please provide a valid run id."},
+        500: {"description": "Server error."},
+    },
+)
+async def tree(
+    run_id: str,
+    owner_id: Optional[str] = None,
+    depth: int = Query(  # noqa: B008
+        default=MAX_TREE_DEPTH,
+        ge=0,
+        le=MAX_TREE_DEPTH,
+        description="How many levels of descendants to return.",
+    ),
+    fields: Optional[str] = Query(  # noqa: B008
+        default=None,
+        description="Comma-separated fields to return. "
+        f"Available fields: {', '.join(TREE_FIELDS)}. "
+        "`id`, `parent_id`, `created_at` and `depth` are always returned.",
+    ),
+    repository: Repository = Depends(get_repository),  # noqa: B008
+) -> list[RunTreeNode]:
+    """
+    Retrieve a run and its descendants with a single query.
+
+    Args:
+        run_id (str): The ID of the root run.
+        owner_id (Optional[str]): Only return the tree if the run belongs to this
+        owner.
+        depth (int): How many levels of descendants to return.
+        fields (Optional[str]): Comma-separated fields to return.
+        repository (Repository): Dependency that provides a repository instance.
+
+    Returns:
+        list[RunTreeNode]: The runs of the tree.
+    """
+    try:
+        nodes = await repository.tree(
+            run_id, owner_id=owner_id, depth=depth, fields=parse_fields(fields)
+        )
+        if not nodes:
+            raise repository.ItemNotFoundError
+        return nodes
+    except InvalidFieldsError as err:
+        raise invalid_fields(err) from None
+    except repository.ItemNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Run not found. Please provide a valid run id.",
+        ) from None
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error"
+        ) from None
+
+
+class ResultFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ResultFormat.NDJSON: "application/x-ndjson",
+    ResultFormat.CSV: "text/csv",
+}
+
+
+def parse_filters(filters: list[str]) -> dict[str, str]:
+    """Parse `key:value` result filters.
+
+    Raises:
+        HTTPException: 400 if a filter has no `:`.
+    """
+    parsed = {}
+    for item in filters:
+        key, separator, value = item.partition(":")
+        if not separator:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid filter: {item}. Filters are `key:value`.",
+            )
+        parsed[key.strip()] = value
+    return parsed
+
+
+@router.get(
+    "/{run_id}/results",
+    response_class=StreamingResponse,
+    tags=["Runs"],
+    description="Stream the items of a run result (e.g. the `items` of httpx or the `domains` of subfinder) as NDJSON or CSV. Items are read from the database in batches and written as they are read, so large results are exported in constant memory. If the id is not found, a 404 response is returned.",  # noqa: E501
+    summary="Export Run Results",
+    responses={
+        200: {
+            "description": "The result items, one per line.",
+            "content": {media_type: {} for media_type in MEDIA_TYPES.values()},
+        },
+        400: {"description": "Invalid fields or filters."},
+        404: {"description": "Run not found. Please provide a valid run id."},
+        500: {"description": "Server error."},
+    },
+)
+async def results(
+    run_id: str,
+    owner_id: Optional[str] = None,
+    format: ResultFormat = Query(default=ResultFormat.NDJSON),  # noqa: B008
+    fields: Optional[str] = Query(  # noqa: B008
+        default=None,
+        description="Comma-separated keys of the items to return. Defaults to every key, or the keys of the first item in CSV.",  # noqa: E501
+    ),
+    filter: list[str] = Query(  # noqa: B008
+        default=[],
+        description="`key:value` filters, only the items whose key has this value (compared as text) are returned. Repeat it to combine filters.",  # noqa: E501
+    ),
+    repository: Repository = Depends(get_repository),  # noqa: B008
+) -> StreamingResponse:
+    """
+    Stream the items of a run result.
+
+    Args:
+        run_id (str): The ID of the run.
+        owner_id (Optional[str]): Only return the items if the run belongs to this
+        owner.
+        format (ResultFormat): NDJSON or CSV.
+        fields (Optional[str]): Comma-separated keys of the items to return.
+        filter (list[str]): `key:value` filters.
+        repository (Repository): Dependency that provides a repository instance.
+
+    Returns:
+        StreamingResponse: The items, written batch by batch.
+    """
+    selected = [field.strip() for field in (fields or "").split(",") if field.strip()]
+    try:
+        source = await repository.result_source(
+            run_id, owner_id=owner_id, fields=selected, filters=parse_filters(filter)
+        )
+        if source is None:
+            raise repository.ItemNotFoundError
+    except HTTPException:
+        raise
+    except InvalidResultFieldsError as err:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=err.message
+        ) from None
+    except repository.ItemNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Run not found. Please provide a valid run id.",
+        ) from None
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error"
+        ) from None
+
+    batches = repository.results(source)
+    if format == ResultFormat.CSV:
+        return StreamingResponse(
+            csv_rows(batches, selected),
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{run_id}.csv"'},
+        )
+    return StreamingResponse(ndjson(batches), media_type=MEDIA_TYPES[format])
+
+
 manager = RunsWebSocket()
 
 
 @router.websocket("/ws")
-async def runs_ws(websocket: WebSocket) -> None:
-    await manager.connect(websocket)
+async def runs_ws(websocket: WebSocket, encoding: str = "json") -> None:
+    try:
+        encoder = get_encoder(encoding)
+    except UnsupportedEncodingError as err:
+        return await websocket.close(code=UNSUPPORTED_DATA, reason=err.message)
+    if not await manager.connect(websocket, encoder=encoder):
+        return
     try:
-        while True:
-            await manager.process(websocket)
+        await manager.serve(websocket)
     except WebSocketDisconnect:
+        pass
+    finally:
         await manager.disconnect(websocket)
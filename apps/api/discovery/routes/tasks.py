@@ -1,11 +1,20 @@
-from typing import Any
+import math
+from typing import Any, Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
 from pydantic import BaseModel
 
-from discovery.core.celery import celery
+from discovery.runs.dedup import DeduplicationUnavailableError
+from discovery.runs.quotas import RateLimitExceededError
 from discovery.runs.registry import registry
-from discovery.runs.run import RunResult
+from discovery.runs.schemas import RunResult
+from discovery.runs.submit import (
+    MAX_BATCH_SIZE,
+    InvalidTaskRequestsError,
+    TaskRequest,
+    submit,
+    submit_batch,
+)
 from discovery.utils import custom_generate_unique_id
 
 router = APIRouter(
@@ -13,12 +22,16 @@ router = APIRouter(
 )
 
 
-class TaskRequest(BaseModel):
-    task: str
-    params: dict[str, Any]
+class BatchResult(BaseModel):
+    ids: list[str]
+
 
-    class Config:
-        arbitrary_types_allowed = True
+def too_many_requests(err: RateLimitExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=err.message,
+        headers={"Retry-After": str(math.ceil(err.retry_after))},
+    )
 
 
 @router.get(
@@ -41,41 +54,141 @@ async def available_tasks() -> list[str]:
     return registry.tasks
 
 
+@router.get(
+    "/{task}/schema",
+    response_model=dict[str, Any],
+    tags=["Tasks"],
+    description="Get the JSON schema of the parameters of a task.",
+    summary="Get Task Parameters Schema",
+    responses={
+        200: {"description": "Successfully retrieved the parameters schema."},
+        404: {"description": "Task not found."},
+    },
+)
+async def task_schema(task: str) -> dict[str, Any]:
+    """
+    Retrieve the JSON schema of the parameters of a task.
+
+    Args:
+        task (str): The task name.
+
+    Returns:
+        dict[str, Any]: The JSON schema, read from the task manifest.
+
+    Raises:
+        HTTPException: If the task is not found.
+    """
+    entry = registry.get(task)
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found. Please provide a valid task name.",
+        )
+    return entry.parameters
+
+
 @router.post(
     "",
     response_model=RunResult,
     tags=["Tasks"],
-    description="Run a specified task with provided parameters.",
+    description="Run a specified task with provided parameters. Retries sending the same `Idempotency-Key` header return the task of the first request, and `dedup=true` returns an equivalent task still in flight instead of starting a new one. Both cases set the `Idempotent-Replayed: true` response header. Parameters are validated before the task is published, invalid ones are answered 422. Submissions are rate limited per owner (`RATE_LIMIT`), a 429 response tells when to retry in `Retry-After`.",  # noqa: E501
     summary="Run Task",
     responses={
         200: {"description": "Successfully run the task."},
         404: {"description": "Task not found."},
+        422: {"description": "Invalid task parameters."},
+        429: {"description": "Too many submissions from the owner."},
+        503: {"description": "Idempotency keys and dedup need Redis."},
     },
 )
-async def run_task(request: TaskRequest) -> RunResult:
+async def run_task(
+    request: TaskRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(  # noqa: B008
+        default=None, max_length=255
+    ),
+    dedup: bool = Query(  # noqa: B008
+        default=False,
+        description="Reuse an equivalent task (same task, normalized parameters "
+        "and owner) that is still in flight.",
+    ),
+) -> RunResult:
     """
     Run a specified task with provided parameters.
 
     Args:
         request (TaskRequest): A dictionary containing the task name and parameters.
+        response (Response): The response, to flag replayed submissions.
+        idempotency_key (Optional[str]): The `Idempotency-Key` header.
+        dedup (bool): Whether to reuse an equivalent task still in flight.
 
     Returns:
         RunResult: The result of the task run, including the task ID.
 
     Raises:
-        HTTPException: If the task is not found.
+        HTTPException: If the task is not found, its parameters are invalid, the
+        owner is rate limited or deduplication is not available.
     """
-    task_name = request.task
-    params = request.params
-
-    if task_name in registry.tasks:
-        task = celery.send_task(
-            name=task_name,
-            kwargs=params,
-        )
-        return RunResult(task.id)
-    else:
+    if request.task not in registry:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found. Please provide a valid task name.",
         ) from None
+
+    try:
+        task_id, replayed = await submit(
+            request, idempotency_key=idempotency_key, dedup=dedup
+        )
+    except InvalidTaskRequestsError as err:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=err.errors
+        ) from None
+    except RateLimitExceededError as err:
+        raise too_many_requests(err) from None
+    except DeduplicationUnavailableError as err:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=err.message
+        ) from None
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return RunResult(task_id)
+
+
+@router.post(
+    "/batch",
+    response_model=BatchResult,
+    tags=["Tasks"],
+    description=f"Run up to {MAX_BATCH_SIZE} tasks at once. The runs are created in a single insert and the tasks are published over a single broker connection. Nothing is submitted if any request is invalid.",  # noqa: E501
+    summary="Run Tasks",
+    responses={
+        200: {"description": "Successfully submitted the tasks."},
+        422: {"description": "Invalid task requests, with the index of each one."},
+        429: {"description": "Too many submissions from an owner of the batch."},
+        500: {"description": "Server error."},
+    },
+)
+async def run_tasks(requests: list[TaskRequest]) -> BatchResult:
+    """
+    Run a batch of tasks.
+
+    Args:
+        requests (list[TaskRequest]): The task names and parameters.
+
+    Returns:
+        BatchResult: The task IDs, in the order of the requests.
+
+    Raises:
+        HTTPException: If a request is invalid or the tasks could not be submitted.
+    """
+    try:
+        return BatchResult(ids=await submit_batch(requests))
+    except InvalidTaskRequestsError as err:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=err.errors
+        ) from None
+    except RateLimitExceededError as err:
+        raise too_many_requests(err) from None
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error"
+        ) from None
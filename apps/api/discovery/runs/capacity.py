@@ -0,0 +1,226 @@
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer
+from typing import Any, Optional
+
+from redis.asyncio import Redis
+
+from discovery.core.logger import logger
+from discovery.core.metrics import Metric, serve
+
+# Message header holding the publication time, stamped by `discovery.core.celery`.
+PUBLISHED_AT = "published_at"
+
+# Kombu keeps a Redis list per queue and priority step, the first step under the
+# queue name and the others suffixed with the separator and the step.
+PRIORITY_SEPARATOR = "\x06\x16"
+PRIORITY_STEPS = (0, 3, 6, 9)
+
+
+@dataclass
+class QueueStats:
+    name: str
+    # Messages waiting in the broker, not yet reserved by a worker.
+    messages: int
+    # Seconds since the oldest waiting message was published, None if the queue
+    # is empty or its messages predate the `published_at` header.
+    oldest_age: Optional[float]
+
+
+def queue_keys(name: str) -> list[str]:
+    """Return the Redis keys of a queue, one per priority step."""
+    return [
+        f"{name}{PRIORITY_SEPARATOR}{step}" if step else name for step in PRIORITY_STEPS
+    ]
+
+
+class Backlog:
+    def __init__(self, redis: Redis) -> None:
+        """The messages waiting in the queues of a Redis broker.
+
+        Args:
+            redis (Redis): A client of the broker database.
+        """
+        self._redis = redis
+
+    async def stats(
+        self, queues: list[str], now: Optional[float] = None
+    ) -> list[QueueStats]:
+        """Count the waiting messages of queues and find the oldest one, in a
+        single round trip.
+
+        Messages are pushed at the head of the lists and consumed from the tail,
+        so the oldest message of a list is its last item.
+
+        Args:
+            queues (list[str]): The queue names.
+            now (Optional[float]): The current time. Defaults to `time.time()`.
+
+        Returns:
+            list[QueueStats]: The stats of every queue, in the given order.
+        """
+        now = time.time() if now is None else now
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for name in queues:
+                for key in queue_keys(name):
+                    pipe.llen(key)
+                    pipe.lindex(key, -1)
+            replies = iter(await pipe.execute())
+        stats = []
+        for name in queues:
+            messages, published = 0, []
+            for _ in PRIORITY_STEPS:
+                messages += next(replies)
+                at = _published_at(next(replies))
+                if at is not None:
+                    published.append(at)
+            oldest_age = max(0.0, now - min(published)) if published else None
+            stats.append(QueueStats(name, messages, oldest_age))
+        return stats
+
+
+def queue_metrics(stats: Optional[list[QueueStats]]) -> list[Metric]:
+    """Return the backlog metrics of the queues.
+
+    Args:
+        stats (Optional[list[QueueStats]]): The queues, None if the broker could
+        not be read.
+    """
+    up = Metric(
+        "discovery_broker_up", "gauge", "Whether the broker queues could be read."
+    )
+    messages = Metric(
+        "discovery_queue_messages",
+        "gauge",
+        "Messages waiting in the queue, not yet reserved by a worker.",
+    )
+    oldest = Metric(
+        "discovery_queue_oldest_message_age_seconds",
+        "gauge",
+        "Seconds since the oldest waiting message of the queue was published.",
+    )
+    up.add(0 if stats is None else 1)
+    for queue in stats or []:
+        messages.add(queue.messages, queue=queue.name)
+        oldest.add(queue.oldest_age or 0.0, queue=queue.name)
+    return [up, messages, oldest]
+
+
+def worker_metrics(
+    hostname: str,
+    concurrency: int,
+    active: int,
+    reserved: int,
+    containers: Optional[Counter[str]],
+) -> list[Metric]:
+    """Return the capacity metrics of a worker.
+
+    Args:
+        hostname (str): The worker node name.
+        concurrency (int): Tasks the worker runs at once.
+        active (int): Tasks running.
+        reserved (int): Tasks prefetched, waiting for a free process.
+        containers (Optional[Counter[str]]): Running task containers started by the
+        worker per image, None if Docker could not be reached.
+
+    Returns:
+        list[Metric]: The metrics.
+    """
+    labels = {"worker": hostname}
+    metrics = [
+        Metric(
+            "discovery_worker_concurrency", "gauge", "Tasks the worker runs at once."
+        ).add(concurrency, **labels),
+        Metric("discovery_worker_active_tasks", "gauge", "Tasks running.").add(
+            active, **labels
+        ),
+        Metric(
+            "discovery_worker_reserved_tasks",
+            "gauge",
+            "Tasks prefetched by the worker, waiting for a free process.",
+        ).add(reserved, **labels),
+        Metric(
+            "discovery_worker_free_slots",
+            "gauge",
+            "Tasks the worker can still admit without queueing them.",
+        ).add(max(0, concurrency - active - reserved), **labels),
+    ]
+    running = Metric(
+        "discovery_containers_running",
+        "gauge",
+        "Task containers started by the worker that are still running.",
+    )
+    for image, count in sorted((containers or {}).items()):
+        running.add(count, image=image, **labels)
+    docker_up = Metric(
+        "discovery_docker_up", "gauge", "Whether the Docker host could be reached."
+    ).add(0 if containers is None else 1, **labels)
+    return [*metrics, running, docker_up]
+
+
+def serve_worker_metrics(worker: Any, port: int) -> ThreadingHTTPServer:
+    """Serve the capacity metrics of a Celery worker on `port`.
+
+    Args:
+        worker (WorkController): The worker, as given by the `worker_ready` signal
+        through `consumer.controller`.
+        port (int): The port of the exporter.
+
+    Returns:
+        ThreadingHTTPServer: The exporter.
+    """
+    from celery.worker import state
+
+    from discovery.containers.container import Container
+    from discovery.core import config
+
+    try:
+        container = Container(config.docker_config, worker=worker.hostname)
+    except RuntimeError as err:
+        logger.warning(f"Container metrics are disabled: {err}")
+        container = None
+
+    def collect() -> list[Metric]:
+        containers = None
+        if container is not None:
+            try:
+                containers = container.running()
+            except Exception as err:
+                logger.warning(f"Failed to list the running containers: {err}")
+        active = len(state.active_requests)
+        return worker_metrics(
+            hostname=worker.hostname,
+            concurrency=worker.max_concurrency or worker.concurrency,
+            active=active,
+            reserved=max(0, len(state.reserved_requests) - active),
+            containers=containers,
+        )
+
+    return serve(collect, port)
+
+
+def _published_at(message: Optional[bytes]) -> Optional[float]:
+    if message is None:
+        return None
+    try:
+        return float(json.loads(message)["headers"][PUBLISHED_AT])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+_backlog: Optional[Backlog] = None
+
+
+def get_backlog() -> Optional[Backlog]:
+    """Return the backlog of the broker, or None if the broker is not Redis."""
+    global _backlog
+    if _backlog is None:
+        from discovery.core import config
+
+        broker_url = config.celery_config.broker_url
+        if not broker_url.startswith("redis"):
+            return None
+        _backlog = Backlog(Redis.from_url(broker_url))
+    return _backlog
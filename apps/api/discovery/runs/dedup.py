@@ -0,0 +1,245 @@
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from redis.asyncio import Redis
+
+PREFIX = "discovery:submissions:"
+
+# Parameters holding host names, which are compared case-insensitively.
+HOST_PARAMETERS = ("domain", "domains")
+
+# Deletes a key only if it still holds the given value.
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class DeduplicationUnavailableError(ValueError):
+    def __init__(self) -> None:
+        self.message = (
+            "Idempotency keys and deduplication are not available: "
+            "Redis is not configured"
+        )
+        super().__init__(self.message)
+
+
+def normalize(params: dict[str, Any]) -> dict[str, Any]:
+    """Normalize task parameters so that equivalent submissions compare equal.
+
+    Strings are stripped, host names are lowercased, lists of host names are sorted
+    and deduplicated, and unset parameters are dropped.
+
+    Args:
+        params (dict[str, Any]): The task parameters.
+
+    Returns:
+        dict[str, Any]: The normalized parameters.
+    """
+
+    def value(key: str, item: Any) -> Any:
+        if isinstance(item, str):
+            item = item.strip()
+            return item.lower() if key in HOST_PARAMETERS else item
+        if isinstance(item, list) and key in HOST_PARAMETERS:
+            return sorted({value(key, entry) for entry in item})
+        if isinstance(item, dict):
+            return normalize(item)
+        return item
+
+    return {key: value(key, item) for key, item in params.items() if item is not None}
+
+
+def fingerprint(task: str, params: dict[str, Any]) -> str:
+    """Return the key identifying equivalent submissions of a task.
+
+    The owner is part of the parameters, so submissions of different owners never
+    collide.
+
+    Args:
+        task (str): The task name.
+        params (dict[str, Any]): The task parameters.
+
+    Returns:
+        str: The fingerprint of the submission.
+    """
+    payload = json.dumps(
+        [task, normalize(params)], sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ClaimStore(ABC):
+    @abstractmethod
+    async def claim(self, key: str, value: str, ttl: int) -> Optional[str]:
+        """Set a key if it is not set yet.
+
+        Returns:
+            Optional[str]: None if the key was claimed, the current value otherwise.
+        """
+
+    @abstractmethod
+    async def release(self, key: str, value: str) -> None:
+        """Delete a key if it still holds the given value."""
+
+
+class RedisClaimStore(ClaimStore):
+    def __init__(self, redis: Redis) -> None:
+        self._redis = redis
+
+    async def claim(self, key: str, value: str, ttl: int) -> Optional[str]:
+        # The key may expire between SET and GET, so try again once.
+        for _ in range(2):
+            if await self._redis.set(PREFIX + key, value, nx=True, ex=ttl):
+                return None
+            current = await self._redis.get(PREFIX + key)
+            if current is not None:
+                return current.decode() if isinstance(current, bytes) else current
+        return None
+
+    async def release(self, key: str, value: str) -> None:
+        await self._redis.eval(RELEASE_SCRIPT, 1, PREFIX + key, value)
+
+
+class UnavailableClaimStore(ClaimStore):
+    """Refuse every claim. Used without Redis: workers release the claims of the
+    tasks they run, which a store private to the API process would never see."""
+
+    async def claim(self, key: str, value: str, ttl: int) -> Optional[str]:
+        raise DeduplicationUnavailableError()
+
+    async def release(self, key: str, value: str) -> None:
+        pass
+
+
+class MemoryClaimStore(ClaimStore):
+    def __init__(self) -> None:
+        """Keep claims in memory. Claims are not shared with other processes."""
+        self._claims: dict[str, tuple[str, float]] = {}
+
+    async def claim(self, key: str, value: str, ttl: int) -> Optional[str]:
+        current = self._claims.get(key)
+        if current is not None and current[1] > time.monotonic():
+            return current[0]
+        self._claims[key] = (value, time.monotonic() + ttl)
+        return None
+
+    async def release(self, key: str, value: str) -> None:
+        current = self._claims.get(key)
+        if current is not None and current[0] == value:
+            del self._claims[key]
+
+
+class Deduplicator:
+    def __init__(
+        self,
+        store: ClaimStore,
+        idempotency_ttl: int = 86400,
+        inflight_ttl: int = 3600,
+    ) -> None:
+        """Map idempotency keys and in-flight submissions to the ID of their task.
+
+        Args:
+            store (ClaimStore): Where the claims are kept.
+            idempotency_ttl (int, optional): How long, in seconds, an idempotency
+            key is remembered. Defaults to 86400.
+            inflight_ttl (int, optional): How long, in seconds, a submission is
+            considered in flight if its task never releases it. Defaults to 3600.
+        """
+        self._store = store
+        self._idempotency_ttl = idempotency_ttl
+        self._inflight_ttl = inflight_ttl
+
+    async def claim(
+        self,
+        task_id: str,
+        task: str,
+        params: dict[str, Any],
+        idempotency_key: Optional[str] = None,
+        dedup: bool = False,
+    ) -> Optional[str]:
+        """Claim a submission for a new task.
+
+        Args:
+            task_id (str): The ID of the new task.
+            task (str): The task name.
+            params (dict[str, Any]): The task parameters.
+            idempotency_key (Optional[str]): The idempotency key of the request.
+            dedup (bool): Whether to reuse an equivalent task still in flight.
+
+        Returns:
+            Optional[str]: None if the new task should be published, otherwise the
+            ID of the existing task to return instead.
+
+        Raises:
+            DeduplicationUnavailableError: If an idempotency key or dedup is asked
+            for and the store cannot keep claims across processes.
+        """
+        if idempotency_key:
+            key = self._idempotency_key(params, idempotency_key)
+            existing = await self._store.claim(key, task_id, self._idempotency_ttl)
+            if existing is not None:
+                return existing
+        if dedup:
+            existing = await self._store.claim(
+                self._inflight_key(task, params), task_id, self._inflight_ttl
+            )
+            if existing is not None:
+                if idempotency_key:
+                    # Replays of this request must return the reused task too.
+                    await self._store.release(key, task_id)
+                    await self._store.claim(key, existing, self._idempotency_ttl)
+                return existing
+        return None
+
+    async def abandon(
+        self,
+        task_id: str,
+        task: str,
+        params: dict[str, Any],
+        idempotency_key: Optional[str] = None,
+    ) -> None:
+        """Release the claims of a task that could not be published."""
+        if idempotency_key:
+            await self._store.release(
+                self._idempotency_key(params, idempotency_key), task_id
+            )
+        await self.release(task_id, task, params)
+
+    async def release(self, task_id: str, task: str, params: dict[str, Any]) -> None:
+        """Mark a task as no longer in flight, once it is finished."""
+        await self._store.release(self._inflight_key(task, params), task_id)
+
+    def _idempotency_key(self, params: dict[str, Any], idempotency_key: str) -> str:
+        return f"idempotency:{params.get('owner_id') or ''}:{idempotency_key}"
+
+    def _inflight_key(self, task: str, params: dict[str, Any]) -> str:
+        return f"inflight:{fingerprint(task, params)}"
+
+
+_deduplicator: Optional[Deduplicator] = None
+
+
+def get_deduplicator() -> Deduplicator:
+    """Return the deduplicator of the current process.
+
+    Claims are kept in Redis. Without Redis, submissions with an idempotency key
+    or dedup are refused.
+    """
+    global _deduplicator
+    if _deduplicator is None:
+        from discovery.core import config
+        from discovery.core.redis import get_redis_client
+
+        redis = get_redis_client()
+        _deduplicator = Deduplicator(
+            RedisClaimStore(redis) if redis is not None else UnavailableClaimStore(),
+            idempotency_ttl=config.submission_config.idempotency_ttl,
+            inflight_ttl=config.submission_config.inflight_ttl,
+        )
+    return _deduplicator
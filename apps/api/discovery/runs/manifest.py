@@ -0,0 +1,177 @@
+import importlib
+import importlib.util
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, NotRequired, Optional, Required, TypedDict
+
+from discovery.core.logger import logger
+
+PACKAGE = "discovery.tasks"
+
+# Python types of the JSON schema types, for parameters validated from a manifest.
+JSON_TYPES: dict[str, type] = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": bool,
+    "object": dict[str, Any],
+}
+
+
+@dataclass
+class TaskManifest:
+    name: str
+    image: Optional[str]
+    # JSON schema of the `Parameters` of the task.
+    parameters: dict[str, Any]
+    # The `TaskOptions` declared by the task module, without the unset ones.
+    options: dict[str, Any] = field(default_factory=dict)
+
+
+Manifest = dict[str, TaskManifest]
+
+
+def package_path(package: str = PACKAGE) -> Optional[str]:
+    """Return the directory of the tasks package, without importing any task."""
+    spec = importlib.util.find_spec(package)
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return list(spec.submodule_search_locations)[0]
+
+
+def manifest_path(package: str = PACKAGE) -> Optional[Path]:
+    path = package_path(package)
+    return Path(path) / "manifest.json" if path is not None else None
+
+
+def discover(package: str = PACKAGE) -> list[str]:
+    """List the task modules of the tasks package, without importing them.
+
+    Args:
+        package (str): The tasks package. Defaults to `discovery.tasks`.
+
+    Returns:
+        list[str]: The full names of the task modules, sorted.
+    """
+    path = package_path(package)
+    if path is None:
+        logger.error(f"Could not find the {package} package")
+        return []
+    names = []
+    for directory, _, filenames in os.walk(path):
+        relative = os.path.relpath(directory, path)
+        prefix = (
+            package if relative == "." else f"{package}.{relative.replace(os.sep, '.')}"
+        )
+        names.extend(
+            f"{prefix}.{filename[:-3]}"
+            for filename in filenames
+            if filename.endswith(".py") and filename != "__init__.py"
+        )
+    return sorted(names)
+
+
+def describe(name: str) -> TaskManifest:
+    """Import a task module and describe it.
+
+    Raises:
+        RuntimeError: If the module has no valid `Task` or `Parameters`.
+    """
+    from pydantic import TypeAdapter
+
+    module = importlib.import_module(name)
+    parameters = getattr(module, "Parameters", None)
+    if parameters is None or getattr(module, "Task", None) is None:
+        raise RuntimeError(f"Module {name} does not have a Task or Parameters class.")
+    options = getattr(module, "OPTIONS", None)
+    return TaskManifest(
+        name=name,
+        image=getattr(module, "IMAGE", None),
+        parameters=TypeAdapter(parameters).json_schema(),
+        options=options.declared() if options is not None else {},
+    )
+
+
+def build(names: list[str]) -> Manifest:
+    """Describe task modules, importing every one of them."""
+    manifest = {}
+    for name in names:
+        try:
+            manifest[name] = describe(name)
+        except Exception as err:
+            logger.error(f"Failed to describe task {name}: {err}")
+    return manifest
+
+
+def load(path: Optional[Path] = None) -> Optional[Manifest]:
+    """Read a manifest written by `write`, None if there is none."""
+    path = path or manifest_path()
+    if path is None or not path.exists():
+        return None
+    with open(path) as file:
+        return {
+            entry["name"]: TaskManifest(**entry) for entry in json.load(file)["tasks"]
+        }
+
+
+def write(manifest: Manifest, path: Optional[Path] = None) -> Path:
+    path = path or manifest_path()
+    with open(path, "w") as file:
+        json.dump(
+            {"tasks": [asdict(entry) for entry in manifest.values()]}, file, indent=2
+        )
+        file.write("\n")
+    return path
+
+
+def get_manifest(package: str = PACKAGE) -> Manifest:
+    """Return the tasks of the tasks package.
+
+    The cached manifest is used when it lists exactly the task modules found on
+    disk, so no task is imported. Otherwise the tasks are imported to describe
+    them; run `python -m discovery.runs.manifest` to update the manifest.
+    """
+    names = discover(package)
+    manifest = load(manifest_path(package))
+    if manifest is not None and sorted(manifest) == names:
+        return manifest
+    logger.warning(
+        "The task manifest is missing or outdated, importing the tasks. "
+        "Run `python -m discovery.runs.manifest` to update it."
+    )
+    return build(names)
+
+
+def parameters_type(schema: dict[str, Any], name: str = "Parameters") -> type:
+    """Return a TypedDict validating the parameters described by a JSON schema.
+
+    Only the types used by task parameters are mapped (strings, numbers,
+    booleans, objects and arrays of them); other values are not checked.
+
+    Args:
+        schema (dict[str, Any]): The JSON schema of a `Parameters` TypedDict.
+        name (str): The name of the TypedDict.
+
+    Returns:
+        type: The TypedDict.
+    """
+    required = set(schema.get("required", []))
+    fields = {}
+    for key, property in schema.get("properties", {}).items():
+        annotation = _json_type(property)
+        fields[key] = (
+            Required[annotation] if key in required else NotRequired[annotation]
+        )
+    return TypedDict(name, fields)
+
+
+def _json_type(schema: dict[str, Any]) -> Any:
+    if schema.get("type") == "array":
+        return list[_json_type(schema.get("items", {}))]
+    return JSON_TYPES.get(schema.get("type"), Any)
+
+
+if __name__ == "__main__":
+    print(f"Wrote {write(build(discover()))}")
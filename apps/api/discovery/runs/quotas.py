@@ -0,0 +1,281 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Iterable, Optional
+
+from redis.asyncio import Redis
+
+from discovery.core.logger import logger
+
+PREFIX = "discovery:quotas:"
+
+# Takes tokens from a bucket refilled at `rate` tokens per second, up to `burst`.
+# Returns the seconds to wait before the tokens are available, 0 if they were taken.
+TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "at")
+local tokens = tonumber(bucket[1]) or burst
+local at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "at", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Gives tokens back to a bucket, up to `burst`. An expired bucket is full already.
+REFUND_SCRIPT = """
+local tokens = tonumber(redis.call("HGET", KEYS[1], "tokens"))
+if tokens then
+    local refunded = math.min(tonumber(ARGV[1]), tokens + tonumber(ARGV[2]))
+    redis.call("HSET", KEYS[1], "tokens", tostring(refunded))
+end
+return 0
+"""
+
+# Adds a holder to a set of at most `limit` slots, expiring after `ttl` seconds.
+ACQUIRE_SCRIPT = """
+local limit, ttl = tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+if redis.call("ZSCORE", KEYS[1], ARGV[1]) or redis.call("ZCARD", KEYS[1]) < limit then
+    redis.call("ZADD", KEYS[1], now + ttl, ARGV[1])
+    redis.call("EXPIRE", KEYS[1], ttl)
+    return 1
+end
+return 0
+"""
+
+
+class RateLimitExceededError(ValueError):
+    def __init__(self, owner_id: Optional[str], retry_after: float) -> None:
+        self.owner_id = owner_id
+        self.retry_after = retry_after
+        self.message = (
+            "Too many task submissions. "
+            f"Please retry in {math.ceil(retry_after)} seconds."
+        )
+        super().__init__(self.message)
+
+
+class QuotaStore(ABC):
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int, cost: int) -> float:
+        """Take tokens from a token bucket.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait until
+            they are available. Nothing is taken then.
+        """
+
+    @abstractmethod
+    async def refund(self, key: str, burst: int, cost: int) -> None:
+        """Give back tokens taken from a token bucket."""
+
+    @abstractmethod
+    async def acquire(self, key: str, holder: str, limit: int, ttl: int) -> bool:
+        """Take one of `limit` slots for a holder, for at most `ttl` seconds.
+
+        Returns:
+            bool: Whether the holder has a slot, including one it already had.
+        """
+
+    @abstractmethod
+    async def release(self, key: str, holder: str) -> None:
+        """Free the slot of a holder."""
+
+
+class RedisQuotaStore(QuotaStore):
+    def __init__(self, redis: Redis) -> None:
+        self._redis = redis
+
+    async def take(self, key: str, rate: float, burst: int, cost: int) -> float:
+        return float(
+            await self._redis.eval(TAKE_SCRIPT, 1, PREFIX + key, rate, burst, cost)
+        )
+
+    async def refund(self, key: str, burst: int, cost: int) -> None:
+        await self._redis.eval(REFUND_SCRIPT, 1, PREFIX + key, burst, cost)
+
+    async def acquire(self, key: str, holder: str, limit: int, ttl: int) -> bool:
+        return bool(
+            await self._redis.eval(ACQUIRE_SCRIPT, 1, PREFIX + key, holder, limit, ttl)
+        )
+
+    async def release(self, key: str, holder: str) -> None:
+        await self._redis.zrem(PREFIX + key, holder)
+
+
+class MemoryQuotaStore(QuotaStore):
+    def __init__(self) -> None:
+        """Keep quotas in memory. Quotas are not shared with other processes."""
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._slots: dict[str, dict[str, float]] = {}
+
+    async def take(self, key: str, rate: float, burst: int, cost: int) -> float:
+        now = time.monotonic()
+        tokens, at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + max(0.0, now - at) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        return wait
+
+    async def refund(self, key: str, burst: int, cost: int) -> None:
+        if key in self._buckets:
+            tokens, at = self._buckets[key]
+            self._buckets[key] = (min(burst, tokens + cost), at)
+
+    async def acquire(self, key: str, holder: str, limit: int, ttl: int) -> bool:
+        now = time.monotonic()
+        slots = {
+            name: expiry
+            for name, expiry in self._slots.get(key, {}).items()
+            if expiry > now
+        }
+        self._slots[key] = slots
+        if holder not in slots and len(slots) >= limit:
+            return False
+        slots[holder] = now + ttl
+        return True
+
+    async def release(self, key: str, holder: str) -> None:
+        self._slots.get(key, {}).pop(holder, None)
+
+
+class Quotas:
+    def __init__(
+        self,
+        store: QuotaStore,
+        rate: float = 0.0,
+        burst: int = 20,
+        max_running: int = 0,
+        slot_ttl: int = 3600,
+        retry_delay: float = 5.0,
+    ) -> None:
+        """Per-owner limits on task submissions and running tasks.
+
+        Submissions take tokens from a bucket per owner, refilled at `rate` tokens
+        per second up to `burst`. Workers take a slot per owner before running a
+        task; a task whose owner has no free slot goes back to the broker for
+        `retry_delay` seconds, and runs once a task of the same owner ends.
+
+        Args:
+            store (QuotaStore): Where the buckets and slots are kept.
+            rate (float, optional): Submissions per second and owner, 0 disables
+            the rate limit. Defaults to 0.0.
+            burst (int, optional): Submissions an owner can make at once. Defaults
+            to 20.
+            max_running (int, optional): Tasks running at once per owner, 0
+            disables the limit. Defaults to 0.
+            slot_ttl (int, optional): How long, in seconds, a slot is held if its
+            task never releases it. Defaults to 3600.
+            retry_delay (float, optional): How long, in seconds, a task waits for
+            a slot before it is tried again. Defaults to 5.0.
+        """
+        self._store = store
+        self._rate = rate
+        self._burst = burst
+        self._max_running = max_running
+        self._slot_ttl = slot_ttl
+        self._retry_delay = retry_delay
+
+    @property
+    def retry_delay(self) -> float:
+        return self._retry_delay
+
+    async def throttle(self, owner_ids: Iterable[Optional[str]]) -> None:
+        """Take one submission token per task from the bucket of its owner.
+
+        Args:
+            owner_ids (Iterable[Optional[str]]): The owner of every submitted task.
+            Tasks without owner share a bucket.
+
+        Raises:
+            RateLimitExceededError: If an owner has not enough tokens left. A batch
+            larger than `burst` is always refused. The tokens already taken from
+            the other owners are given back.
+        """
+        if self._rate <= 0:
+            return
+        taken: list[tuple[str, int]] = []
+        try:
+            for owner_id, count in Counter(owner_ids).items():
+                if count > self._burst:
+                    raise RateLimitExceededError(owner_id, self._burst / self._rate)
+                key = f"rate:{owner_id or ''}"
+                wait = await self._store.take(key, self._rate, self._burst, count)
+                if wait > 0:
+                    raise RateLimitExceededError(owner_id, wait)
+                taken.append((key, count))
+        except RateLimitExceededError:
+            for key, count in taken:
+                await self._store.refund(key, self._burst, count)
+            raise
+
+    async def acquire(self, task_id: str, owner_id: Optional[str]) -> bool:
+        """Take a running slot of the owner for a task.
+
+        Returns:
+            bool: Whether the task may run now. Always True without a limit.
+        """
+        if self._max_running <= 0:
+            return True
+        return await self._store.acquire(
+            self._slots_key(owner_id), task_id, self._max_running, self._slot_ttl
+        )
+
+    async def release(self, task_id: str, owner_id: Optional[str]) -> None:
+        """Free the running slot of a task, once it is finished."""
+        if self._max_running > 0:
+            await self._store.release(self._slots_key(owner_id), task_id)
+
+    def _slots_key(self, owner_id: Optional[str]) -> str:
+        return f"running:{owner_id or ''}"
+
+
+_quotas: Optional[Quotas] = None
+
+
+def get_quotas() -> Quotas:
+    """Return the quotas of the current process.
+
+    Buckets and slots are kept in Redis when it is configured, in memory otherwise.
+    Without Redis the running slots are disabled: each worker process would keep
+    its own, so `MAX_RUNNING_TASKS` would not hold per owner.
+    """
+    global _quotas
+    if _quotas is None:
+        from discovery.core import config
+        from discovery.core.redis import get_redis_client
+
+        redis = get_redis_client()
+        quota_config = config.quota_config
+        max_running = quota_config.max_running
+        if redis is None and max_running > 0:
+            logger.error(
+                "MAX_RUNNING_TASKS is not enforced: Redis is not configured, so "
+                "the workers cannot share the running slots of an owner"
+            )
+            max_running = 0
+        _quotas = Quotas(
+            RedisQuotaStore(redis) if redis is not None else MemoryQuotaStore(),
+            rate=quota_config.rate,
+            burst=quota_config.burst,
+            max_running=max_running,
+            slot_ttl=quota_config.slot_ttl,
+            retry_delay=quota_config.retry_delay,
+        )
+    return _quotas
@@ -1,76 +1,223 @@
-import asyncio
 import importlib
-import os
-from dataclasses import asdict
-from typing import Callable, Type
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Callable, Optional, Type
 
-from celery import Task
-
-from discovery.core.celery import celery
+from discovery.core import loop
+from discovery.core.events import get_dispatcher
 from discovery.core.logger import logger
-from discovery.runs.run import DefaultParameters, Run
+from discovery.db import init as init_database
+from discovery.runs.dedup import get_deduplicator
+from discovery.runs.manifest import (
+    Manifest,
+    TaskManifest,
+    get_manifest,
+    parameters_type,
+)
+from discovery.runs.quotas import get_quotas
+from discovery.runs.schemas import DefaultParameters, TaskOptions
+
+if TYPE_CHECKING:
+    from celery import Celery, Task
+
+    from discovery.runs.run import Run
+
+# Highest message priority, declared on the task queues for RabbitMQ. Redis
+# supports priorities without it.
+MAX_PRIORITY = 9
+
+# The Celery default of `task_default_queue`, until the tasks are registered.
+DEFAULT_QUEUE = "celery"
+
+# The settings of `TaskOptions` that are attributes of the Celery task.
+TASK_ATTRIBUTES = ("soft_time_limit", "time_limit", "acks_late")
+
+
+@dataclass
+class TaskDefinition:
+    name: str
+    task_class: Type["Run"]
+    parameters: type
+    image: Optional[str]
 
 
 class Registry:
-    def __init__(self):
-        self.tasks: list[str] = []
+    def __init__(self, manifest: Optional[Manifest] = None):
+        """The tasks of the `discovery.tasks` package.
+
+        Tasks are listed from the cached manifest, so neither the API nor the
+        workers import them on startup. A task module is only imported when a
+        worker first runs it. The tasks are registered with Celery by
+        `discovery.core.celery` when it creates the app, so importing the registry
+        does not import Celery: the API only needs it to publish.
+
+        Args:
+            manifest (Optional[Manifest]): The tasks. Defaults to the cached
+            manifest of the tasks package.
+        """
         try:
-            self.find_tasks()
-            self.register_discovered_tasks()
+            self.manifest = manifest if manifest is not None else get_manifest()
+            self.tasks: list[str] = list(self.manifest)
+            self.definitions: dict[str, TaskDefinition] = {}
+            self._parameters: dict[str, type] = {}
+            self.default_queue = DEFAULT_QUEUE
         except Exception as e:
             logger.error(f"Failed to initialize Registry: {e}")
             raise
 
-    def find_tasks(self) -> None:
-        """Dynamically discover tasks from the discovery.tasks directory."""
-        package_name = "discovery.tasks"
-        try:
-            package = importlib.import_module(package_name)
-            package_path = getattr(package, "__path__", [None])[0]
-        except ImportError as e:
-            logger.error(f"Failed to import package {package_name}: {e}")
-            return
-
-        if package_path is None:
-            logger.error("Could not find tasks path")
-            return
-
-        logger.info(f"Discovering tasks in {package_path}...")
-        self._search_package(package_name, package_path)
-
-    def _search_package(self, package_name: str, package_path: str) -> None:
-        """Recursively search the package directory for task modules."""
-        for filename in os.listdir(package_path):
-            file_path = os.path.join(package_path, filename)
-            if os.path.isdir(file_path):
-                self._search_package(f"{package_name}.{filename}", file_path)
-            elif filename.endswith(".py") and filename != "__init__.py":
-                task_full_name = f"{package_name}.{filename[:-3]}"  # Remove '.py'
-                self.tasks.append(task_full_name)
-                logger.info(f"Discovered task module: {task_full_name}")
-
-    def register_discovered_tasks(self):
-        """Register the discovered tasks with Celery."""
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifest
+
+    def get(self, name: str) -> Optional[TaskManifest]:
+        """Return the manifest entry of a task, None if it is unknown."""
+        return self.manifest.get(name)
+
+    def parameters(self, name: str) -> type:
+        """Return the parameters type of a task, derived from its JSON schema.
+
+        The task module is not imported, so the API can validate submissions
+        without loading the tasks.
+
+        Raises:
+            KeyError: If the task is unknown.
+        """
+        parameters = self._parameters.get(name)
+        if parameters is None:
+            parameters = self._parameters[name] = parameters_type(
+                self.manifest[name].parameters
+            )
+        return parameters
+
+    def definition(self, name: str) -> TaskDefinition:
+        """Return the definition of a task, importing its module the first time.
+
+        Raises:
+            RuntimeError: If the module cannot be imported or is not a valid task.
+        """
+        definition = self.definitions.get(name)
+        if definition is None:
+            self._import_task_module(name)
+            definition = self.definitions[name]
+        return definition
+
+    def options(self, name: str) -> TaskOptions:
+        """Return the Celery settings declared by a task.
+
+        Raises:
+            KeyError: If the task is unknown.
+        """
+        return TaskOptions(**self.manifest[name].options)
+
+    def queues(self) -> list[str]:
+        """Return the queues the tasks are routed to, the default one first."""
+        default = self.default_queue
+        declared = {self.options(name).queue for name in self.tasks} - {None, default}
+        return [default, *sorted(declared)]
+
+    def prefetch_multiplier(self, queues: list[str]) -> Optional[int]:
+        """Return the smallest prefetch multiplier declared by the tasks routed to
+        the given queues, None if none declares one."""
+        default = self.default_queue
+        multipliers = [
+            options.prefetch_multiplier
+            for options in map(self.options, self.tasks)
+            if (options.queue or default) in queues
+            and options.prefetch_multiplier is not None
+        ]
+        return min(multipliers, default=None)
+
+    def register_discovered_tasks(self, celery: "Celery") -> None:
+        """Register the discovered tasks with Celery, with their declared queue,
+        priority, time limits and acknowledgement.
+
+        Tasks are published by name, so the queue and priority are set as routes.
+        Every queue is declared so that a worker started without `-Q` still
+        consumes all the tasks.
+
+        Args:
+            celery (Celery): The Celery app.
+        """
+        from kombu import Exchange, Queue
+
+        default_queue = self.default_queue = celery.conf.task_default_queue
+        routes = {}
         for task_name in self.tasks:
             try:
+                options = self.options(task_name)
+                attributes = {
+                    key: value
+                    for key, value in options.declared().items()
+                    if key in TASK_ATTRIBUTES
+                }
                 task = self._create_task_wrapper(task_name)
-                celery.task(name=task_name, bind=True)(task)
+                celery.task(name=task_name, bind=True, **attributes)(task)
+                route = {
+                    key: value
+                    for key, value in options.declared().items()
+                    if key in ("queue", "priority")
+                }
+                if route:
+                    routes[task_name] = route
                 logger.info(f"Registered task: {task_name} with Celery.")
             except Exception as e:
                 logger.error(f"Failed to register task {task_name}: {e}")
+        celery.conf.task_routes = routes
+        celery.conf.task_queues = [
+            Queue(
+                name,
+                Exchange(name),
+                routing_key=name,
+                max_priority=None if name == default_queue else MAX_PRIORITY,
+            )
+            for name in self.queues()
+        ]
 
     def _create_task_wrapper(self, task_name: str) -> Callable:
-        module = self._import_task_module(task_name)
+        async def execute(task: "Run", **kwargs) -> dict:
+            # The solo pool never fires worker_process_init.
+            await init_database()
+            task_id = task.task.request.id
+            if not await acquire(task_id, kwargs):
+                # Back to the broker until a task of the owner ends. The
+                # submission stays in flight meanwhile.
+                raise task.task.retry(
+                    countdown=get_quotas().retry_delay, max_retries=None
+                )
+            try:
+                await task.validate_parameters(**kwargs)
+                return asdict(await task.run(**kwargs))
+            finally:
+                await release(task_id, kwargs)
+                # The loop only runs while a task executes, so deliver the
+                # queued events before returning to Celery.
+                await get_dispatcher().flush()
 
-        def task_wrapper(task_instance: Task, **kwargs):
-            task = module(task=task_instance)
-            task.validate_parameters(**kwargs)
-            result = asyncio.run(task.run(**kwargs))
-            return asdict(result)
+        async def acquire(task_id: str, kwargs: dict) -> bool:
+            try:
+                return await get_quotas().acquire(task_id, kwargs.get("owner_id"))
+            except Exception as err:
+                logger.warning(f"Failed to acquire a slot for {task_id}: {err}")
+                return True
+
+        async def release(task_id: str, kwargs: dict) -> None:
+            try:
+                await get_quotas().release(task_id, kwargs.get("owner_id"))
+            except Exception as err:
+                logger.warning(f"Failed to release the slot of {task_id}: {err}")
+            try:
+                await get_deduplicator().release(task_id, task_name, kwargs)
+            except Exception as err:
+                logger.warning(f"Failed to release submission {task_id}: {err}")
+
+        def task_wrapper(task_instance: "Task", **kwargs):
+            task = self.definition(task_name).task_class(task=task_instance)
+            return loop.run(execute(task, **kwargs))
 
         return task_wrapper
 
-    def _import_task_module(self, task_name: str) -> Type[Run]:
+    def _import_task_module(self, task_name: str) -> Type["Run"]:
+        # Pulls in docker and boto3, only needed once a task runs.
+        from discovery.runs.run import Run
+
         try:
             module = importlib.import_module(task_name)
             task_class = getattr(module, "Task", None)
@@ -79,6 +226,12 @@ class Registry:
                 DefaultParameters
             ):
                 logger.info(f"Validated task module: {task_name}")
+                self.definitions[task_name] = TaskDefinition(
+                    name=task_name,
+                    task_class=task_class,
+                    parameters=params_class,
+                    image=getattr(module, "IMAGE", None),
+                )
                 return task_class
             else:
                 raise RuntimeError(
@@ -90,3 +243,13 @@ class Registry:
 
 
 registry = Registry()
+
+
+def apply_prefetch_multiplier(sender, **kwargs) -> None:
+    """Use the prefetch multiplier declared by the tasks of the consumed queues,
+    so a pool dedicated to long scans does not reserve messages it cannot run."""
+    queues = list(sender.app.amqp.queues.consume_from)
+    multiplier = registry.prefetch_multiplier(queues)
+    if multiplier is not None:
+        logger.info(f"Prefetch multiplier of queues {queues}: {multiplier}")
+        sender.prefetch_multiplier = multiplier
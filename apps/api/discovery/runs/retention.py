@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+from typing import Optional
+
+from tortoise import timezone
+
+from discovery.core import config, loop
+from discovery.core.celery import celery
+from discovery.core.logger import logger
+from discovery.db import init as init_database
+from discovery.db.archive import ArchiveStore, archive_key, encode
+from discovery.db.models import Run
+from discovery.db.repositories.runs import Repository
+
+COMPACT_TASK = "discovery.runs.retention.compact"
+
+
+async def archive_run(run: Run, repository: Repository, store: ArchiveStore) -> bool:
+    """Move the result and errors of a run to object storage.
+
+    Args:
+        run (Run): The run to archive.
+        repository (Repository): The runs repository.
+        store (ArchiveStore): Where to store the archive.
+
+    Returns:
+        bool: True if the run was archived, False if it changed in the meantime.
+    """
+    key = archive_key(run.id)
+    data = encode({"result": run.result, "errors": run.errors})
+    await store.put(key, data)
+    pointer = {
+        "key": key,
+        "size": len(data),
+        "result_size": len(json.dumps(run.result, separators=(",", ":")).encode()),
+        "errors_count": len(run.errors),
+        "archived_at": timezone.now().isoformat(),
+    }
+    if not await repository.archive(run, pointer):
+        await store.delete(key)
+        return False
+    await repository.invalidate(run.id)
+    return True
+
+
+async def compact(
+    older_than: timedelta,
+    batch_size: int = 100,
+    repository: Optional[Repository] = None,
+    store: Optional[ArchiveStore] = None,
+) -> int:
+    """Archive the finished runs created more than `older_than` ago.
+
+    Runs are read and archived in batches of `batch_size`, oldest first, until no
+    run is left or a whole batch was modified concurrently.
+
+    Args:
+        older_than (timedelta): The minimum age of the runs to archive.
+        batch_size (int, optional): The number of runs per batch. Defaults to 100.
+        repository (Optional[Repository], optional): The runs repository.
+        store (Optional[ArchiveStore], optional): Where to store the archives.
+        Defaults to the repository archive store.
+
+    Returns:
+        int: The number of archived runs.
+    """
+    repository = repository or Repository()
+    store = store or repository.archive_store
+    before = timezone.now() - older_than
+    archived = 0
+    while True:
+        runs = await repository.archivable(before, batch_size)
+        done = 0
+        for run in runs:
+            done += await archive_run(run, repository, store)
+        archived += done
+        if len(runs) < batch_size or done == 0:
+            return archived
+
+
+@celery.task(name=COMPACT_TASK)
+def compact_task() -> int:
+    retention_config = config.retention_config
+
+    async def execute() -> int:
+        await init_database()
+        return await compact(
+            timedelta(days=retention_config.max_age_days),
+            batch_size=retention_config.batch_size,
+        )
+
+    archived = loop.run(execute())
+    logger.info(f"Archived {archived} runs")
+    return archived
@@ -1,59 +1,22 @@
-import asyncio
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
 from datetime import datetime
-from typing import (
-    Generic,
-    NotRequired,
-    TypedDict,
-    TypeVar,
-    Unpack,
-    get_args,
-    get_origin,
-)
+from typing import Generic, TypeVar, Unpack, get_args, get_origin
 
 from celery import Task
-from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel, ValidationError, field_validator
+from pydantic import ValidationError
 
 from discovery.containers.container import Container
 from discovery.containers.volume import ContainerVolume
 from discovery.core import config
-from discovery.core.pusher import Channels, Events, get_pusher_client
+from discovery.core.events import Dispatcher, Event, get_dispatcher
+from discovery.core.pusher import Channels, Events
 from discovery.db.models import Run as Model
 from discovery.db.models import RunStatus as Status
-from discovery.utils import validate_domain
-
-
-class DefaultParameters(TypedDict):
-    owner_id: str
-    parent_id: NotRequired[str]
-
-
-@dataclass
-class RunResult:
-    id: str
-
-
-T = TypeVar("T")
-
-
-class GenericParamsValidator(BaseModel, Generic[T]):
-    params: T
-
-    class Config:
-        arbitrary_types_allowed = True
-
-
-class ParamsValidator(GenericParamsValidator[T], Generic[T]):
-    @field_validator("params", check_fields=False)
-    def domain_must_be_registered(cls, options: Unpack[T]) -> str:
-        if "domain" in options and validate_domain(options["domain"]) is False:
-            msg = "Invalid domain."
-            raise ValueError(msg)
-
-        return options
-
+from discovery.db.repositories.runs import Repository, Transition
+from discovery.runs.schemas import DefaultParameters as DefaultParameters
+from discovery.runs.schemas import GenericParamsValidator as GenericParamsValidator
+from discovery.runs.schemas import ParamsValidator as ParamsValidator
+from discovery.runs.schemas import RunResult as RunResult
 
 Parameters = TypeVar("Parameters", bound=DefaultParameters)
 
@@ -65,17 +28,22 @@ class Run(ABC, Generic[Parameters]):
         task: Task,
         container: Container | None = None,
         container_volume: ContainerVolume | None = None,
+        repository: Repository | None = None,
+        dispatcher: Dispatcher | None = None,
     ) -> None:
         if not image:
             raise ValueError("No image provided")
 
         self._image = image
         self._task = task
-        self._container = container or Container(docker_config=config.docker_config)
+        self._container = container or Container(
+            docker_config=config.docker_config, worker=task.request.hostname
+        )
         self._container_volume = container_volume or ContainerVolume(
             base_path=config.docker_config.volumes_path
         )
-        self._pusher = get_pusher_client()
+        self._repository = repository or Repository()
+        self._dispatcher = dispatcher or get_dispatcher()
 
     def _get_parameters(self):
         orig_bases = self.__orig_bases__
@@ -90,93 +58,100 @@ class Run(ABC, Generic[Parameters]):
 
     async def on_created(self, **params: Unpack[Parameters]) -> None:
         """Called when the container is created."""
-        await Model(
-            id=self.task.request.id,
-            name=self.image,
-            parameters=params,
-            owner_id=params.get("owner_id"),
-            parent=params.get("parent_id"),
-        ).save()
-        self._pusher.trigger(
-            Channels.RUNS,
-            Events.RUN_CREATED,
-            {
-                "id": self.task.request.id,
-                "name": self.image,
-                "parameters": params,
-                "owner_id": params.get("owner_id"),
-                "parent_id": params.get("parent_id"),
-            },
-        )
-
-    async def on_started(self) -> None:
-        """Called when the container is started."""
-        run = await Model.filter(id=self.task.request.id).first()
-        if run:
-            prev_status = run.status
-            run.status = Status.RUNNING
-            run.started_at = datetime.now(tz=config.timezone)
-            await run.save()
-            self._pusher.trigger(
+        # Batch submissions create their runs before publishing them.
+        if not await Model.filter(id=self.task.request.id).exists():
+            await self.repository.add(
+                Model(
+                    id=self.task.request.id,
+                    name=self.image,
+                    parameters=params,
+                    owner_id=params.get("owner_id"),
+                    parent_id=params.get("parent_id"),
+                )
+            )
+            await self.repository.invalidate(params.get("parent_id"))
+        await self._dispatcher.publish(
+            Event(
                 Channels.RUNS,
-                Events.RUN_STATUS_CHANGED,
+                Events.RUN_CREATED,
                 {
                     "id": self.task.request.id,
-                    "name": run.name,
-                    "owner_id": run.owner_id,
-                    "status": [
-                        prev_status.value,
-                        run.status.value,
-                    ],
+                    "name": self.image,
+                    "parameters": params,
+                    "owner_id": params.get("owner_id"),
+                    "parent_id": params.get("parent_id"),
                 },
+                key=self.task.request.id,
             )
+        )
+
+    async def on_started(self) -> None:
+        """Called when the container is started."""
+        transition = await self.repository.transition(
+            self.task.request.id,
+            Status.RUNNING,
+            started_at=datetime.now(tz=config.timezone),
+        )
+        if transition:
+            await self._notify_status_changed(transition)
 
     @abstractmethod
     async def on_finished(self) -> None:
         """Called when the container run is finished."""
 
     async def on_error(self, error: dict[str, str]) -> None:
-        run = await Model.filter(id=self.task.request.id).first()
-        if run:
-            prev_status = run.status
-            run.status = Status.FAILED
-            run.errors.append(
-                jsonable_encoder(
-                    {
-                        "message": error,
-                        "timestamp": datetime.now(
-                            tz=config.timezone,
-                        ).isoformat(),
-                    }
-                )
-            )
-            run.failed_at = datetime.now(tz=config.timezone)
-            await run.save()
-            self._pusher.trigger(
+        entry = {
+            "message": error,
+            "timestamp": datetime.now(tz=config.timezone).isoformat(),
+        }
+        transition = await self.repository.transition(
+            self.task.request.id,
+            Status.FAILED,
+            error=entry,
+            failed_at=datetime.now(tz=config.timezone),
+        )
+        if transition:
+            await self._notify_status_changed(transition)
+        elif await self.repository.append_error(self.task.request.id, entry):
+            await self.repository.invalidate(self.task.request.id)
+
+    async def _notify_status_changed(self, transition: Transition) -> None:
+        """Invalidate the cached reads of a run and queue its status change event.
+
+        Rapid changes of the same run are coalesced into a single event by the
+        dispatcher.
+        """
+        run = transition.run
+        await self.repository.invalidate(run.id)
+        await self._dispatcher.publish(
+            Event(
                 Channels.RUNS,
                 Events.RUN_STATUS_CHANGED,
                 {
-                    "id": self.task.request.id,
-                    "owner_id": run.owner_id,
+                    "id": run.id,
                     "name": run.name,
+                    "owner_id": run.owner_id,
+                    "parent_id": run.parent_id,
                     "status": [
-                        prev_status.value,
+                        transition.previous.value,
                         run.status.value,
                     ],
                 },
+                key=run.id,
             )
+        )
 
-    def validate_parameters(self, **params: Unpack[Parameters]) -> None:
+    async def validate_parameters(self, **params: Unpack[Parameters]) -> None:
         """Validate the parameters."""
         try:
             prams_cls = self._get_parameters()
-            asyncio.run(self.on_created(**params))
+            await self.on_created(**params)
             ParamsValidator[prams_cls].model_validate(
                 obj={"params": params},
                 strict=True,
             )
         except ValidationError as err:
-            asyncio.run(self.on_error(error=err.errors()))
+            await self.on_error(error=err.errors())
             raise err
 
     @property
@@ -198,3 +173,8 @@ class Run(ABC, Generic[Parameters]):
     def container(self) -> Container:
         """Return an instance of the Container class."""
         return self._container
+
+    @property
+    def repository(self) -> Repository:
+        """Return an instance of the runs Repository class."""
+        return self._repository
@@ -0,0 +1,75 @@
+from dataclasses import dataclass, fields
+from typing import Any, Generic, NotRequired, Optional, TypedDict, TypeVar, Unpack
+
+from pydantic import BaseModel, field_validator
+
+from discovery.utils import validate_domain
+
+
+class DefaultParameters(TypedDict):
+    owner_id: str
+    parent_id: NotRequired[str]
+
+
+@dataclass
+class RunResult:
+    id: str
+
+
+@dataclass
+class TaskOptions:
+    """Celery settings of a task, declared by its module as `OPTIONS`.
+
+    Attributes:
+        queue (Optional[str]): The queue the task is routed to, so a worker pool
+        can be sized for it with `celery worker -Q <queue>`. Defaults to the
+        Celery default queue.
+        priority (Optional[int]): The priority of the messages, 0 to 9. On Redis
+        lower values are consumed first.
+        soft_time_limit (Optional[float]): Seconds before `SoftTimeLimitExceeded`
+        is raised in the task.
+        time_limit (Optional[float]): Seconds before the worker process is killed.
+        prefetch_multiplier (Optional[int]): The prefetch multiplier of workers
+        consuming the queue of the task.
+        acks_late (Optional[bool]): Acknowledge the message once the task ends,
+        so it is redelivered if the worker dies. Keep `time_limit` below the
+        broker visibility timeout (an hour on Redis) to avoid duplicate runs.
+
+    Container scans hold a worker process for minutes, so they are usually not
+    prefetched (`prefetch_multiplier=1`) and acknowledged late.
+    """
+
+    queue: Optional[str] = None
+    priority: Optional[int] = None
+    soft_time_limit: Optional[float] = None
+    time_limit: Optional[float] = None
+    prefetch_multiplier: Optional[int] = None
+    acks_late: Optional[bool] = None
+
+    def declared(self) -> dict[str, Any]:
+        """Return the options that are set."""
+        return {
+            field.name: getattr(self, field.name)
+            for field in fields(self)
+            if getattr(self, field.name) is not None
+        }
+
+
+T = TypeVar("T")
+
+
+class GenericParamsValidator(BaseModel, Generic[T]):
+    params: T
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class ParamsValidator(GenericParamsValidator[T], Generic[T]):
+    @field_validator("params", check_fields=False)
+    def domain_must_be_registered(cls, options: Unpack[T]) -> str:
+        if "domain" in options and validate_domain(options["domain"]) is False:
+            msg = "Invalid domain."
+            raise ValueError(msg)
+
+        return options
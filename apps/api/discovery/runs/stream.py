@@ -0,0 +1,82 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class Batcher(Generic[T]):
+    def __init__(
+        self,
+        on_batch: Callable[[list[T]], Awaitable[None]],
+        size: int = 100,
+        window: float = 10.0,
+    ) -> None:
+        """Group streamed items into batches.
+
+        A batch is dispatched as soon as it holds `size` items or `window` seconds
+        after its first item was added, whichever comes first.
+
+        Args:
+            on_batch (Callable[[list[T]], Awaitable[None]]): Called with every batch.
+            size (int, optional): Maximum number of items per batch. Defaults to 100.
+            window (float, optional): Maximum time in seconds an item waits before
+            its batch is dispatched. Defaults to 10.0.
+        """
+        if size < 1:
+            raise ValueError("Batch size must be at least 1")
+        if window <= 0:
+            raise ValueError("Batch window must be positive")
+
+        self._on_batch = on_batch
+        self._size = size
+        self._window = window
+        self._items: list[T] = []
+        self._timer: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._batches = 0
+
+    async def add(self, item: T) -> None:
+        """Add an item, dispatching the current batch if it is full.
+
+        Args:
+            item (T): The item to add.
+        """
+        self._items.append(item)
+        if len(self._items) >= self._size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+
+    async def flush(self) -> None:
+        """Dispatch the pending items, if any."""
+        async with self._lock:
+            self._cancel_timer()
+            while self._items:
+                batch = self._items[: self._size]
+                self._items = self._items[self._size :]
+                self._batches += 1
+                await self._on_batch(batch)
+
+    async def close(self) -> None:
+        """Dispatch the remaining items and stop the window timer."""
+        await self.flush()
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self._window)
+        self._timer = None
+        await self.flush()
+
+    def _cancel_timer(self) -> None:
+        timer, self._timer = self._timer, None
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    @property
+    def batches(self) -> int:
+        """Return the number of batches dispatched so far."""
+        return self._batches
+
+    @property
+    def pending(self) -> int:
+        """Return the number of items waiting for the next batch."""
+        return len(self._items)
@@ -0,0 +1,222 @@
+import asyncio
+from functools import partial
+from typing import Any, Optional, Sequence
+from uuid import uuid4
+
+from pydantic import BaseModel, ValidationError
+
+from discovery.core.logger import logger
+from discovery.db.models import Run as Model
+from discovery.db.models import RunStatus as Status
+from discovery.db.repositories.runs import Repository
+from discovery.runs.dedup import Deduplicator, get_deduplicator
+from discovery.runs.quotas import Quotas, get_quotas
+from discovery.runs.registry import registry
+from discovery.runs.schemas import GenericParamsValidator, ParamsValidator
+
+MAX_BATCH_SIZE = 1000
+
+
+class TaskRequest(BaseModel):
+    task: str
+    params: dict[str, Any]
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class InvalidTaskRequestsError(ValueError):
+    def __init__(self, errors: list[dict[str, Any]]) -> None:
+        self.errors = errors
+        self.message = "Invalid task requests."
+        super().__init__(self.message)
+
+
+def validate_requests(requests: Sequence[TaskRequest]) -> None:
+    """Check that every request targets a registered task with valid parameters.
+
+    Only the shape of the parameters is checked here. Checks that need the network
+    (e.g. domain resolution) are left to the worker.
+
+    Args:
+        requests (Sequence[TaskRequest]): The task requests.
+
+    Raises:
+        InvalidTaskRequestsError: With the index and error of every invalid request.
+    """
+    if not 1 <= len(requests) <= MAX_BATCH_SIZE:
+        raise InvalidTaskRequestsError(
+            [{"message": f"Submit between 1 and {MAX_BATCH_SIZE} tasks."}]
+        )
+
+    errors = []
+    for index, request in enumerate(requests):
+        if request.task not in registry:
+            errors.append({"index": index, "message": f"Invalid task: {request.task}"})
+            continue
+        try:
+            GenericParamsValidator[registry.parameters(request.task)].model_validate(
+                obj={"params": request.params}, strict=True
+            )
+        except ValidationError as err:
+            errors.append({"index": index, "message": err.errors(include_url=False)})
+    if errors:
+        raise InvalidTaskRequestsError(errors)
+
+
+async def preflight(request: TaskRequest) -> None:
+    """Validate a task request as its worker would, before it is published.
+
+    The parameters go through the `ParamsValidator` of the task, domain resolution
+    included. Their types come from the manifest of the task, which is not
+    imported. The resolution is a blocking HTTP request, so requests with a
+    `domain` are validated in a thread.
+
+    Args:
+        request (TaskRequest): The task request.
+
+    Raises:
+        InvalidTaskRequestsError: If the task is unknown or its parameters invalid.
+    """
+    if request.task not in registry:
+        raise InvalidTaskRequestsError([{"message": f"Invalid task: {request.task}"}])
+    validate = partial(
+        ParamsValidator[registry.parameters(request.task)].model_validate,
+        obj={"params": request.params},
+        strict=True,
+    )
+    try:
+        if "domain" in request.params:
+            await asyncio.to_thread(validate)
+        else:
+            validate()
+    except ValidationError as err:
+        raise InvalidTaskRequestsError(
+            [{"message": err.errors(include_url=False, include_context=False)}]
+        ) from None
+
+
+def publish(messages: Sequence[tuple[str, str, dict[str, Any]]]) -> None:
+    """Publish tasks to the broker over a single connection and producer.
+
+    Args:
+        messages (Sequence[tuple[str, str, dict[str, Any]]]): The task IDs, names
+        and keyword arguments.
+    """
+    # Importing the Celery app registers the task routes, only needed to publish.
+    from discovery.core.celery import celery
+
+    with celery.producer_or_acquire() as producer:
+        for task_id, name, kwargs in messages:
+            celery.send_task(name, kwargs=kwargs, task_id=task_id, producer=producer)
+
+
+async def submit(
+    request: TaskRequest,
+    idempotency_key: Optional[str] = None,
+    dedup: bool = False,
+    deduplicator: Optional[Deduplicator] = None,
+    quotas: Optional[Quotas] = None,
+) -> tuple[str, bool]:
+    """Publish a task, unless the same submission was already made.
+
+    Args:
+        request (TaskRequest): The task request.
+        idempotency_key (Optional[str]): A key sent again by the client when it
+        retries the request. A replay returns the task of the first request.
+        dedup (bool): Whether to return an equivalent task (same name and
+        normalized parameters, including the owner) still in flight instead of
+        publishing a new one.
+        deduplicator (Optional[Deduplicator]): Where submissions are claimed.
+        quotas (Optional[Quotas]): The rate limits of the owners.
+
+    Returns:
+        tuple[str, bool]: The task ID, and whether it is an existing task.
+
+    Raises:
+        RateLimitExceededError: If the owner submitted too many tasks.
+        InvalidTaskRequestsError: If the request is invalid. Nothing is submitted.
+        DeduplicationUnavailableError: If an idempotency key or dedup is asked for
+        without Redis.
+    """
+    deduplicator = deduplicator or get_deduplicator()
+    task_id = str(uuid4())
+    existing = await deduplicator.claim(
+        task_id, request.task, request.params, idempotency_key, dedup
+    )
+    if existing is not None:
+        # Replays of an accepted task are answered as is: they neither spend
+        # tokens of the owner nor resolve the domain again.
+        return existing, True
+
+    try:
+        await (quotas or get_quotas()).throttle([request.params.get("owner_id")])
+        await preflight(request)
+        await asyncio.to_thread(publish, [(task_id, request.task, request.params)])
+    except Exception:
+        await deduplicator.abandon(
+            task_id, request.task, request.params, idempotency_key
+        )
+        raise
+    return task_id, False
+
+
+async def submit_batch(
+    requests: Sequence[TaskRequest],
+    repository: Optional[Repository] = None,
+    quotas: Optional[Quotas] = None,
+) -> list[str]:
+    """Validate, record and publish a batch of tasks.
+
+    The runs are created up front with one bulk INSERT, under task IDs generated
+    here, then every task is published with the same broker producer. Workers find
+    their run already created.
+
+    Args:
+        requests (Sequence[TaskRequest]): The task requests.
+        repository (Optional[Repository]): The runs repository.
+        quotas (Optional[Quotas]): The rate limits of the owners.
+
+    Returns:
+        list[str]: The task (and run) IDs, in the order of the requests.
+
+    Raises:
+        InvalidTaskRequestsError: If a request is invalid. Nothing is submitted.
+        RateLimitExceededError: If an owner submitted too many tasks. Nothing is
+        submitted.
+    """
+    validate_requests(requests)
+    await (quotas or get_quotas()).throttle(
+        request.params.get("owner_id") for request in requests
+    )
+    repository = repository or Repository()
+    ids = [str(uuid4()) for _ in requests]
+    runs = [
+        Model(
+            id=_id,
+            name=registry.get(request.task).image or request.task,
+            parameters=request.params,
+            owner_id=request.params.get("owner_id"),
+            parent_id=request.params.get("parent_id"),
+        )
+        for _id, request in zip(ids, requests)
+    ]
+    await repository.add(*runs)
+    await repository.invalidate(*{run.parent_id for run in runs})
+
+    try:
+        await asyncio.to_thread(
+            publish,
+            [
+                (_id, request.task, request.params)
+                for _id, request in zip(ids, requests)
+            ],
+        )
+    except Exception as err:
+        logger.error(f"Failed to publish {len(ids)} tasks: {err}")
+        for _id in ids:
+            await repository.transition(
+                _id, Status.FAILED, error={"message": "Failed to publish the task."}
+            )
+        raise
+    return ids
@@ -8,12 +8,20 @@ from celery import Task
 from pydantic import BaseModel, Field
 
 from discovery.core import config
-from discovery.core.pusher import Channels, Events
-from discovery.db.models import Run as Model
 from discovery.db.models import RunStatus as Status
 from discovery.runs.run import DefaultParameters, Run, RunResult
+from discovery.runs.schemas import TaskOptions
 from discovery.utils import validate_domain
 
+IMAGE = "projectdiscovery/httpx:latest"
+OPTIONS = TaskOptions(
+    queue="httpx",
+    soft_time_limit=3000,
+    time_limit=3300,
+    prefetch_multiplier=1,
+    acks_late=True,
+)
+
 
 class Item(BaseModel):
     ip_address: list[str] = Field(alias="a")
@@ -54,7 +62,7 @@ BASE = Run[Parameters]
 class Task(BASE):
     def __init__(self, task: Task) -> None:
         super().__init__(
-            image="projectdiscovery/httpx:latest",
+            image=IMAGE,
             task=task,
         )
 
@@ -99,29 +107,15 @@ class Task(BASE):
 
     async def on_finished(self) -> None:
         """Called when the container run is finished."""
-        run = await Model.filter(id=self.task.request.id).first()
-        if run:
-            prev_status = run.status
-            run.result = self.parse_results().model_dump()
-            run.files = [
-                asdict(file) for file in self.container_volume.upload_files_to_s3()
-            ]
-            run.status = Status.SUCCESS
-            run.completed_at = datetime.now(tz=config.timezone)
-            await run.save()
-            self._pusher.trigger(
-                Channels.RUNS,
-                Events.RUN_STATUS_CHANGED,
-                {
-                    "id": self.task.request.id,
-                    "name": run.name,
-                    "owner_id": run.owner_id,
-                    "status": [
-                        prev_status.value,
-                        run.status.value,
-                    ],
-                },
-            )
+        transition = await self.repository.transition(
+            self.task.request.id,
+            Status.SUCCESS,
+            result=self.parse_results().model_dump(),
+            files=[asdict(file) for file in self.container_volume.upload_files_to_s3()],
+            completed_at=datetime.now(tz=config.timezone),
+        )
+        if transition:
+            await self._notify_status_changed(transition)
 
     def export_domains(self, domains: list[str]) -> None:
         path = "domains.txt"
@@ -1,25 +1,43 @@
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from typing import Unpack
+from typing import NotRequired, Optional, Unpack
+from uuid import uuid4
 
 from celery import Task
 
 from discovery.core import config
 from discovery.core.celery import celery
-from discovery.core.pusher import Channels, Events
-from discovery.db.models import Run as Model
 from discovery.db.models import RunStatus as Status
 from discovery.runs.run import DefaultParameters, Run, RunResult
 from discovery.runs.run import ParamsValidator as ParamsValidator
+from discovery.runs.schemas import TaskOptions
+from discovery.runs.stream import Batcher
+
+IMAGE = "projectdiscovery/subfinder:latest"
+# Passive enumeration of a single domain takes a few minutes at most.
+OPTIONS = TaskOptions(
+    queue="subfinder",
+    soft_time_limit=600,
+    time_limit=900,
+    prefetch_multiplier=1,
+    acks_late=True,
+)
+HTTPX_TASK = "discovery.tasks.projectdiscovery.httpx"
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_BATCH_WINDOW = 10.0
 
 
 class Parameters(DefaultParameters):
     domain: str
+    stream: NotRequired[bool]
+    batch_size: NotRequired[int]
+    batch_window: NotRequired[float]
 
 
 @dataclass
 class Result:
     domains: list[str]
+    batches: list[str] = field(default_factory=list)
 
 
 BASE = Run[Parameters]
@@ -28,14 +46,25 @@ BASE = Run[Parameters]
 class Task(BASE):
     def __init__(self, task: Task) -> None:
         super().__init__(
-            image="projectdiscovery/subfinder:latest",
+            image=IMAGE,
             task=task,
         )
+        self._owner_id: str | None = None
+        self._batcher: Batcher[str] | None = None
+        self._batches: list[str] = []
+        self._streamed: set[str] = set()
 
     async def run(self, **params: Unpack[Parameters]) -> RunResult:
         domain = params.get("domain")
         mounted = self.container_volume.mount()
         command = f"-d {domain}\r" f"-o {mounted.guest}/domains.txt"
+        self._owner_id = params.get("owner_id")
+        if params.get("stream", False):
+            self._batcher = Batcher(
+                on_batch=self.dispatch_batch,
+                size=params.get("batch_size", DEFAULT_BATCH_SIZE),
+                window=params.get("batch_window", DEFAULT_BATCH_WINDOW),
+            )
         try:
             await self.container.run(
                 image=self.image,
@@ -43,6 +72,7 @@ class Task(BASE):
                 volume=mounted,
                 on_start=lambda: self.on_started(),
                 on_finish=lambda: self.on_finished(),
+                on_output=self.on_output if self._batcher else None,
             )
             return RunResult(self.task.request.id)
 
@@ -52,40 +82,51 @@ class Task(BASE):
         finally:
             self.container_volume.cleanup()
 
+    async def on_output(self, line: str) -> None:
+        """Called with every domain subfinder reports while it is still running."""
+        if line not in self._streamed:
+            self._streamed.add(line)
+            await self._batcher.add(line)
+
+    async def dispatch_batch(self, domains: list[str]) -> None:
+        """Start an httpx run for a batch of discovered domains."""
+        self._batches.append(self._publish(domains))
+
+    def _publish(self, domains: list[str], task_id: Optional[str] = None) -> str:
+        return celery.send_task(
+            name=HTTPX_TASK,
+            kwargs={
+                "owner_id": self._owner_id,
+                "parent_id": self.task.request.id,
+                "domains": domains,
+            },
+            task_id=task_id,
+        ).id
+
     async def on_finished(self) -> None:
         """Called when the container run is finished."""
-        run = await Model.filter(id=self.task.request.id).first()
-        if run:
-            prev_status = run.status
-            domains = self.get_domains()
-            run.result = asdict(domains)
-            run.files = [
-                asdict(file) for file in self.container_volume.upload_files_to_s3()
-            ]
-            run.status = Status.SUCCESS
-            run.completed_at = datetime.now(tz=config.timezone)
-            await run.save()
-            self._pusher.trigger(
-                Channels.RUNS,
-                Events.RUN_STATUS_CHANGED,
-                {
-                    "id": self.task.request.id,
-                    "name": run.name,
-                    "owner_id": run.owner_id,
-                    "status": [
-                        prev_status.value,
-                        run.status.value,
-                    ],
-                },
-            )
-            celery.send_task(
-                name="discovery.tasks.projectdiscovery.httpx",
-                kwargs={
-                    "owner_id": run.owner_id,
-                    "parent_id": run.id,
-                    "domains": domains.domains,
-                },
-            )
+        domains = self.get_domains()
+        if self._batcher:
+            # Domains missed by the output stream are still scanned.
+            for domain in domains.domains:
+                await self.on_output(domain)
+            await self._batcher.close()
+        elif domains.domains:
+            # Published once the run is saved, under the ID recorded in its result.
+            self._batches.append(str(uuid4()))
+        domains.batches = self._batches
+        transition = await self.repository.transition(
+            self.task.request.id,
+            Status.SUCCESS,
+            result=asdict(domains),
+            files=[asdict(file) for file in self.container_volume.upload_files_to_s3()],
+            completed_at=datetime.now(tz=config.timezone),
+        )
+        if not transition:
+            return
+        await self._notify_status_changed(transition)
+        if not self._batcher and domains.domains:
+            self._publish(domains.domains, task_id=self._batches[0])
 
     def get_domains(self) -> Result:
         domains = self.container_volume.read("domains.txt").splitlines()
@@ -1,9 +1,11 @@
 import ipaddress
 from re import compile, sub
 
-import requests
 from fastapi.routing import APIRoute
 
+# Seconds to wait for the DNS-over-HTTPS resolver.
+DNS_TIMEOUT = 5
+
 
 def custom_generate_unique_id(route: APIRoute):
     return f"{camel_case(route.name)}-{route.tags[0]}"
@@ -22,6 +24,9 @@ def validate_domain(domain: str) -> bool:
         r"([a-zA-Z]{2,13}|[a-zA-Z0-9-]{2,30}.[a-zA-Z]{2,3})$"
     )
     if pattern.match(domain):
+        # Only needed to validate domains, not to serve the API.
+        import requests
+
         try:
             request = requests.get(
                 "https://cloudflare-dns.com/dns-query",
@@ -30,6 +35,7 @@ def validate_domain(domain: str) -> bool:
                     "type": "A",
                     "name": domain,
                 },
+                timeout=DNS_TIMEOUT,
             )
             request.raise_for_status()
             response = request.json()
@@ -42,7 +48,11 @@ def validate_domain(domain: str) -> bool:
                 )
                 return ip.is_global
 
-        except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError):
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.HTTPError,
+            requests.exceptions.Timeout,
+        ):
             return False
 
     return False
@@ -0,0 +1,119 @@
+import json
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class UnsupportedEncodingError(ValueError):
+    def __init__(self, name: str) -> None:
+        self.message = f"Unsupported encoding: {name}. Available: {available()}"
+        super().__init__(self.message)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+
+class Encoder(ABC):
+    name: str
+    # Whether the payloads are sent as binary frames rather than text frames.
+    binary: bool
+
+    @abstractmethod
+    def encode(self, message: Any) -> str | bytes:
+        """Encode an outbound message."""
+
+    @abstractmethod
+    def decode(self, payload: str | bytes) -> Any:
+        """Decode an inbound message."""
+
+
+class JSONEncoder(Encoder):
+    """JSON text frames, encoded with orjson when it is installed.
+
+    orjson serializes datetimes, enums and dicts natively, which skips the
+    `jsonable_encoder` walk over the whole payload; other values (e.g. pydantic
+    models) go through it one by one.
+    """
+
+    name = "json"
+    binary = False
+
+    def encode(self, message: Any) -> str:
+        if orjson is not None:
+            return orjson.dumps(
+                message, default=_default, option=orjson.OPT_NON_STR_KEYS
+            ).decode()
+        return json.dumps(jsonable_encoder(message), separators=(",", ":"))
+
+    def decode(self, payload: str | bytes) -> Any:
+        return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+
+class MsgPackEncoder(Encoder):
+    """MessagePack binary frames. Datetimes are sent as ISO 8601 strings."""
+
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message: Any) -> bytes:
+        return msgpack.packb(message, default=_default, use_bin_type=True)
+
+    def decode(self, payload: str | bytes) -> Any:
+        return msgpack.unpackb(payload, raw=False)
+
+
+ENCODERS: dict[str, type[Encoder]] = {
+    JSONEncoder.name: JSONEncoder,
+    MsgPackEncoder.name: MsgPackEncoder,
+}
+
+
+def available() -> list[str]:
+    """Return the names of the encodings usable in this process."""
+    return [name for name in ENCODERS if name != "msgpack" or msgpack is not None]
+
+
+def get_encoder(name: str) -> Encoder:
+    """Return the encoder of an encoding negotiated by a client.
+
+    Raises:
+        UnsupportedEncodingError: If the encoding is unknown or its library is
+        not installed.
+    """
+    if name not in available():
+        raise UnsupportedEncodingError(name)
+    return ENCODERS[name]()
+
+
+class Frame:
+    """A message sent to many connections, encoded once per encoding."""
+
+    __slots__ = ("message", "_payloads")
+
+    def __init__(self, message: Any) -> None:
+        self.message = message
+        self._payloads: dict[str, str | bytes] = {}
+
+    def encode(self, encoder: Encoder) -> str | bytes:
+        payload = self._payloads.get(encoder.name)
+        if payload is None:
+            payload = self._payloads[encoder.name] = encoder.encode(self.message)
+        return payload
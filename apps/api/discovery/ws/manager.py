@@ -1,20 +1,42 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Generic, TypeVar
+from functools import partial
+from typing import Any, Generic, Optional, TypeVar
 
 from fastapi import WebSocket
-from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 
+from discovery.core.logger import logger
+
+from .encoding import Encoder, Frame, JSONEncoder
+
 Data = TypeVar("Data")
 
+# Close codes, see RFC 6455 section 7.4.1.
+NORMAL_CLOSURE = 1000
+GOING_AWAY = 1001
+UNSUPPORTED_DATA = 1003
+INTERNAL_ERROR = 1011
+TRY_AGAIN_LATER = 1013
+
+# The `id` of the message being handled, echoed in its responses.
+request_id: ContextVar[Optional[str | int]] = ContextVar("request_id", default=None)
+
 
 class AvailableActions(str, Enum):
     QUERY: str = "QUERY"
 
 
 class BaseMessage(BaseModel):
+    # Set by clients that pipeline requests, to correlate the responses.
+    id: Optional[str | int] = None
     action: AvailableActions
-    data: dict[str, Any]
+    data: dict[str, Any] = {}
 
 
 class GenericMessage(BaseMessage, Generic[Data]):
@@ -32,27 +54,339 @@ class GenericResponse(BaseModel):
         arbitrary_types_allowed = True
 
 
-class ConnectionManager:
-    def __init__(self) -> None:
-        self.active_connections: list[WebSocket] = []
+@dataclass
+class ConnectionMetrics:
+    accepted: int = 0
+    rejected: int = 0
+    evicted: int = 0
+    sent: int = 0
+
+
+class Connection:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        queue_size: int,
+        max_inflight: int,
+        encoder: Encoder,
+    ) -> None:
+        """An accepted WebSocket, with its encoding, its outbound queue and writer
+        task, and the tasks handling its pipelined requests."""
+        self.websocket = websocket
+        self.encoder = encoder
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.writer: Optional[asyncio.Task] = None
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.tasks: set[asyncio.Task] = set()
+
+
+class ConnectionManager(ABC):
+    def __init__(
+        self,
+        max_connections: int = 10000,
+        queue_size: int = 256,
+        send_timeout: float = 10.0,
+        heartbeat_interval: float = 30.0,
+        idle_timeout: float = 0.0,
+        max_inflight: int = 8,
+    ) -> None:
+        """Registry of the WebSocket connections of the process.
+
+        Messages are never written inline: they are queued per connection and
+        written by a writer task, so a slow client cannot stall the handler or the
+        other clients. A client whose queue is full or whose send takes longer
+        than `send_timeout` is evicted.
+
+        Args:
+            max_connections (int, optional): Connections above this limit are
+            refused. Defaults to 10000.
+            queue_size (int, optional): Maximum number of messages queued per
+            connection. Defaults to 256.
+            send_timeout (float, optional): Time in seconds a single send may
+            take. Defaults to 10.0.
+            heartbeat_interval (float, optional): Time in seconds between pings
+            sent to every connection, 0 disables them. Defaults to 30.0.
+            idle_timeout (float, optional): Connections that sent nothing for
+            this many seconds are closed by the heartbeat, 0 disables it.
+            Defaults to 0.0.
+            max_inflight (int, optional): Maximum number of requests handled
+            concurrently per connection. Defaults to 8.
+        """
+        self._max_connections = max_connections
+        self._queue_size = queue_size
+        self._send_timeout = send_timeout
+        self._heartbeat_interval = heartbeat_interval
+        self._idle_timeout = idle_timeout
+        self._max_inflight = max_inflight
+        self._connections: dict[WebSocket, Connection] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Background closes and cancelled tasks of forgotten connections, awaited
+        # by `close()`.
+        self._closing: set[asyncio.Task] = set()
+        self._metrics = ConnectionMetrics()
+
+    @property
+    def active_connections(self) -> list[WebSocket]:
+        return list(self._connections)
+
+    @property
+    def metrics(self) -> ConnectionMetrics:
+        return self._metrics
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def is_connected(self, websocket: WebSocket) -> bool:
+        return websocket in self._connections
+
+    async def connect(
+        self, websocket: WebSocket, encoder: Optional[Encoder] = None
+    ) -> bool:
+        """Accept a WebSocket, unless the connection limit is reached.
+
+        Args:
+            websocket (WebSocket): The WebSocket to accept.
+            encoder (Optional[Encoder]): The encoding negotiated by the client.
+            Defaults to JSON.
+
+        Returns:
+            bool: Whether the WebSocket was accepted.
+        """
+        if len(self._connections) >= self._max_connections:
+            self._metrics.rejected += 1
+            await websocket.close(code=TRY_AGAIN_LATER)
+            return False
 
-    async def connect(self, websocket: WebSocket) -> None:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = Connection(
+            websocket,
+            self._queue_size,
+            self._max_inflight,
+            encoder or JSONEncoder(),
+        )
+        connection.writer = asyncio.create_task(self._write(connection))
+        self._connections[websocket] = connection
+        self._metrics.accepted += 1
+        self._start_heartbeat()
+        return True
+
+    async def disconnect(
+        self, websocket: WebSocket, code: int = NORMAL_CLOSURE
+    ) -> None:
+        """Forget a WebSocket, close it and wait for its tasks to end. Calling it
+        again does nothing."""
+        connection = self.forget(websocket)
+        if connection is not None:
+            await self._close(websocket, code)
+            await self._settle(connection)
+
+    def forget(self, websocket: WebSocket) -> Optional[Connection]:
+        """Stop serving a WebSocket without closing it.
+
+        Returns:
+            Optional[Connection]: The connection, None if it was already forgotten.
+        """
+        connection = self._connections.pop(websocket, None)
+        if connection is None:
+            return None
+        for task in self._cancellable(connection):
+            task.cancel()
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        return connection
 
-    async def disconnect(self, websocket: WebSocket) -> None:
-        await websocket.close()
-        self.active_connections.remove(websocket)
+    async def serve(self, websocket: WebSocket) -> None:
+        """Handle the messages of a connection until it is closed.
+
+        Messages with an `id` are handled concurrently, up to `max_inflight` per
+        connection, and their responses carry the same `id`; once the limit is
+        reached, the next message is only read when a request completes. Messages
+        without an `id` are handled one at a time, in order. A frame that cannot
+        be decoded is answered with an error and the connection stays open.
+        """
+        connection = self._connections.get(websocket)
+        while connection is not None and self.is_connected(websocket):
+            try:
+                message = await self.receive(websocket)
+            except (ValueError, KeyError) as err:
+                # Not JSON/MessagePack, or a text frame on a binary connection
+                # (and the other way around), so there is no id to echo.
+                await self.respond(
+                    to=websocket, message=f"Invalid message: {err!r}", success=False
+                )
+                continue
+            if not isinstance(message, dict) or message.get("id") is None:
+                await self._handle(websocket, message)
+                continue
+            await connection.inflight.acquire()
+            task = asyncio.create_task(self._handle(websocket, message))
+            connection.tasks.add(task)
+            task.add_done_callback(partial(self._complete, connection))
+
+    @abstractmethod
+    async def handle(self, sender: WebSocket, message: Any) -> None:
+        """Handle a message received from a connection."""
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        """Receive a message, recording the activity of the connection."""
+        connection = self._connections.get(websocket)
+        if connection is None or not connection.encoder.binary:
+            message = await websocket.receive_json()
+        else:
+            message = connection.encoder.decode(await websocket.receive_bytes())
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+        return message
+
+    async def send(self, websocket: WebSocket, message: Any) -> bool:
+        """Queue a message without waiting for it to be written.
+
+        Messages are encoded by the writer task, in the encoding of the
+        connection. A `Frame` shared by several connections is encoded once per
+        encoding. The connection is evicted if its queue is full.
+
+        Returns:
+            bool: Whether the message was queued.
+        """
+        connection = self._connections.get(websocket)
+        if connection is None:
+            return False
+        try:
+            connection.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._evict(connection, "its queue is full", TRY_AGAIN_LATER)
+            return False
+        return True
+
+    async def respond(self, to: WebSocket, **kwargs: dict[str, any]) -> None:
+        success = kwargs.pop("success", True)
+        response = {
+            "data": kwargs,
+            "success": success,
+        }
+        if request_id.get() is not None:
+            response = {"id": request_id.get(), **response}
+
+        await self.send(to, response)
+
+    async def drain(self) -> None:
+        """Wait until every queued message is written."""
+        await asyncio.gather(
+            *(connection.queue.join() for connection in self._connections.values())
+        )
+
+    async def close(self) -> None:
+        """Stop the heartbeat and close every connection."""
+        heartbeat, self._heartbeat = self._heartbeat, None
+        if heartbeat is not None:
+            heartbeat.cancel()
+        for websocket in list(self._connections):
+            await self.disconnect(websocket, code=GOING_AWAY)
+        pending = [*self._closing, *([heartbeat] if heartbeat is not None else [])]
+        await asyncio.gather(*pending, return_exceptions=True)
 
     @staticmethod
-    async def respond(to: WebSocket, **kwargs: dict[str, any]) -> None:
-        if "success" in kwargs:
-            success = kwargs.pop("success")
-        response = jsonable_encoder(
-            {
-                "data": kwargs,
-                "success": success,
-            }
+    def _cancellable(connection: Connection) -> list[asyncio.Task]:
+        current = asyncio.current_task()
+        return [
+            task
+            for task in (connection.writer, *connection.tasks)
+            if task is not None and task is not current
+        ]
+
+    async def _settle(self, connection: Connection) -> None:
+        await asyncio.gather(*self._cancellable(connection), return_exceptions=True)
+
+    async def _handle(self, websocket: WebSocket, message: Any) -> None:
+        token = request_id.set(message.get("id") if isinstance(message, dict) else None)
+        try:
+            await self.handle(websocket, message)
+        finally:
+            request_id.reset(token)
+
+    @staticmethod
+    def _complete(connection: Connection, task: asyncio.Task) -> None:
+        connection.tasks.discard(task)
+        connection.inflight.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to handle a WebSocket message: {task.exception()}")
+
+    async def _write(self, connection: Connection) -> None:
+        encoder = connection.encoder
+        send = (
+            connection.websocket.send_bytes
+            if encoder.binary
+            else connection.websocket.send_text
         )
+        while True:
+            message = await connection.queue.get()
+            try:
+                payload = (
+                    message.encode(encoder)
+                    if isinstance(message, Frame)
+                    else encoder.encode(message)
+                )
+            except Exception as err:
+                logger.error(f"Failed to encode a WebSocket message: {err}")
+                connection.queue.task_done()
+                continue
+            try:
+                await asyncio.wait_for(send(payload), self._send_timeout)
+                self._metrics.sent += 1
+            except Exception as err:
+                self._evict(connection, f"sending failed: {err!r}")
+                return
+            finally:
+                connection.queue.task_done()
+
+    def _evict(
+        self, connection: Connection, reason: str, code: int = INTERNAL_ERROR
+    ) -> None:
+        """Forget a connection at once and close it in the background, so the
+        sender (e.g. a fan-out to every subscriber) never waits on a slow client."""
+        if self.forget(connection.websocket) is None:
+            return
+        self._metrics.evicted += 1
+        logger.info(f"Evicting a WebSocket connection, {reason}")
+        # Unblock `drain()` for the messages that will never be written.
+        while not connection.queue.empty():
+            connection.queue.get_nowait()
+            connection.queue.task_done()
+        task = asyncio.create_task(self._close(connection.websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket, code: int) -> None:
+        # The client may be gone already, or too slow to take the close frame.
+        with suppress(Exception):
+            await asyncio.wait_for(websocket.close(code=code), self._send_timeout)
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat_interval <= 0:
+            return
+        if (
+            self._heartbeat is None
+            or self._heartbeat.done()
+            or self._heartbeat.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._heartbeat = asyncio.create_task(self._beat())
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            await self.heartbeat()
+
+    async def heartbeat(self) -> None:
+        """Close the idle connections and ping the others.
 
-        await to.send_json(response)
+        Pings go through the outbound queues, so a client that stopped reading is
+        evicted once its queue fills up or a send times out.
+        """
+        now = time.monotonic()
+        ping = {"data": {"event": "ping"}, "success": True}
+        for connection in list(self._connections.values()):
+            if self._idle_timeout and now - connection.last_seen > self._idle_timeout:
+                await self.disconnect(connection.websocket, code=GOING_AWAY)
+            else:
+                await self.send(connection.websocket, ping)
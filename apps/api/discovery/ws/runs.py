@@ -1,33 +1,64 @@
 from enum import Enum
-from typing import TypedDict, Unpack
+from typing import NotRequired, Optional, TypedDict, Unpack
 
 from fastapi import WebSocket
 from pydantic import BaseModel, ValidationError
-from tortoise.expressions import Q
 
-from discovery.core.celery import celery
+from discovery.core import config
+from discovery.core.redis import get_redis_client
 from discovery.db.models import Run
+from discovery.db.repositories.runs import SUMMARY_FIELDS, Repository
+from discovery.runs.dedup import DeduplicationUnavailableError
+from discovery.runs.quotas import RateLimitExceededError
 from discovery.runs.registry import registry
+from discovery.runs.submit import (
+    InvalidTaskRequestsError,
+    TaskRequest,
+    submit,
+    submit_batch,
+)
 
-from .manager import BaseMessage, ConnectionManager
+from .manager import BaseMessage, Connection, ConnectionManager
+from .subscriptions import Relay, topics
 
 
 class QueryParameters(TypedDict):
     id: str
     owner_id: str
+    cursor: NotRequired[str]
+    size: NotRequired[int]
+    fields: NotRequired[list[str]]
+    depth: NotRequired[int]
+
+
+class SubscribeParameters(BaseModel):
+    owner_id: str
+    id: Optional[str] = None
+    parent_id: Optional[str] = None
+    delta: bool = False
 
 
 class RunTaskParameters(BaseModel):
     task: str
     params: dict[str, any]
+    idempotency_key: Optional[str] = None
+    dedup: bool = False
 
     class Config:
         arbitrary_types_allowed = True
 
 
+class RunTasksParameters(BaseModel):
+    tasks: list[TaskRequest]
+
+
 class AvailableActions(str, Enum):
     QUERY: str = "QUERY"
     RUN_TASK: str = "RUN_TASK"
+    RUN_TASKS: str = "RUN_TASKS"
+    SUBSCRIBE: str = "SUBSCRIBE"
+    UNSUBSCRIBE: str = "UNSUBSCRIBE"
+    PING: str = "PING"
 
 
 class Message(BaseMessage):
@@ -44,28 +75,75 @@ class RunTaskMessage(Message):
     data: RunTaskParameters
 
 
+class RunTasksMessage(Message):
+    action: AvailableActions = AvailableActions.RUN_TASKS
+    data: RunTasksParameters
+
+
+class SubscribeMessage(Message):
+    action: AvailableActions = AvailableActions.SUBSCRIBE
+    data: SubscribeParameters
+
+
 class RunsWebSocket(ConnectionManager):
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, relay: Optional[Relay] = None, **kwargs: any) -> None:
+        websocket_config = config.websocket_config
+        super().__init__(
+            **{
+                "max_connections": websocket_config.max_connections,
+                "queue_size": websocket_config.queue_size,
+                "send_timeout": websocket_config.send_timeout,
+                "heartbeat_interval": websocket_config.heartbeat_interval,
+                "idle_timeout": websocket_config.idle_timeout,
+                "max_inflight": websocket_config.max_inflight,
+                **kwargs,
+            }
+        )
+        self._repository = Repository()
+        self.relay = relay or Relay(get_redis_client())
+        self.relay.bind(self.send)
 
-    def parse(self, message: dict[str, any]) -> RunTaskMessage | QueryMessage:
+    def forget(self, websocket: WebSocket) -> Optional[Connection]:
+        self.relay.subscriptions.unsubscribe(websocket)
+        return super().forget(websocket)
+
+    def parse(
+        self, message: dict[str, any]
+    ) -> RunTaskMessage | RunTasksMessage | SubscribeMessage | QueryMessage:
         message: Message = Message.model_validate(obj=message)
         if message.action == AvailableActions.QUERY:
             return QueryMessage.model_validate(obj=message.model_dump())
         if message.action == AvailableActions.RUN_TASK:
             return RunTaskMessage.model_validate(obj=message.model_dump())
+        if message.action == AvailableActions.RUN_TASKS:
+            return RunTasksMessage.model_validate(obj=message.model_dump())
+        if message.action in (AvailableActions.SUBSCRIBE, AvailableActions.UNSUBSCRIBE):
+            return SubscribeMessage.model_validate(obj=message.model_dump())
+        if message.action == AvailableActions.PING:
+            return message
         raise ValidationError(
             ValueError(f"Invalid action: {message['action']}"),
         )
 
     async def process(self, sender: WebSocket) -> None:
+        """Receive and handle a single message."""
+        await self._handle(sender, await self.receive(sender))
+
+    async def handle(self, sender: WebSocket, message_json: dict[str, any]) -> None:
         try:
-            message_json = await sender.receive_json()
             message = self.parse(message_json)
-            if message.action == AvailableActions.QUERY:
+            if message.action == AvailableActions.PING:
+                await self.respond(to=sender, pong=True, success=True)
+            elif message.action == AvailableActions.QUERY:
                 await self.process_query(sender, message)
             elif message.action == AvailableActions.RUN_TASK:
                 await self.process_run_task(sender, message)
+            elif message.action == AvailableActions.RUN_TASKS:
+                await self.process_run_tasks(sender, message)
+            elif message.action == AvailableActions.SUBSCRIBE:
+                await self.process_subscribe(sender, message)
+            elif message.action == AvailableActions.UNSUBSCRIBE:
+                await self.process_unsubscribe(sender, message)
             else:
                 await self.respond(
                     to=sender,
@@ -79,48 +157,125 @@ class RunsWebSocket(ConnectionManager):
 
     async def process_query(self, sender: WebSocket, message: QueryMessage) -> None:
         data = message.data
-        runs = await self.get_runs(**data)
-        await self.respond(to=sender, data=runs, success=True)
+        if "depth" in data:
+            runs, next_cursor = await self.get_tree(**data), None
+        else:
+            runs, next_cursor = await self.get_runs(**data)
+        await self.respond(to=sender, data=runs, next_cursor=next_cursor, success=True)
 
     async def process_run_task(
         self, sender: WebSocket, message: RunTaskMessage
     ) -> None:
         data = message.data
-        task_name = data.task
-        params = data.params
-        if task_name in registry.tasks:
-            task = celery.send_task(
-                name=task_name,
-                kwargs=params,
-            )
-        else:
+        if data.task not in registry:
             return await self.respond(
                 to=sender,
                 message=f"Invalid task: {data.task}",
                 success=False,
             )
-        await self.respond(to=sender, data={"id": task.id}, success=True)
-
-    async def get_runs(self, **params: Unpack[QueryParameters]) -> list[dict[str, any]]:
-        filters = Q(Q(id=params["id"]), Q(owner_id=params["owner_id"]), join_type="AND")
-        query = await Run.filter(filters).first()
-        if query is None:
-            return []
-        children = await query.children.all() or []
-        return [
-            {
-                "id": run.id,
-                "name": run.name,
-                "parameters": run.parameters,
-                "status": run.status,
-                "result": run.result,
-                "files": run.files,
-                "started_at": run.started_at,
-                "failed_at": run.failed_at,
-                "completed_at": run.completed_at,
-                "created_at": run.created_at,
-                "updated_at": run.updated_at,
-            }
-            for run in [query, *children]
-            if run is not None
-        ]
+        try:
+            task_id, replayed = await submit(
+                TaskRequest(task=data.task, params=data.params),
+                idempotency_key=data.idempotency_key,
+                dedup=data.dedup,
+            )
+        except InvalidTaskRequestsError as err:
+            return await self.respond(to=sender, message=err.errors, success=False)
+        except RateLimitExceededError as err:
+            return await self.rate_limited(sender, err)
+        except DeduplicationUnavailableError as err:
+            return await self.respond(to=sender, message=err.message, success=False)
+        await self.respond(
+            to=sender, data={"id": task_id, "replayed": replayed}, success=True
+        )
+
+    async def process_run_tasks(
+        self, sender: WebSocket, message: RunTasksMessage
+    ) -> None:
+        try:
+            ids = await submit_batch(message.data.tasks, repository=self._repository)
+        except InvalidTaskRequestsError as err:
+            return await self.respond(to=sender, message=err.errors, success=False)
+        except RateLimitExceededError as err:
+            return await self.rate_limited(sender, err)
+        await self.respond(to=sender, data={"ids": ids}, success=True)
+
+    async def rate_limited(
+        self, sender: WebSocket, err: RateLimitExceededError
+    ) -> None:
+        await self.respond(
+            to=sender,
+            message=err.message,
+            retry_after=err.retry_after,
+            success=False,
+        )
+
+    async def process_subscribe(
+        self, sender: WebSocket, message: SubscribeMessage
+    ) -> None:
+        """Push the lifecycle events of a run, of the children of a parent, or of
+        every run of an owner to the sender, until it unsubscribes or disconnects.
+        """
+        if not self.relay.available:
+            return await self.respond(
+                to=sender,
+                message="Live updates are not available: Redis is not configured",
+                success=False,
+            )
+        self.relay.subscriptions.subscribe(
+            sender,
+            topics(**message.data.model_dump(exclude={"delta"})),
+            delta=message.data.delta,
+        )
+        await self.respond(to=sender, subscribed=message.data, success=True)
+
+    async def process_unsubscribe(
+        self, sender: WebSocket, message: SubscribeMessage
+    ) -> None:
+        self.relay.subscriptions.unsubscribe(
+            sender, topics(**message.data.model_dump(exclude={"delta"}))
+        )
+        await self.respond(to=sender, unsubscribed=message.data, success=True)
+
+    async def get_tree(self, **params: Unpack[QueryParameters]) -> list[dict[str, any]]:
+        """Return a run and its descendants up to `depth` levels, in one query."""
+        return await self._repository.tree(
+            params["id"],
+            owner_id=params["owner_id"],
+            depth=params["depth"],
+            fields=params.get("fields", SUMMARY_FIELDS),
+        )
+
+    async def get_runs(
+        self, **params: Unpack[QueryParameters]
+    ) -> tuple[list[dict[str, any]], str | None]:
+        """Return a run followed by a page of its children, newest first.
+
+        The run itself is returned in full and only in the first page. Children are
+        returned as summaries, restricted to `fields` when given.
+        """
+        query = await self._repository.get_by_id(params["id"])
+        if query is None or query.owner_id != params["owner_id"]:
+            return [], None
+        page = await self._repository.summaries(
+            Run.filter(parent_id=query.id),
+            cursor=params.get("cursor"),
+            size=min(max(params.get("size", 50), 1), 100),
+            fields=params.get("fields", SUMMARY_FIELDS),
+        )
+        if params.get("cursor"):
+            return page.items, page.next_cursor
+        run = {
+            "id": query.id,
+            "name": query.name,
+            "parameters": query.parameters,
+            "status": query.status,
+            "result": query.result,
+            "files": query.files,
+            "started_at": query.started_at,
+            "failed_at": query.failed_at,
+            "completed_at": query.completed_at,
+            "created_at": query.created_at,
+            "updated_at": query.updated_at,
+        }
+        return [run, *page.items], page.next_cursor
@@ -0,0 +1,257 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from typing import Any, Optional
+
+from fastapi import WebSocket
+from redis.asyncio import Redis
+
+from discovery.core.events import PREFIX, decode
+from discovery.core.logger import logger
+from discovery.core.pusher import Channels
+
+from .encoding import Frame, JSONEncoder
+
+# Seconds to wait before listening again after losing the Redis connection.
+RECONNECT_DELAY = 1.0
+
+Topic = tuple[str, ...]
+
+# Number of runs whose last sent fields are remembered per delta subscriber.
+MAX_TRACKED_RUNS = 1024
+
+# Queues a message for a WebSocket, returns whether it was accepted.
+Send = Callable[[WebSocket, Any], Awaitable[bool]]
+
+
+def topics(
+    owner_id: str, id: Optional[str] = None, parent_id: Optional[str] = None
+) -> list[Topic]:
+    """Return the topics of a subscription.
+
+    A subscription to a run receives the events of that run, a subscription to a
+    parent the events of its children, and a subscription with neither every event
+    of the owner. Several of them can be combined.
+
+    Args:
+        owner_id (str): The owner of the runs.
+        id (Optional[str]): The ID of a run.
+        parent_id (Optional[str]): The ID of the parent of the runs.
+
+    Returns:
+        list[Topic]: The topics to subscribe to.
+    """
+    result = []
+    if id:
+        result.append(("id", owner_id, id))
+    if parent_id:
+        result.append(("parent", owner_id, parent_id))
+    return result or [("owner", owner_id)]
+
+
+def event_topics(data: dict[str, Any]) -> list[Topic]:
+    """Return the topics matching the data of a run event."""
+    owner_id = data.get("owner_id") or ""
+    result = [("owner", owner_id)]
+    if data.get("id"):
+        result.append(("id", owner_id, data["id"]))
+    if data.get("parent_id"):
+        result.append(("parent", owner_id, data["parent_id"]))
+    return result
+
+
+class RunVersions:
+    def __init__(self, size: int = MAX_TRACKED_RUNS) -> None:
+        """The fields of the runs last sent to a delta subscriber, least recently
+        updated runs first."""
+        self._size = size
+        self._runs: OrderedDict[str, tuple[int, dict[str, Any]]] = OrderedDict()
+
+    def diff(self, data: dict[str, Any]) -> tuple[int, dict[str, Any], bool]:
+        """Record the new fields of a run and return what changed.
+
+        Args:
+            data (dict[str, Any]): The fields of the run, with its `id`.
+
+        Returns:
+            tuple[int, dict[str, Any], bool]: The version of the run for this
+            subscriber, the fields to send, and whether they are a delta. The
+            first version of a run, or of a run that was forgotten to stay under
+            `size`, is sent in full.
+        """
+        run_id = data.get("id")
+        previous = self._runs.pop(run_id, None)
+        if previous is None:
+            version, fields, delta, known = 1, data, False, {}
+        else:
+            version, known = previous[0] + 1, previous[1]
+            fields = {
+                key: value
+                for key, value in data.items()
+                if key == "id" or key not in known or known[key] != value
+            }
+            delta = True
+        self._runs[run_id] = (version, {**known, **data})
+        while len(self._runs) > self._size:
+            self._runs.popitem(last=False)
+        return version, fields, delta
+
+
+class Subscriptions:
+    def __init__(self) -> None:
+        """Index of the topics each WebSocket is subscribed to, both ways."""
+        self._sockets: dict[Topic, set[WebSocket]] = {}
+        self._topics: dict[WebSocket, set[Topic]] = {}
+        self._versions: dict[WebSocket, RunVersions] = {}
+
+    def subscribe(
+        self, websocket: WebSocket, topics: list[Topic], delta: bool = False
+    ) -> None:
+        """Subscribe a WebSocket to topics.
+
+        Once a WebSocket subscribes with `delta`, every event it receives only
+        holds the fields of the run that changed since the previous one it got.
+        """
+        for topic in topics:
+            self._sockets.setdefault(topic, set()).add(websocket)
+            self._topics.setdefault(websocket, set()).add(topic)
+        if delta:
+            self._versions.setdefault(websocket, RunVersions())
+
+    def versions(self, websocket: WebSocket) -> Optional[RunVersions]:
+        """Return the run versions of a delta subscriber, None for the others."""
+        return self._versions.get(websocket)
+
+    def unsubscribe(
+        self, websocket: WebSocket, topics: Optional[list[Topic]] = None
+    ) -> None:
+        """Drop the given topics of a WebSocket, or all of them if None."""
+        subscribed = self._topics.get(websocket, set())
+        for topic in list(subscribed if topics is None else topics):
+            subscribed.discard(topic)
+            sockets = self._sockets.get(topic)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self._sockets[topic]
+        if not subscribed:
+            self._topics.pop(websocket, None)
+            self._versions.pop(websocket, None)
+
+    def match(self, topics: list[Topic]) -> set[WebSocket]:
+        """Return the WebSockets subscribed to any of the given topics."""
+        return {
+            websocket for topic in topics for websocket in self._sockets.get(topic, ())
+        }
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+
+class Relay:
+    def __init__(self, redis: Optional[Redis]) -> None:
+        """Fan out the run events published to Redis to the subscribed WebSockets.
+
+        Workers publish the events of the runs to Redis pub/sub (see
+        `discovery.core.events.RedisSink`). Every API instance listens to the
+        channel and forwards each event to its own subscribers only, so
+        instances scale horizontally without sharing connections.
+
+        Args:
+            redis (Optional[Redis]): The Redis client, None if Redis is not
+            configured.
+        """
+        self._redis = redis
+        self._subscriptions = Subscriptions()
+        self._task: Optional[asyncio.Task] = None
+        self._send: Send = self._send_directly
+
+    def bind(self, send: Send) -> None:
+        """Deliver the events through `send`, e.g. the queues of a connection
+        manager, instead of writing to the WebSockets directly."""
+        self._send = send
+
+    @property
+    def available(self) -> bool:
+        return self._redis is not None
+
+    @property
+    def subscriptions(self) -> Subscriptions:
+        return self._subscriptions
+
+    async def start(self) -> None:
+        """Start listening to Redis in the background, if it is configured."""
+        if self._redis is not None and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def deliver(self, payload: str | bytes) -> None:
+        """Forward an event published to Redis to its subscribers.
+
+        Args:
+            payload (str | bytes): The encoded event.
+        """
+        name, data = decode(payload)
+        sockets = self._subscriptions.match(event_topics(data))
+        if not sockets:
+            return
+        # Subscribers of the same encoding share the encoded full event.
+        frame = Frame({"data": {"event": name, "run": data}, "success": True})
+        for websocket in sockets:
+            versions = self._subscriptions.versions(websocket)
+            if versions is None:
+                message = frame
+            else:
+                version, fields, delta = versions.diff(data)
+                message = {
+                    "data": {
+                        "event": name,
+                        "run": fields,
+                        "version": version,
+                        "delta": delta,
+                    },
+                    "success": True,
+                }
+            if not await self._send(websocket, message):
+                # The connection is gone, its handler will clean up the rest.
+                self._subscriptions.unsubscribe(websocket)
+
+    @staticmethod
+    async def _send_directly(websocket: WebSocket, message: Any) -> bool:
+        encoder = JSONEncoder()
+        try:
+            await websocket.send_text(
+                message.encode(encoder)
+                if isinstance(message, Frame)
+                else encoder.encode(message)
+            )
+        except Exception:
+            return False
+        return True
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(PREFIX + Channels.RUNS.value)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self._deliver_safely(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning(f"Lost the run events subscription: {err}")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _deliver_safely(self, payload: str | bytes) -> None:
+        try:
+            await self.deliver(payload)
+        except Exception as err:
+            logger.warning(f"Failed to deliver a run event: {err}")
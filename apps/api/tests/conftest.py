@@ -1,3 +1,20 @@
 """Unit tests configuration module."""
 
+import pytest_asyncio
+from tortoise import Tortoise
+
+from discovery.core.cache import get_cache
+from discovery.db import migrations
+
 pytest_plugins = []
+
+
+@pytest_asyncio.fixture
+async def database():
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["discovery.db.models"]}
+    )
+    await migrations.upgrade()
+    get_cache().clear()
+    yield
+    await Tortoise.close_connections()
@@ -0,0 +1,85 @@
+import pytest
+
+from discovery.core.cache import Cache
+from discovery.db.models import Run
+from discovery.db.repositories.runs import Repository
+
+
+@pytest.mark.asyncio
+async def test_cache_get_set():
+    cache = Cache()
+
+    assert await cache.get("key") is None
+    await cache.set("key", {"a": [1]})
+
+    assert await cache.get("key") == {"a": [1]}
+    assert cache.metrics.hits == 1
+    assert cache.metrics.misses == 1
+    assert cache.metrics.hit_ratio == 0.5
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used():
+    cache = Cache(size=2)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    await cache.get("a")
+    await cache.set("c", 3)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+    assert cache.metrics.evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_expires_local_entries():
+    cache = Cache(local_ttl=0)
+    await cache.set("key", 1)
+
+    assert await cache.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidates_tags():
+    cache = Cache()
+    await cache.set("run:a", 1, tags=["a"])
+    await cache.set("tree:a", 2, tags=["a", "b"])
+    await cache.set("run:b", 3, tags=["b"])
+
+    await cache.invalidate("b")
+
+    assert await cache.get("run:a") == 1
+    assert await cache.get("tree:a") is None
+    assert await cache.get("run:b") is None
+    assert cache.metrics.invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_is_cached(database):
+    repository = Repository(cache=Cache())
+    await Run.create(id="run", name="alpine", owner_id="owner", result={"a": 1})
+    await repository.get_by_id("run")
+    await Run.filter(id="run").update(name="changed")
+
+    cached = await repository.get_by_id("run")
+    assert cached.name == "alpine"
+    assert cached.result == {"a": 1}
+    assert cached.created_at is not None
+
+    await repository.invalidate("run")
+    assert (await repository.get_by_id("run")).name == "changed"
+
+
+@pytest.mark.asyncio
+async def test_tree_is_invalidated_by_descendants(database):
+    repository = Repository(cache=Cache())
+    await Run.create(id="root", name="subfinder")
+    await Run.create(id="child", name="httpx", parent_id="root")
+    assert len(await repository.tree("root")) == 2
+
+    await Run.create(id="grandchild", name="nuclei", parent_id="child")
+    assert len(await repository.tree("root")) == 2
+
+    await repository.invalidate("child")
+    assert len(await repository.tree("root")) == 3
@@ -2,8 +2,9 @@ from unittest.mock import AsyncMock, MagicMock
 
 import docker
 import pytest
+from celery.exceptions import SoftTimeLimitExceeded
 
-from discovery.containers.container import Container
+from discovery.containers.container import IMAGE_LABEL, WORKER_LABEL, Container
 from discovery.containers.volume import Mode, Volume
 from discovery.core.config import DockerConfig, DockerLimits
 
@@ -56,7 +57,7 @@ def test_validate_image_invalid(docker_config, docker_client):
 
 
 def test_create_container(docker_config, docker_client, volume):
-    container = Container(docker_config, docker_client)
+    container = Container(docker_config, docker_client, worker="celery@w1")
     container._create_container("alpine", 'echo "Hello, World!"', volume)
     docker_client.containers.run.assert_called_once_with(
         detach=True,
@@ -67,6 +68,30 @@ def test_create_container(docker_config, docker_client, volume):
         mem_limit=docker_config.limits.memory,
         volumes={"/host/path": {"bind": "/guest/path", "mode": "rw"}},
         command='echo "Hello, World!"',
+        labels={IMAGE_LABEL: "alpine", WORKER_LABEL: "celery@w1"},
+    )
+
+
+def test_running(docker_config, docker_client):
+    container = Container(docker_config, docker_client, worker="celery@w1")
+    docker_client.containers.list.return_value = [
+        MagicMock(attrs={"Labels": {IMAGE_LABEL: image}})
+        for image in ("alpine", "alpine", "busybox")
+    ]
+
+    assert container.running() == {"alpine": 2, "busybox": 1}
+    docker_client.containers.list.assert_called_once_with(
+        filters={"label": [IMAGE_LABEL, f"{WORKER_LABEL}=celery@w1"]}, sparse=True
+    )
+
+
+def test_running_without_worker(docker_config, docker_client):
+    container = Container(docker_config, docker_client)
+    docker_client.containers.list.return_value = []
+
+    assert container.running() == {}
+    docker_client.containers.list.assert_called_once_with(
+        filters={"label": [IMAGE_LABEL]}, sparse=True
     )
 
 
@@ -111,3 +136,54 @@ async def test_run_without_events(docker_config, docker_client, volume):
     )
 
     mock_container.wait.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_run_streams_output(docker_config, docker_client, volume):
+    container = Container(docker_config, docker_client)
+    on_output = AsyncMock()
+
+    container._create_container = MagicMock()
+    mock_container = MagicMock()
+    mock_container.logs.return_value = iter([b"a.example.com\nb.exa", b"mple.com\n\n"])
+    container._create_container.return_value = mock_container
+
+    await container.run(
+        image="alpine",
+        command='echo "Hello, World!"',
+        volume=volume,
+        on_output=on_output,
+    )
+
+    mock_container.logs.assert_called_once_with(
+        stream=True, follow=True, stdout=True, stderr=False
+    )
+    assert [c.args[0] for c in on_output.call_args_list] == [
+        "a.example.com",
+        "b.example.com",
+    ]
+    mock_container.wait.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_run_removes_an_interrupted_container(
+    docker_config, docker_client, volume
+):
+    container = Container(docker_config, docker_client)
+    on_finish = AsyncMock()
+
+    container._create_container = MagicMock()
+    mock_container = MagicMock()
+    mock_container.wait.side_effect = SoftTimeLimitExceeded()
+    container._create_container.return_value = mock_container
+
+    with pytest.raises(SoftTimeLimitExceeded):
+        await container.run(
+            image="alpine",
+            command='echo "Hello, World!"',
+            volume=volume,
+            on_finish=on_finish,
+        )
+
+    mock_container.remove.assert_called_once_with(force=True)
+    on_finish.assert_not_called()
@@ -0,0 +1,142 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.routes import tasks
+from discovery.runs import submit as submit_module
+from discovery.runs.dedup import (
+    Deduplicator,
+    MemoryClaimStore,
+    UnavailableClaimStore,
+    fingerprint,
+    normalize,
+)
+from discovery.runs.submit import TaskRequest, submit
+
+HTTPX = "discovery.tasks.projectdiscovery.httpx"
+
+
+@pytest.fixture
+def deduplicator(monkeypatch):
+    deduplicator = Deduplicator(MemoryClaimStore())
+    monkeypatch.setattr(submit_module, "get_deduplicator", lambda: deduplicator)
+    return deduplicator
+
+
+@pytest.fixture
+def published(monkeypatch):
+    batches = []
+    monkeypatch.setattr(submit_module, "publish", batches.append)
+    return batches
+
+
+def test_normalize():
+    assert normalize(
+        {"domains": [" B.com", "a.com", "b.com"], "owner_id": "o", "parent_id": None}
+    ) == {"domains": ["a.com", "b.com"], "owner_id": "o"}
+    assert fingerprint("task", {"domain": "A.com ", "owner_id": "o"}) == fingerprint(
+        "task", {"owner_id": "o", "domain": "a.com"}
+    )
+    assert fingerprint("task", {"domain": "a.com", "owner_id": "o"}) != fingerprint(
+        "task", {"domain": "a.com", "owner_id": "p"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_memory_claim_store():
+    store = MemoryClaimStore()
+
+    assert await store.claim("key", "a", ttl=60) is None
+    assert await store.claim("key", "b", ttl=60) == "a"
+    await store.release("key", "b")
+    assert await store.claim("key", "b", ttl=60) == "a"
+    await store.release("key", "a")
+    assert await store.claim("key", "b", ttl=60) is None
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key(deduplicator, published):
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": ["a.com"]})
+
+    first = await submit(request, idempotency_key="key")
+    second = await submit(request, idempotency_key="key")
+    other = await submit(request, idempotency_key="other")
+
+    assert first == (second[0], False)
+    assert second[1] is True
+    assert other[0] != first[0]
+    assert len(published) == 2
+
+
+@pytest.mark.asyncio
+async def test_dedup_in_flight(deduplicator, published):
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": ["a.com"]})
+    equivalent = TaskRequest(task=HTTPX, params={"domains": ["A.com"], "owner_id": "o"})
+
+    task_id, _ = await submit(request, dedup=True)
+    assert await submit(equivalent, dedup=True) == (task_id, True)
+    assert (await submit(equivalent))[0] != task_id
+
+    await deduplicator.release(task_id, HTTPX, request.params)
+    assert (await submit(equivalent, dedup=True))[0] != task_id
+
+
+@pytest.mark.asyncio
+async def test_dedup_maps_idempotency_key_to_existing_task(deduplicator, published):
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": []})
+    task_id, _ = await submit(request, dedup=True)
+
+    assert await submit(request, idempotency_key="key", dedup=True) == (task_id, True)
+    assert await submit(request, idempotency_key="key") == (task_id, True)
+
+
+@pytest.mark.asyncio
+async def test_publish_failure_releases_claims(deduplicator, monkeypatch):
+    def publish(messages):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(submit_module, "publish", publish)
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": []})
+
+    with pytest.raises(ConnectionError):
+        await submit(request, idempotency_key="key", dedup=True)
+
+    monkeypatch.setattr(submit_module, "publish", lambda messages: None)
+    assert (await submit(request, idempotency_key="key", dedup=True))[1] is False
+
+
+@pytest.mark.asyncio
+async def test_run_task_route(deduplicator, published):
+    app = FastAPI()
+    app.include_router(tasks.router)
+    body = {"task": HTTPX, "params": {"owner_id": "o", "domains": []}}
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        first = await client.post("/tasks", json=body, headers={"Idempotency-Key": "k"})
+        retry = await client.post("/tasks", json=body, headers={"Idempotency-Key": "k"})
+
+    assert first.json() == retry.json()
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(published) == 1
+
+
+@pytest.mark.asyncio
+async def test_refused_without_redis(monkeypatch, published):
+    deduplicator = Deduplicator(UnavailableClaimStore())
+    monkeypatch.setattr(submit_module, "get_deduplicator", lambda: deduplicator)
+    app = FastAPI()
+    app.include_router(tasks.router)
+    body = {"task": HTTPX, "params": {"owner_id": "o", "domains": []}}
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        keyed = await client.post("/tasks", json=body, headers={"Idempotency-Key": "k"})
+        deduped = await client.post("/tasks?dedup=true", json=body)
+        plain = await client.post("/tasks", json=body)
+
+    assert keyed.status_code == deduped.status_code == 503
+    assert "Redis is not configured" in keyed.json()["detail"]
+    assert plain.status_code == 200
+    assert len(published) == 1
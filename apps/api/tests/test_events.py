@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from discovery.core.events import Dispatcher, Event, MemorySink, Sink
+
+
+def status_changed(run_id: str, previous: str, status: str) -> Event:
+    return Event(
+        "runs",
+        "run-status-changed",
+        {"id": run_id, "status": [previous, status]},
+        key=run_id,
+    )
+
+
+class FailingSink(Sink):
+    async def send(self, events: list[Event]) -> None:
+        raise RuntimeError("unavailable")
+
+
+class SlowSink(MemorySink):
+    async def send(self, events: list[Event]) -> None:
+        await asyncio.sleep(0.01)
+        await super().send(events)
+
+
+@pytest.mark.asyncio
+async def test_coalesces_status_changes_of_the_same_run():
+    sink = MemorySink()
+    dispatcher = Dispatcher(sink, window=60)
+
+    await dispatcher.publish(status_changed("a", "PENDING", "RUNNING"))
+    await dispatcher.publish(status_changed("b", "PENDING", "RUNNING"))
+    await dispatcher.publish(status_changed("a", "RUNNING", "SUCCESS"))
+    await dispatcher.flush()
+
+    assert [event.data for event in sink.events] == [
+        {"id": "a", "status": ["PENDING", "SUCCESS"]},
+        {"id": "b", "status": ["PENDING", "RUNNING"]},
+    ]
+    assert dispatcher.metrics.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_events_without_key_are_not_coalesced():
+    sink = MemorySink()
+    dispatcher = Dispatcher(sink, window=60)
+
+    for _ in range(3):
+        await dispatcher.publish(Event("runs", "run-created", {"id": "a"}))
+    await dispatcher.flush()
+
+    assert len(sink.events) == 3
+
+
+@pytest.mark.asyncio
+async def test_delivers_in_batches():
+    sink = MemorySink()
+    dispatcher = Dispatcher(sink, window=60)
+
+    for i in range(25):
+        await dispatcher.publish(status_changed(str(i), "PENDING", "RUNNING"))
+    await dispatcher.flush()
+
+    assert [len(batch) for batch in sink.batches] == [10, 10, 5]
+    assert dispatcher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_flushes_in_the_background():
+    sink = MemorySink()
+    dispatcher = Dispatcher(sink, window=0.01)
+
+    await dispatcher.publish(status_changed("a", "PENDING", "RUNNING"))
+    assert sink.events == []
+
+    await asyncio.sleep(0.05)
+    assert len(sink.events) == 1
+
+
+@pytest.mark.asyncio
+async def test_backpressure_bounds_pending_events():
+    sink = SlowSink()
+    dispatcher = Dispatcher(sink, batch_size=2, window=60, max_pending=4)
+
+    for i in range(10):
+        await dispatcher.publish(status_changed(str(i), "PENDING", "RUNNING"))
+        assert dispatcher.pending <= 4
+    await dispatcher.close()
+
+    assert len(sink.events) == 10
+    assert dispatcher.metrics.waits > 0
+
+
+@pytest.mark.asyncio
+async def test_sink_failures_drop_the_batch():
+    dispatcher = Dispatcher(FailingSink(), window=60)
+
+    await dispatcher.publish(status_changed("a", "PENDING", "RUNNING"))
+    await dispatcher.flush()
+
+    assert dispatcher.pending == 0
+    assert dispatcher.metrics.failed == 1
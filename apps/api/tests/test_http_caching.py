@@ -0,0 +1,130 @@
+import zlib
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.responses import PlainTextResponse, StreamingResponse
+
+from discovery.core.compression import (
+    CompressionMiddleware,
+    GzipCompressor,
+    negotiate,
+)
+from discovery.core.conditional import ETagMiddleware
+from discovery.db.models import Run, RunStatus
+from discovery.db.repositories.runs import Repository
+from discovery.routes import runs
+
+CODECS = {"zstd": object, "br": object, "gzip": object}
+
+
+@pytest_asyncio.fixture
+async def client(database):
+    await Run.create(
+        id="run", name="httpx", owner_id="owner", result={"hosts": ["a"] * 1000}
+    )
+    app = FastAPI()
+    app.include_router(runs.router)
+    app.add_middleware(ETagMiddleware, prefixes=("/runs",))
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0.5, br", "br"),
+        ("zstd, br, gzip", "zstd"),
+        ("*", "zstd"),
+        ("*, zstd;q=0", "br"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate(header, expected):
+    assert negotiate(header, CODECS) == expected
+
+
+@pytest.mark.asyncio
+async def test_run_is_compressed(client):
+    response = await client.get("/runs/run", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(response.content) / 10
+    assert response.json()["result"]["hosts"][0] == "a"
+
+
+@pytest.mark.asyncio
+async def test_run_conditional_get(client):
+    response = await client.get("/runs/run")
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    by_etag = await client.get("/runs/run", headers={"If-None-Match": etag})
+    by_date = await client.get(
+        "/runs/run", headers={"If-Modified-Since": last_modified}
+    )
+    assert by_etag.status_code == by_date.status_code == 304
+    assert by_etag.content == b""
+    assert by_etag.headers["etag"] == etag
+
+    run = await Run.get(id="run")
+    run.status = RunStatus.RUNNING
+    await run.save()
+    await Repository().invalidate("run")
+    changed = await client.get("/runs/run", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_list_conditional_get(client):
+    response = await client.get("/runs")
+    etag = response.headers["etag"]
+
+    unchanged = await client.get("/runs", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+    await Run.create(id="other", name="subfinder", owner_id="owner")
+    changed = await client.get("/runs", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_small_and_streamed_responses():
+    async def chunks():
+        for _ in range(3):
+            yield b"x" * 50
+
+    app = FastAPI()
+    app.add_api_route("/small", lambda: PlainTextResponse("ok"))
+    app.add_api_route("/stream", lambda: StreamingResponse(chunks()))
+    app = CompressionMiddleware(ETagMiddleware(app), minimum_size=100)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        small = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        stream = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in small.headers
+    assert "etag" in small.headers
+    assert stream.headers["content-encoding"] == "gzip"
+    assert "etag" not in stream.headers
+    assert stream.content == b"x" * 150
+
+
+def test_gzip_chunks_decode_incrementally():
+    compressor = GzipCompressor()
+    decompressor = zlib.decompressobj(31)
+
+    assert decompressor.decompress(compressor.compress(b"first")) == b"first"
+    data = compressor.compress(b"second") + compressor.finish()
+    assert decompressor.decompress(data) == b"second"
+    assert decompressor.eof
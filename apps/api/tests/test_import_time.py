@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+# Dependencies only needed once a task is published or runs, never to import the API.
+DEFERRED_MODULES = (
+    "docker",
+    "boto3",
+    "botocore",
+    "pusher",
+    "requests",
+    "celery",
+    "kombu",
+)
+
+# Cumulative import time of the app, in seconds. About 1.3s when measured, most
+# of it FastAPI and pydantic; the margin absorbs slower machines.
+IMPORT_TIME_BUDGET = 3.0
+
+
+def importtime(module: str) -> dict[str, int]:
+    """Import a module in a fresh interpreter and return the cumulative import
+    time of every imported module, in microseconds."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_app_defers_heavy_imports():
+    times = importtime("discovery.app")
+
+    assert "discovery.app" in times
+    assert [module for module in DEFERRED_MODULES if module in times] == []
+    assert "discovery.runs.run" not in times
+
+
+def test_app_import_time_budget():
+    times = importtime("discovery.app")
+
+    assert times["discovery.app"] < IMPORT_TIME_BUDGET * 1_000_000
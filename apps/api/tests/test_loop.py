@@ -0,0 +1,29 @@
+import asyncio
+
+from discovery.core import loop
+
+
+async def current_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_running_loop()
+
+
+def test_run_reuses_loop():
+    first = loop.run(current_loop())
+    second = loop.run(current_loop())
+
+    assert first is second
+    assert not first.is_closed()
+
+    loop.close()
+    assert first.is_closed()
+
+
+def test_run_after_close():
+    first = loop.run(current_loop())
+    loop.close()
+
+    second = loop.run(current_loop())
+
+    assert second is not first
+    assert not second.is_closed()
+    loop.close()
@@ -0,0 +1,134 @@
+import json
+import urllib.request
+from collections import Counter
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.core.metrics import Metric, render, serve
+from discovery.routes import metrics as metrics_route
+from discovery.runs.capacity import (
+    PRIORITY_SEPARATOR,
+    Backlog,
+    queue_metrics,
+    worker_metrics,
+)
+
+
+class FakePipeline:
+    def __init__(self, lists: dict[str, list[bytes]]) -> None:
+        self._lists = lists
+        self._replies = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    def llen(self, key: str) -> None:
+        self._replies.append(len(self._lists.get(key, [])))
+
+    def lindex(self, key: str, index: int) -> None:
+        items = self._lists.get(key, [])
+        self._replies.append(items[index] if items else None)
+
+    async def execute(self) -> list:
+        return self._replies
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.lists: dict[str, list[bytes]] = {}
+
+    def lpush(self, key: str, published_at: float) -> None:
+        message = {"body": "", "headers": {"published_at": published_at}}
+        self.lists.setdefault(key, []).insert(0, json.dumps(message).encode())
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self.lists)
+
+
+def test_render():
+    metric = Metric("jobs", "gauge", "Jobs.\nWaiting.").add(2, queue='a"b')
+
+    assert render([metric, Metric("empty", "counter", "None.").add(0.5)]) == (
+        "# HELP jobs Jobs.\\nWaiting.\n"
+        "# TYPE jobs gauge\n"
+        'jobs{queue="a\\"b"} 2\n'
+        "# HELP empty None.\n"
+        "# TYPE empty counter\n"
+        "empty 0.5\n"
+    )
+
+
+@pytest.mark.asyncio
+async def test_backlog_across_priorities():
+    redis = FakeRedis()
+    redis.lpush("httpx", 100.0)
+    redis.lpush("httpx", 150.0)
+    redis.lpush(f"httpx{PRIORITY_SEPARATOR}9", 90.0)
+    redis.lists["subfinder"] = [b"{}"]
+
+    httpx, subfinder, empty = await Backlog(redis).stats(
+        ["httpx", "subfinder", "celery"], now=200.0
+    )
+
+    assert (httpx.messages, httpx.oldest_age) == (3, 110.0)
+    assert (subfinder.messages, subfinder.oldest_age) == (1, None)
+    assert (empty.messages, empty.oldest_age) == (0, None)
+
+
+def test_broker_down():
+    up, messages, _ = queue_metrics(None)
+
+    assert up.samples == [({}, 0)]
+    assert messages.samples == []
+
+
+def test_worker_metrics():
+    metrics = {
+        metric.name: metric.samples
+        for metric in worker_metrics(
+            "w1", concurrency=4, active=1, reserved=1, containers=Counter({"a": 1})
+        )
+    }
+
+    assert metrics["discovery_worker_free_slots"] == [({"worker": "w1"}, 2)]
+    assert metrics["discovery_containers_running"] == [
+        ({"image": "a", "worker": "w1"}, 1)
+    ]
+    assert metrics["discovery_docker_up"] == [({"worker": "w1"}, 1)]
+
+
+def test_exporter():
+    server = serve(lambda: [Metric("up", "gauge", "Up.").add(1)], port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            body = response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+
+    assert body.endswith("up 1\n")
+
+
+@pytest.mark.asyncio
+async def test_route(monkeypatch):
+    redis = FakeRedis()
+    redis.lpush("httpx", 100.0)
+    monkeypatch.setattr(metrics_route, "get_backlog", lambda: Backlog(redis))
+    app = FastAPI()
+    app.include_router(metrics_route.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'discovery_queue_messages{queue="httpx"} 1\n' in response.text
+    assert 'discovery_queue_messages{queue="celery"} 0\n' in response.text
+    assert "discovery_broker_up 1\n" in response.text
@@ -0,0 +1,106 @@
+import os
+import re
+
+import pytest
+import pytest_asyncio
+from tortoise import Tortoise, connections
+from tortoise.utils import get_schema_sql
+
+from discovery.db import migrations
+from discovery.db.models import Run
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+# Query paths of the runs repository, routes and WebSocket handler, mapped to the
+# index the planner is expected to use for them.
+QUERY_PLANS = [
+    (
+        'SELECT "id" FROM "run" WHERE "owner_id" = {0} '
+        'ORDER BY "created_at" DESC LIMIT 20',
+        ["owner"],
+        "idx_run_owner_i_2883c0",
+    ),
+    (
+        'SELECT "id" FROM "run" WHERE "owner_id" = {0} AND "status" = {1}',
+        ["owner", "RUNNING"],
+        "idx_run_owner_i_6cfd88",
+    ),
+    (
+        'SELECT "id" FROM "run" WHERE "parent_id" = {0}',
+        ["parent"],
+        "idx_run_parent__2a659b",
+    ),
+]
+
+
+@pytest.mark.asyncio
+async def test_upgrade_is_idempotent(database):
+    assert await migrations.applied() == migrations.discover()
+    assert await migrations.upgrade() == []
+
+
+@pytest.mark.asyncio
+async def test_indexes_match_model(database):
+    connection = connections.get("default")
+    expected = set(
+        re.findall(
+            r'CREATE INDEX IF NOT EXISTS "(\w+)"', get_schema_sql(connection, True)
+        )
+    )
+    rows = await connection.execute_query_dict(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'run' "
+        "AND name NOT LIKE 'sqlite_%'"
+    )
+
+    assert {row["name"] for row in rows} == expected
+
+
+@pytest.mark.asyncio
+async def test_columns_match_model(database):
+    rows = await connections.get("default").execute_query_dict(
+        'PRAGMA table_info("run")'
+    )
+
+    assert {row["name"] for row in rows} == set(Run._meta.fields_db_projection.values())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("query", "values", "index"), QUERY_PLANS)
+async def test_sqlite_query_plans(database, query, values, index):
+    connection = connections.get("default")
+    placeholders = ["?"] * len(values)
+
+    rows = await connection.execute_query_dict(
+        f"EXPLAIN QUERY PLAN {query.format(*placeholders)}", values
+    )
+
+    assert any(index in row["detail"] for row in rows)
+
+
+@pytest_asyncio.fixture
+async def postgres():
+    await Tortoise.init(
+        db_url=POSTGRES_URL, modules={"models": ["discovery.db.models"]}
+    )
+    connection = connections.get("default")
+    await connection.execute_script(
+        'DROP TABLE IF EXISTS "run", "discovery_migrations" CASCADE'
+    )
+    await migrations.upgrade()
+    # The planner prefers sequential scans on empty tables.
+    await connection.execute_script("SET enable_seqscan = off")
+    yield connection
+    await Tortoise.close_connections()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(POSTGRES_URL is None, reason="TEST_POSTGRES_URL is not set")
+@pytest.mark.parametrize(("query", "values", "index"), QUERY_PLANS)
+async def test_postgres_query_plans(postgres, query, values, index):
+    placeholders = [f"${position}" for position in range(1, len(values) + 1)]
+
+    rows = await postgres.execute_query_dict(
+        f"EXPLAIN {query.format(*placeholders)}", values
+    )
+
+    assert any(index in row["QUERY PLAN"] for row in rows)
@@ -0,0 +1,109 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.db.models import Run
+from discovery.db.pagination import (
+    InvalidCursorError,
+    Total,
+    decode_cursor,
+    encode_cursor,
+)
+from discovery.db.repositories.runs import Repository
+from discovery.routes import runs
+
+START = datetime(2024, 8, 1, tzinfo=UTC)
+
+
+@pytest.fixture
+def repository():
+    return Repository()
+
+
+@pytest_asyncio.fixture
+async def seeded(database):
+    # run-3 and run-4 share the same creation date.
+    for index, minutes in enumerate([0, 1, 2, 3, 3]):
+        await Run.create(
+            id=f"run-{index}",
+            name="alpine",
+            owner_id="owner" if index % 2 == 0 else "other",
+            created_at=START + timedelta(minutes=minutes),
+        )
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(START, "run-1")
+
+    assert decode_cursor(cursor) == (START, "run-1")
+
+
+def test_invalid_cursor():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_paginate(seeded, repository):
+    ids = []
+    cursor = None
+    while True:
+        page = await repository.paginate(cursor=cursor, size=2)
+        ids.extend(run.id for run in page.items)
+        assert page.total is None
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+
+    assert ids == ["run-4", "run-3", "run-2", "run-1", "run-0"]
+
+
+@pytest.mark.asyncio
+async def test_paginate_total(seeded, repository):
+    exact = await repository.paginate(size=2, total=Total.EXACT)
+    estimated = await repository.paginate(size=2, total=Total.ESTIMATED)
+
+    assert exact.total == 5
+    assert estimated.total == 5
+
+
+@pytest.mark.asyncio
+async def test_filter_by(seeded, repository):
+    page = await repository.filter_by(
+        size=2, total=Total.EXACT, status="PENDING", owner_id="owner"
+    )
+    last = await repository.filter_by(
+        cursor=page.next_cursor, size=2, status="PENDING", owner_id="owner"
+    )
+
+    assert [run["id"] for run in page.items] == ["run-4", "run-2"]
+    assert page.total == 3
+    assert [run["id"] for run in last.items] == ["run-0"]
+    assert last.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_route(seeded):
+    app = FastAPI()
+    app.include_router(runs.router)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        first = await client.get("/runs", params={"size": 3})
+        second = await client.get(
+            "/runs", params={"size": 3, "cursor": first.json()["next_cursor"]}
+        )
+        invalid = await client.get("/runs", params={"cursor": "invalid"})
+
+    assert [run["id"] for run in first.json()["items"]] == [
+        "run-4",
+        "run-3",
+        "run-2",
+    ]
+    assert [run["id"] for run in second.json()["items"]] == ["run-1", "run-0"]
+    assert second.json()["next_cursor"] is None
+    assert invalid.status_code == 400
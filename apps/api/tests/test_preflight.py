@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.routes import tasks
+from discovery.runs import schemas
+from discovery.runs import submit as submit_module
+from discovery.runs.dedup import Deduplicator, MemoryClaimStore
+from discovery.runs.submit import InvalidTaskRequestsError, TaskRequest, submit
+
+HTTPX = "discovery.tasks.projectdiscovery.httpx"
+SUBFINDER = "discovery.tasks.projectdiscovery.subfinder"
+
+
+@pytest.fixture
+def published(monkeypatch):
+    batches = []
+    monkeypatch.setattr(submit_module, "publish", batches.append)
+    monkeypatch.setattr(
+        submit_module, "get_deduplicator", lambda: Deduplicator(MemoryClaimStore())
+    )
+    return batches
+
+
+@pytest.fixture
+def resolved(monkeypatch):
+    threads = []
+
+    def validate_domain(domain):
+        threads.append(threading.current_thread())
+        return domain == "example.com"
+
+    monkeypatch.setattr(schemas, "validate_domain", validate_domain)
+    return threads
+
+
+@pytest.mark.asyncio
+async def test_invalid_parameters_are_not_published(published):
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": "a.com"})
+
+    with pytest.raises(InvalidTaskRequestsError) as err:
+        await submit(request)
+
+    assert err.value.errors[0]["message"][0]["loc"] == ("params", "domains")
+    assert published == []
+
+
+@pytest.mark.asyncio
+async def test_domain_is_resolved_off_the_event_loop(published, resolved):
+    valid = TaskRequest(
+        task=SUBFINDER, params={"owner_id": "o", "domain": "example.com"}
+    )
+    invalid = TaskRequest(task=SUBFINDER, params={"owner_id": "o", "domain": "nx.com"})
+
+    await submit(valid)
+    with pytest.raises(InvalidTaskRequestsError):
+        await submit(invalid)
+
+    assert len(published) == 1
+    assert len(resolved) == 2
+    assert all(thread is not threading.main_thread() for thread in resolved)
+
+
+@pytest.mark.asyncio
+async def test_route_answers_422(published, resolved):
+    app = FastAPI()
+    app.include_router(tasks.router)
+    body = {"task": SUBFINDER, "params": {"owner_id": "o", "domain": "nx.com"}}
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.post("/tasks", json=body)
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["message"][0]["msg"].endswith("Invalid domain.")
+    assert published == []
+
+
+@pytest.mark.asyncio
+async def test_replays_are_not_validated_again(published, resolved, monkeypatch):
+    deduplicator = Deduplicator(MemoryClaimStore())
+    monkeypatch.setattr(submit_module, "get_deduplicator", lambda: deduplicator)
+    valid = TaskRequest(
+        task=SUBFINDER, params={"owner_id": "o", "domain": "example.com"}
+    )
+    invalid = TaskRequest(task=SUBFINDER, params={"owner_id": "o", "domain": "nx.com"})
+
+    task_id, _ = await submit(valid, idempotency_key="k")
+    assert await submit(valid, idempotency_key="k") == (task_id, True)
+    with pytest.raises(InvalidTaskRequestsError):
+        await submit(invalid, idempotency_key="invalid")
+
+    assert len(resolved) == 2
+    assert len(published) == 1
+    # The refused submission does not keep its key.
+    assert await deduplicator.claim("new", SUBFINDER, invalid.params, "invalid") is None
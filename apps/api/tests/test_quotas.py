@@ -0,0 +1,151 @@
+from dataclasses import replace
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.core import config
+from discovery.core import redis as redis_module
+from discovery.routes import tasks
+from discovery.runs import quotas as quotas_module
+from discovery.runs import submit as submit_module
+from discovery.runs.dedup import Deduplicator, MemoryClaimStore
+from discovery.runs.quotas import (
+    MemoryQuotaStore,
+    Quotas,
+    RateLimitExceededError,
+    get_quotas,
+)
+from discovery.runs.submit import TaskRequest, submit
+
+HTTPX = "discovery.tasks.projectdiscovery.httpx"
+
+
+@pytest.fixture
+def quotas(monkeypatch):
+    quotas = Quotas(MemoryQuotaStore(), rate=0.01, burst=2, max_running=1)
+    monkeypatch.setattr(submit_module, "get_quotas", lambda: quotas)
+    monkeypatch.setattr(
+        submit_module, "get_deduplicator", lambda: Deduplicator(MemoryClaimStore())
+    )
+    monkeypatch.setattr(submit_module, "publish", lambda messages: None)
+    return quotas
+
+
+@pytest.mark.asyncio
+async def test_memory_token_bucket():
+    store = MemoryQuotaStore()
+
+    assert await store.take("key", rate=1, burst=2, cost=2) == 0
+    assert 0 < await store.take("key", rate=1, burst=2, cost=1) <= 1
+    assert await store.take("other", rate=1, burst=2, cost=1) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_slots():
+    store = MemoryQuotaStore()
+
+    assert await store.acquire("key", "a", limit=1, ttl=60)
+    assert await store.acquire("key", "a", limit=1, ttl=60)
+    assert not await store.acquire("key", "b", limit=1, ttl=60)
+    await store.release("key", "a")
+    assert await store.acquire("key", "b", limit=1, ttl=60)
+    assert await store.acquire("expired", "a", limit=1, ttl=0)
+    assert await store.acquire("expired", "b", limit=1, ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_throttle_per_owner(quotas):
+    await quotas.throttle(["a", "a"])
+    await quotas.throttle(["b"])
+
+    with pytest.raises(RateLimitExceededError) as err:
+        await quotas.throttle(["a"])
+    assert err.value.owner_id == "a"
+    assert err.value.retry_after > 0
+    with pytest.raises(RateLimitExceededError):
+        await quotas.throttle(["c", "c", "c"])
+
+
+@pytest.mark.asyncio
+async def test_disabled_quotas():
+    quotas = Quotas(MemoryQuotaStore())
+
+    await quotas.throttle(["a"] * 100)
+    assert await quotas.acquire("1", "a")
+    assert await quotas.acquire("2", "a")
+
+
+@pytest.mark.asyncio
+async def test_running_slots_per_owner(quotas):
+    assert await quotas.acquire("1", "a")
+    assert not await quotas.acquire("2", "a")
+    assert await quotas.acquire("3", "b")
+
+    await quotas.release("1", "a")
+    assert await quotas.acquire("2", "a")
+
+
+@pytest.mark.asyncio
+async def test_submit_is_rate_limited(quotas):
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": []})
+
+    await submit(request)
+    await submit(request)
+    with pytest.raises(RateLimitExceededError):
+        await submit(request)
+
+
+@pytest.mark.asyncio
+async def test_route_answers_429(quotas):
+    app = FastAPI()
+    app.include_router(tasks.router)
+    body = {"task": HTTPX, "params": {"owner_id": "o", "domains": []}}
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        responses = [await client.post("/tasks", json=body) for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert int(responses[2].headers["retry-after"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_replays_do_not_spend_tokens(quotas, monkeypatch):
+    deduplicator = Deduplicator(MemoryClaimStore())
+    monkeypatch.setattr(submit_module, "get_deduplicator", lambda: deduplicator)
+    request = TaskRequest(task=HTTPX, params={"owner_id": "o", "domains": []})
+
+    first = await submit(request, idempotency_key="k")
+    replays = [await submit(request, idempotency_key="k") for _ in range(3)]
+    await submit(request)
+    with pytest.raises(RateLimitExceededError):
+        await submit(request, idempotency_key="refused")
+
+    assert replays == [(first[0], True)] * 3
+    # The refused submission does not keep its key.
+    assert await deduplicator.claim("new", HTTPX, request.params, "refused") is None
+
+
+@pytest.mark.asyncio
+async def test_refused_batch_refunds_the_other_owners(quotas):
+    await quotas.throttle(["b", "b"])
+
+    with pytest.raises(RateLimitExceededError):
+        await quotas.throttle(["a", "a", "b"])
+    await quotas.throttle(["a", "a"])
+
+
+@pytest.mark.asyncio
+async def test_running_slots_need_redis(monkeypatch, caplog):
+    monkeypatch.setattr(quotas_module, "_quotas", None)
+    monkeypatch.setattr(redis_module, "get_redis_client", lambda: None)
+    monkeypatch.setattr(
+        config, "_quota_config", replace(config.quota_config, max_running=1)
+    )
+
+    quotas = get_quotas()
+
+    assert await quotas.acquire("a", "owner")
+    assert await quotas.acquire("b", "owner")
+    assert "MAX_RUNNING_TASKS is not enforced" in caplog.text
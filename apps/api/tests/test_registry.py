@@ -0,0 +1,90 @@
+import subprocess
+import sys
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import ValidationError
+
+from discovery.routes import tasks
+from discovery.runs.manifest import build, discover, load, parameters_type
+from discovery.runs.registry import registry
+from discovery.runs.run import GenericParamsValidator
+from discovery.tasks.projectdiscovery import httpx, subfinder
+
+HTTPX = "discovery.tasks.projectdiscovery.httpx"
+SUBFINDER = "discovery.tasks.projectdiscovery.subfinder"
+
+
+def test_manifest_is_up_to_date():
+    # Run `python -m discovery.runs.manifest` after changing a task.
+    assert load() == build(discover())
+
+
+def test_registry_does_not_import_tasks():
+    code = (
+        "import sys; from discovery.runs.registry import registry; "
+        f"assert {HTTPX!r} in registry; "
+        "assert not [m for m in sys.modules if m.startswith('discovery.tasks.')]"
+    )
+
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+@pytest.mark.parametrize(
+    "task, parameters, params",
+    [
+        (HTTPX, httpx.Parameters, {"owner_id": "o", "domains": ["a.com"]}),
+        (HTTPX, httpx.Parameters, {"owner_id": "o", "domains": "a.com"}),
+        (HTTPX, httpx.Parameters, {"domains": []}),
+        (SUBFINDER, subfinder.Parameters, {"owner_id": "o", "domain": "a.com"}),
+        (
+            SUBFINDER,
+            subfinder.Parameters,
+            {"owner_id": "o", "domain": "a.com", "stream": True, "batch_window": 1},
+        ),
+        (SUBFINDER, subfinder.Parameters, {"owner_id": "o", "domain": 1}),
+        (
+            SUBFINDER,
+            subfinder.Parameters,
+            {"owner_id": "o", "domain": "a", "stream": 1},
+        ),
+    ],
+)
+def test_manifest_parameters_validate_like_the_task(task, parameters, params):
+    def valid(parameters):
+        try:
+            GenericParamsValidator[parameters].model_validate(
+                obj={"params": params}, strict=True
+            )
+        except ValidationError:
+            return False
+        return True
+
+    assert valid(registry.parameters(task)) == valid(parameters)
+
+
+def test_parameters_type():
+    parameters = parameters_type(
+        {
+            "properties": {"a": {"type": "string"}, "b": {"anyOf": []}},
+            "required": ["a"],
+        }
+    )
+
+    assert parameters.__required_keys__ == {"a"}
+    assert parameters.__optional_keys__ == {"b"}
+
+
+@pytest.mark.asyncio
+async def test_schema_route():
+    app = FastAPI()
+    app.include_router(tasks.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        found = await client.get(f"/tasks/{HTTPX}/schema")
+        missing = await client.get("/tasks/unknown/schema")
+
+    assert found.json()["required"] == ["owner_id", "domains"]
+    assert missing.status_code == 404
@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+import pytest
+from tortoise import timezone
+
+from discovery.core.cache import Cache
+from discovery.db.archive import MemoryArchiveStore, archive_key, decode
+from discovery.db.models import Run, RunStatus
+from discovery.db.repositories.runs import Repository
+from discovery.runs.retention import archive_run, compact
+
+
+@pytest.fixture
+def store():
+    return MemoryArchiveStore()
+
+
+@pytest.fixture
+def repository(store):
+    return Repository(cache=Cache(), archive_store=store)
+
+
+async def create_run(_id, status=RunStatus.SUCCESS, age=timedelta(days=40)):
+    await Run.create(
+        id=_id,
+        name="alpine",
+        status=status,
+        result={"domains": ["a.example.com"]},
+        errors=[{"message": "error"}],
+    )
+    await Run.filter(id=_id).update(created_at=timezone.now() - age)
+
+
+@pytest.mark.asyncio
+async def test_compact(database, repository, store):
+    await create_run("old")
+    await create_run("pending", status=RunStatus.PENDING)
+    await create_run("recent", age=timedelta(days=1))
+
+    assert await compact(timedelta(days=30), repository=repository) == 1
+
+    run = await Run.get(id="old")
+    assert run.result == {}
+    assert run.errors == []
+    assert run.archive["key"] == archive_key("old")
+    assert decode(store.objects[archive_key("old")]) == {
+        "result": {"domains": ["a.example.com"]},
+        "errors": [{"message": "error"}],
+    }
+    assert (await Run.get(id="recent")).archive is None
+    assert await compact(timedelta(days=30), repository=repository) == 0
+
+
+@pytest.mark.asyncio
+async def test_compact_batches(database, repository):
+    for index in range(5):
+        await create_run(f"run-{index}")
+
+    assert await compact(timedelta(days=30), batch_size=2, repository=repository) == 5
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_rehydrates(database, repository):
+    await create_run("old")
+    await compact(timedelta(days=30), repository=repository)
+
+    run = await repository.get_by_id("old")
+
+    assert run.result == {"domains": ["a.example.com"]}
+    assert run.errors == [{"message": "error"}]
+
+
+@pytest.mark.asyncio
+async def test_errors_appended_after_archiving_are_kept(database, repository):
+    await create_run("old")
+    await compact(timedelta(days=30), repository=repository)
+    await repository.append_error("old", {"message": "new"})
+    await repository.invalidate("old")
+
+    run = await repository.get_by_id("old")
+    [summary] = (await repository.summaries()).items
+    [node] = await repository.tree("old", fields=["errors"])
+
+    assert run.errors == [{"message": "error"}, {"message": "new"}]
+    assert summary["errors_count"] == 2
+    assert node["errors"] == run.errors
+
+
+@pytest.mark.asyncio
+async def test_summaries_keep_archived_sizes(database, repository):
+    await create_run("old")
+    [before] = (await repository.summaries()).items
+    await compact(timedelta(days=30), repository=repository)
+
+    [after] = (await repository.summaries()).items
+
+    assert after["result_size"] == before["result_size"]
+    assert after["errors_count"] == before["errors_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_archive_skips_modified_runs(database, repository, store):
+    await create_run("old")
+    run = await Run.get(id="old")
+    await repository.append_error("old", {"message": "late"})
+
+    assert await archive_run(run, repository, store) is False
+    assert store.objects == {}
+    assert len((await Run.get(id="old")).errors) == 2
+
+
+@pytest.mark.asyncio
+async def test_tree_rehydrates(database, repository):
+    await Run.create(id="root", name="subfinder", status=RunStatus.SUCCESS)
+    await create_run("old")
+    await Run.filter(id="old").update(parent_id="root")
+    await compact(timedelta(days=30), repository=repository)
+
+    root, child = await repository.tree("root", fields=["result", "errors"])
+    [summary, _] = await repository.tree("root")
+
+    assert root["result"] == {}
+    assert child["result"] == {"domains": ["a.example.com"]}
+    assert child["errors"] == [{"message": "error"}]
+    assert "archive" not in child and "archive" not in summary
@@ -0,0 +1,193 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.core.cache import Cache
+from discovery.db.archive import MemoryArchiveStore, archive_key, encode
+from discovery.db.models import Run
+from discovery.db.repositories.runs import InvalidResultFieldsError, Repository
+from discovery.routes import runs
+
+ITEMS = [
+    {
+        "host": f"host{index}.example.com",
+        "status_code": 200 if index % 2 else 404,
+        "cdn": index % 3 == 0,
+        "technologies": ["nginx"],
+    }
+    for index in range(25)
+]
+
+
+@pytest_asyncio.fixture
+async def results(database):
+    await Run.create(
+        id="httpx", name="httpx", owner_id="owner", result={"items": ITEMS}
+    )
+    await Run.create(
+        id="subfinder",
+        name="subfinder",
+        owner_id="owner",
+        result={"domains": ["a.example.com", "b.example.com"]},
+    )
+    await Run.create(id="empty", name="alpine", owner_id="owner")
+
+
+@pytest_asyncio.fixture
+async def client(results):
+    app = FastAPI()
+    app.include_router(runs.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+async def read(repository, source, batch_size=10):
+    return [batch async for batch in repository.results(source, batch_size=batch_size)]
+
+
+@pytest.mark.asyncio
+async def test_results_are_read_in_batches(results):
+    repository = Repository()
+    source = await repository.result_source("httpx")
+
+    batches = await read(repository, source)
+
+    assert source.collection == "items"
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [item for batch in batches for item in batch] == ITEMS
+
+
+@pytest.mark.asyncio
+async def test_results_are_queried_in_larger_chunks(results, monkeypatch):
+    repository = Repository()
+    queries = []
+    results_query = repository._results_query
+
+    def spy(*args):
+        queries.append(args)
+        return results_query(*args)
+
+    monkeypatch.setattr(repository, "_results_query", spy)
+    source = await repository.result_source("httpx")
+
+    batches = [
+        batch async for batch in repository.results(source, batch_size=5, query_size=20)
+    ]
+
+    assert [len(batch) for batch in batches] == [5, 5, 5, 5, 5]
+    assert [item for batch in batches for item in batch] == ITEMS
+    assert len(queries) == 2
+
+
+@pytest.mark.asyncio
+async def test_paused_stream_does_not_hold_the_database(results):
+    repository = Repository()
+    batches = repository.results(await repository.result_source("httpx"), 5)
+    try:
+        await anext(batches)
+
+        count = await asyncio.wait_for(Run.filter(owner_id="owner").count(), 1)
+    finally:
+        await batches.aclose()
+
+    assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_results_fields_and_filters(results):
+    repository = Repository()
+    source = await repository.result_source(
+        "httpx",
+        fields=["host", "technologies", "missing"],
+        filters={"status_code": "200", "cdn": "true"},
+    )
+
+    items = [item for batch in await read(repository, source) for item in batch]
+
+    assert items == [
+        {"host": item["host"], "technologies": ["nginx"], "missing": None}
+        for item in ITEMS
+        if item["status_code"] == 200 and item["cdn"]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_results_of_scalars_and_empty_runs(results):
+    repository = Repository()
+
+    domains = await read(repository, await repository.result_source("subfinder"))
+    empty = await read(repository, await repository.result_source("empty"))
+
+    assert domains == [["a.example.com", "b.example.com"]]
+    assert empty == []
+    assert await repository.result_source("unknown") is None
+    assert await repository.result_source("httpx", owner_id="other") is None
+
+
+@pytest.mark.asyncio
+async def test_results_of_archived_runs(results):
+    store = MemoryArchiveStore()
+    await store.put(archive_key("httpx"), encode({"result": {"items": ITEMS}}))
+    await Run.filter(id="httpx").update(
+        result={}, archive={"key": archive_key("httpx")}
+    )
+    repository = Repository(cache=Cache(), archive_store=store)
+    source = await repository.result_source(
+        "httpx", fields=["host"], filters={"status_code": "404"}
+    )
+
+    batches = await read(repository, source, batch_size=5)
+
+    assert [len(batch) for batch in batches] == [5, 5, 3]
+    assert batches[0][0] == {"host": "host0.example.com"}
+
+
+@pytest.mark.asyncio
+async def test_invalid_result_fields(results):
+    with pytest.raises(InvalidResultFieldsError):
+        await Repository().result_source("httpx", fields=["$.host"])
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson(client):
+    response = await client.get(
+        "/runs/httpx/results", params={"fields": "host", "filter": "status_code:404"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[:2] == [{"host": "host0.example.com"}, {"host": "host2.example.com"}]
+    assert len(lines) == 13
+
+
+@pytest.mark.asyncio
+async def test_export_csv(client):
+    response = await client.get("/runs/httpx/results", params={"format": "csv"})
+    domains = await client.get("/runs/subfinder/results", params={"format": "csv"})
+
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["host", "status_code", "cdn", "technologies"]
+    assert rows[1] == ["host0.example.com", "404", "true", '["nginx"]']
+    assert len(rows) == 26
+    assert domains.text.splitlines() == ["value", "a.example.com", "b.example.com"]
+
+
+@pytest.mark.asyncio
+async def test_export_errors(client):
+    missing = await client.get("/runs/unknown/results")
+    invalid_filter = await client.get("/runs/httpx/results", params={"filter": "cdn"})
+    invalid_field = await client.get("/runs/httpx/results", params={"fields": "a.b"})
+
+    assert missing.status_code == 404
+    assert invalid_filter.status_code == 400
+    assert invalid_field.status_code == 400
@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from tortoise import connections, timezone
+
+from discovery.db import migrations
+from discovery.db.models import Run, RunStatus
+from discovery.db.repositories.runs import Repository
+from discovery.db.repositories.stats import (
+    OVERFLOW_BUCKET,
+    duration_bucket,
+    percentile,
+)
+from discovery.routes import runs
+
+
+async def create(repository, _id, owner_id="owner", name="subfinder"):
+    await repository.add(Run(id=_id, name=name, owner_id=owner_id))
+
+
+async def succeed(repository, _id, seconds):
+    started_at = timezone.now()
+    await repository.transition(_id, RunStatus.RUNNING, started_at=started_at)
+    await repository.transition(
+        _id,
+        RunStatus.SUCCESS,
+        completed_at=started_at + timedelta(seconds=seconds),
+    )
+
+
+def test_duration_bucket():
+    assert duration_bucket(0.5) == 1
+    assert duration_bucket(10) == 10
+    assert duration_bucket(11) == 30
+    assert duration_bucket(10**9) == OVERFLOW_BUCKET
+
+
+def test_percentile():
+    histogram = {10: 50, 30: 50}
+
+    assert percentile({}, 0.5) is None
+    assert percentile(histogram, 0.5) == 10
+    assert percentile(histogram, 0.75) == 20
+    assert percentile({OVERFLOW_BUCKET: 1}, 0.95) == 21600
+
+
+@pytest.mark.asyncio
+async def test_counters(database):
+    repository = Repository()
+    await create(repository, "a")
+    await create(repository, "b")
+    await create(repository, "c", name="httpx")
+    await succeed(repository, "a", 3)
+    await repository.transition("b", RunStatus.FAILED)
+
+    stats = await repository.stats.get(owner_id="owner")
+
+    assert stats.statuses == {
+        RunStatus.PENDING: 1,
+        RunStatus.SUCCESS: 1,
+        RunStatus.FAILED: 1,
+    }
+    [today] = stats.daily
+    assert (today.created, today.succeeded, today.failed) == (3, 1, 1)
+    assert stats.durations["subfinder"].count == 1
+    assert 2 < stats.durations["subfinder"].p50 <= 5
+
+
+@pytest.mark.asyncio
+async def test_counters_filters(database):
+    repository = Repository()
+    await create(repository, "a")
+    await create(repository, "b", owner_id="other", name="httpx")
+
+    assert (await repository.stats.get(owner_id="other")).statuses == {
+        RunStatus.PENDING: 1
+    }
+    assert (await repository.stats.get(name="subfinder")).statuses == {
+        RunStatus.PENDING: 1
+    }
+    assert (await repository.stats.get()).statuses == {RunStatus.PENDING: 2}
+
+
+@pytest.mark.asyncio
+async def test_refused_transition_is_not_counted(database):
+    repository = Repository()
+    await create(repository, "a")
+
+    assert await repository.transition("a", RunStatus.SUCCESS) is None
+    assert (await repository.stats.get()).statuses == {RunStatus.PENDING: 1}
+
+
+@pytest.mark.asyncio
+async def test_backfill(database):
+    await Run.create(id="a", name="subfinder", owner_id="owner")
+    await Run.create(
+        id="b", name="subfinder", owner_id="owner", status=RunStatus.FAILED
+    )
+    started_at = timezone.now() - timedelta(hours=1)
+    for _id, seconds in (("c", 3), ("d", 86400 / 2)):
+        await Run.create(
+            id=_id,
+            name="subfinder",
+            status=RunStatus.SUCCESS,
+            started_at=started_at - timedelta(seconds=seconds),
+            completed_at=started_at,
+        )
+    await connections.get("default").execute_script(
+        'DELETE FROM "discovery_migrations" WHERE "name" = \'m0005_run_stats\''
+    )
+
+    assert await migrations.upgrade() == ["m0005_run_stats"]
+
+    stats = await Repository().stats.get()
+    assert stats.statuses == {
+        RunStatus.PENDING: 1,
+        RunStatus.FAILED: 1,
+        RunStatus.SUCCESS: 2,
+    }
+    assert sum(day.created for day in stats.daily) == 4
+    assert sum(day.succeeded for day in stats.daily) == 2
+    assert sum(day.failed for day in stats.daily) == 1
+    assert stats.durations["subfinder"].count == 2
+    assert 2 < stats.durations["subfinder"].p50 <= 5
+    assert stats.durations["subfinder"].p95 == 21600
+
+
+@pytest.mark.asyncio
+async def test_stats_route(database):
+    await create(Repository(), "a")
+    app = FastAPI()
+    app.include_router(runs.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/runs/stats", params={"owner_id": "owner"})
+
+    assert response.status_code == 200
+    assert response.json()["statuses"] == {"PENDING": 1}
+    assert response.json()["daily"][0]["created"] == 1
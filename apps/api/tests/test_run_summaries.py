@@ -0,0 +1,81 @@
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.db.models import Run
+from discovery.db.repositories.runs import InvalidFieldsError, Repository
+from discovery.routes import runs
+
+
+@pytest_asyncio.fixture
+async def seeded(database):
+    await Run.create(
+        id="run",
+        name="alpine",
+        owner_id="owner",
+        parameters={"domain": "example.com"},
+        result={"domains": ["a.example.com"]},
+        files=[{"path": "a"}, {"path": "b"}],
+        errors=[{"message": "error"}],
+    )
+
+
+@pytest_asyncio.fixture
+async def client(seeded):
+    app = FastAPI()
+    app.include_router(runs.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_summaries(seeded):
+    page = await Repository().summaries()
+
+    [summary] = page.items
+    assert "result" not in summary
+    assert "parameters" not in summary
+    assert summary["id"] == "run"
+    assert summary["result_size"] == len('{"domains":["a.example.com"]}')
+    assert summary["files_count"] == 2
+    assert summary["errors_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_summaries_invalid_fields(seeded):
+    with pytest.raises(InvalidFieldsError, match="Invalid fields: result"):
+        await Repository().summaries(fields=["status", "result"])
+
+
+@pytest.mark.asyncio
+async def test_list_fields(client):
+    response = await client.get("/runs", params={"fields": "status,parameters"})
+
+    assert response.json()["items"] == [
+        {
+            "id": "run",
+            "created_at": response.json()["items"][0]["created_at"],
+            "status": "PENDING",
+            "parameters": {"domain": "example.com"},
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_list_invalid_fields(client):
+    response = await client.post(
+        "/runs/filters", params={"fields": "result"}, json={"status": "PENDING"}
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_detail_returns_full_run(client):
+    response = await client.get("/runs/run")
+
+    assert response.json()["result"] == {"domains": ["a.example.com"]}
+    assert response.json()["files"] == [{"path": "a"}, {"path": "b"}]
@@ -0,0 +1,79 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from discovery.db.models import Run, RunStatus
+from discovery.db.repositories.runs import Repository
+
+
+@pytest.fixture
+def repository():
+    return Repository()
+
+
+@pytest.mark.asyncio
+async def test_transition(database, repository):
+    await Run.create(id="run", name="alpine", owner_id="owner", result={"a": 1})
+
+    started_at = datetime(2024, 8, 1, 12, 0, tzinfo=UTC)
+    transition = await repository.transition(
+        "run", RunStatus.RUNNING, started_at=started_at
+    )
+
+    assert transition.previous == RunStatus.PENDING
+    assert transition.run.id == "run"
+    assert transition.run.owner_id == "owner"
+    assert transition.run.status == RunStatus.RUNNING
+    run = await Run.get(id="run")
+    assert run.status == RunStatus.RUNNING
+    assert run.started_at == started_at
+    assert run.result == {"a": 1}
+
+
+@pytest.mark.asyncio
+async def test_transition_not_allowed(database, repository):
+    await Run.create(id="run", name="alpine")
+
+    assert await repository.transition("run", RunStatus.SUCCESS) is None
+    assert await repository.transition("missing", RunStatus.RUNNING) is None
+    assert (await Run.get(id="run")).status == RunStatus.PENDING
+
+
+@pytest.mark.asyncio
+async def test_transition_writes_changes(database, repository):
+    await Run.create(id="run", name="alpine", status=RunStatus.RUNNING)
+
+    transition = await repository.transition(
+        "run", RunStatus.SUCCESS, result={"domains": ["example.com"]}
+    )
+
+    assert transition.previous == RunStatus.RUNNING
+    run = await Run.get(id="run")
+    assert run.status == RunStatus.SUCCESS
+    assert run.result == {"domains": ["example.com"]}
+
+
+@pytest.mark.asyncio
+async def test_transition_appends_error(database, repository):
+    await Run.create(id="run", name="alpine", errors=[{"message": "first"}])
+
+    transition = await repository.transition(
+        "run", RunStatus.FAILED, error={"message": "second"}
+    )
+
+    assert transition.previous == RunStatus.PENDING
+    run = await Run.get(id="run")
+    assert run.status == RunStatus.FAILED
+    assert run.failed_at is None
+    assert run.errors == [{"message": "first"}, {"message": "second"}]
+
+
+@pytest.mark.asyncio
+async def test_append_error(database, repository):
+    await Run.create(id="run", name="alpine", status=RunStatus.SUCCESS)
+
+    assert await repository.append_error("run", {"message": "late"}) is True
+    assert await repository.append_error("missing", {"message": "late"}) is False
+    run = await Run.get(id="run")
+    assert run.status == RunStatus.SUCCESS
+    assert run.errors == [{"message": "late"}]
@@ -0,0 +1,106 @@
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from discovery.db.models import Run, RunStatus
+from discovery.db.repositories.runs import InvalidFieldsError, Repository
+from discovery.routes import runs
+
+
+@pytest_asyncio.fixture
+async def chain(database):
+    # root -> child -> grandchild, plus an unrelated run
+    await Run.create(id="root", name="subfinder", owner_id="owner")
+    await Run.create(
+        id="child", name="httpx", owner_id="owner", parent_id="root", files=[{}]
+    )
+    await Run.create(
+        id="grandchild",
+        name="nuclei",
+        owner_id="owner",
+        parent_id="child",
+        result={"findings": []},
+    )
+    await Run.create(id="other", name="subfinder", owner_id="owner")
+
+
+@pytest_asyncio.fixture
+async def client(chain):
+    app = FastAPI()
+    app.include_router(runs.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_tree(chain):
+    nodes = await Repository().tree("root")
+
+    assert [(node["id"], node["depth"]) for node in nodes] == [
+        ("root", 0),
+        ("child", 1),
+        ("grandchild", 2),
+    ]
+    assert nodes[1]["parent_id"] == "root"
+    assert nodes[1]["files_count"] == 1
+    assert "result" not in nodes[2]
+
+
+@pytest.mark.asyncio
+async def test_tree_depth(chain):
+    nodes = await Repository().tree("root", depth=1)
+
+    assert [node["id"] for node in nodes] == ["root", "child"]
+
+
+@pytest.mark.asyncio
+async def test_tree_fields(chain):
+    [root, child, grandchild] = await Repository().tree(
+        "root", fields=["status", "result"]
+    )
+
+    assert set(grandchild) == {
+        "id",
+        "parent_id",
+        "created_at",
+        "depth",
+        "status",
+        "result",
+    }
+    assert grandchild["result"] == {"findings": []}
+    assert root["status"] == RunStatus.PENDING
+
+
+@pytest.mark.asyncio
+async def test_tree_owner(chain):
+    assert await Repository().tree("root", owner_id="someone") == []
+
+
+@pytest.mark.asyncio
+async def test_tree_invalid_fields(chain):
+    with pytest.raises(InvalidFieldsError, match="Invalid fields: secret"):
+        await Repository().tree("root", fields=["secret"])
+
+
+@pytest.mark.asyncio
+async def test_tree_route(client):
+    response = await client.get(
+        "/runs/child/tree", params={"fields": "name", "depth": 5}
+    )
+
+    assert response.status_code == 200
+    assert [(node["id"], node["name"]) for node in response.json()] == [
+        ("child", "httpx"),
+        ("grandchild", "nuclei"),
+    ]
+    assert "status" not in response.json()[0]
+
+
+@pytest.mark.asyncio
+async def test_tree_route_not_found(client):
+    response = await client.get("/runs/missing/tree")
+
+    assert response.status_code == 404
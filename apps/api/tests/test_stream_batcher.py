@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from discovery.runs.stream import Batcher
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    async def __call__(self, batch: list[str]) -> None:
+        self.batches.append(batch)
+
+
+@pytest.mark.asyncio
+async def test_flush_on_size():
+    recorder = Recorder()
+    batcher = Batcher(on_batch=recorder, size=2, window=60)
+
+    for item in ["a", "b", "c"]:
+        await batcher.add(item)
+
+    assert recorder.batches == [["a", "b"]]
+    assert batcher.pending == 1
+
+    await batcher.close()
+    assert recorder.batches == [["a", "b"], ["c"]]
+    assert batcher.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_flush_on_window():
+    recorder = Recorder()
+    batcher = Batcher(on_batch=recorder, size=100, window=0.01)
+
+    await batcher.add("a")
+    await asyncio.sleep(0.05)
+
+    assert recorder.batches == [["a"]]
+    assert batcher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_close_without_items():
+    recorder = Recorder()
+    batcher = Batcher(on_batch=recorder)
+
+    await batcher.close()
+
+    assert recorder.batches == []
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError, match="Batch size must be at least 1"):
+        Batcher(on_batch=Recorder(), size=0)
+    with pytest.raises(ValueError, match="Batch window must be positive"):
+        Batcher(on_batch=Recorder(), window=0)
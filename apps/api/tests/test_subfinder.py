@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from discovery.core.events import Dispatcher, MemorySink
+from discovery.db.models import Run, RunStatus
+from discovery.runs import run as run_module
+from discovery.tasks.projectdiscovery import subfinder
+
+
+@pytest.fixture
+def published(monkeypatch):
+    tasks = []
+
+    def send_task(name, kwargs, task_id=None):
+        tasks.append((task_id, kwargs["domains"]))
+        return MagicMock(id=task_id)
+
+    monkeypatch.setattr(subfinder.celery, "send_task", send_task)
+    return tasks
+
+
+@pytest.fixture
+def finished_task(monkeypatch):
+    monkeypatch.setattr(run_module, "Container", MagicMock())
+    monkeypatch.setattr(run_module, "ContainerVolume", MagicMock())
+
+    def create(domains: str) -> subfinder.Task:
+        celery_task = MagicMock()
+        celery_task.request.id = "run"
+        task = subfinder.Task(task=celery_task)
+        task._dispatcher = Dispatcher(MemorySink())
+        task.container_volume.read.return_value = domains
+        task.container_volume.upload_files_to_s3.return_value = []
+        return task
+
+    return create
+
+
+@pytest.mark.asyncio
+async def test_domains_are_scanned_once_the_run_succeeds(
+    database, published, finished_task
+):
+    await Run.create(id="run", name="subfinder", status=RunStatus.RUNNING)
+
+    await finished_task("a.com\nb.com").on_finished()
+
+    run = await Run.get(id="run")
+    assert run.status == RunStatus.SUCCESS
+    assert published == [(run.result["batches"][0], ["a.com", "b.com"])]
+
+
+@pytest.mark.asyncio
+async def test_refused_transition_scans_nothing(database, published, finished_task):
+    await Run.create(id="run", name="subfinder", status=RunStatus.FAILED)
+
+    await finished_task("a.com").on_finished()
+
+    assert published == []
+    assert (await Run.get(id="run")).status == RunStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_no_domains_scans_nothing(database, published, finished_task):
+    await Run.create(id="run", name="subfinder", status=RunStatus.RUNNING)
+
+    await finished_task("").on_finished()
+
+    assert published == []
+    assert (await Run.get(id="run")).result["batches"] == []
@@ -0,0 +1,144 @@
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from tortoise.exceptions import IntegrityError
+
+from discovery.core.events import Dispatcher, MemorySink
+from discovery.db.models import Run, RunStatus
+from discovery.db.repositories.runs import Repository
+from discovery.routes import tasks
+from discovery.runs import submit
+from discovery.runs.run import DefaultParameters
+from discovery.runs.run import Run as BaseRun
+from discovery.runs.submit import InvalidTaskRequestsError, TaskRequest, submit_batch
+
+SUBFINDER = "discovery.tasks.projectdiscovery.subfinder"
+HTTPX = "discovery.tasks.projectdiscovery.httpx"
+
+
+@pytest.fixture
+def published(monkeypatch):
+    batches = []
+    monkeypatch.setattr(submit, "publish", batches.append)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_submit_batch(database, published):
+    requests = [
+        TaskRequest(task=SUBFINDER, params={"owner_id": "owner", "domain": "a.com"}),
+        TaskRequest(task=HTTPX, params={"owner_id": "owner", "domains": ["b.com"]}),
+    ]
+
+    ids = await submit_batch(requests)
+
+    [batch] = published
+    assert [(_id, name) for _id, name, _ in batch] == [
+        (ids[0], SUBFINDER),
+        (ids[1], HTTPX),
+    ]
+    runs = {run.id: run for run in await Run.all()}
+    assert runs[ids[0]].name == "projectdiscovery/subfinder:latest"
+    assert runs[ids[1]].parameters == {"owner_id": "owner", "domains": ["b.com"]}
+    assert runs[ids[1]].status == RunStatus.PENDING
+    stats = await Repository().stats.get()
+    assert stats.statuses == {RunStatus.PENDING: 2}
+
+
+@pytest.mark.asyncio
+async def test_submit_batch_invalid(database, published):
+    requests = [
+        TaskRequest(task=SUBFINDER, params={"owner_id": "owner", "domain": "a.com"}),
+        TaskRequest(task="missing", params={}),
+        TaskRequest(task=SUBFINDER, params={"owner_id": "owner"}),
+    ]
+
+    with pytest.raises(InvalidTaskRequestsError) as err:
+        await submit_batch(requests)
+
+    assert [error["index"] for error in err.value.errors] == [1, 2]
+    assert published == []
+    assert await Run.all().count() == 0
+
+
+@pytest.mark.asyncio
+async def test_submit_batch_publish_failure(database, monkeypatch):
+    def publish(messages):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(submit, "publish", publish)
+
+    with pytest.raises(ConnectionError):
+        await submit_batch(
+            [TaskRequest(task=HTTPX, params={"owner_id": "owner", "domains": []})]
+        )
+
+    [run] = await Run.all()
+    assert run.status == RunStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_batch_route(database, published):
+    app = FastAPI()
+    app.include_router(tasks.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            "/tasks/batch",
+            json=[{"task": HTTPX, "params": {"owner_id": "o", "domains": []}}] * 3,
+        )
+        invalid = await client.post("/tasks/batch", json=[])
+
+    assert response.status_code == 200
+    assert len(set(response.json()["ids"])) == 3
+    assert invalid.status_code == 422
+
+
+class Task(BaseRun[DefaultParameters]):
+    async def run(self, **params):
+        pass
+
+    async def on_finished(self) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_on_created_tolerates_submitted_run(database, published, monkeypatch):
+    [_id] = await submit_batch(
+        [TaskRequest(task=HTTPX, params={"owner_id": "owner", "domains": []})]
+    )
+    task = MagicMock()
+    task.request.id = _id
+    run = Task(
+        image="alpine",
+        task=task,
+        container=MagicMock(),
+        container_volume=MagicMock(),
+        dispatcher=Dispatcher(MemorySink()),
+    )
+
+    await run.on_created(owner_id="owner")
+
+    assert await Run.all().count() == 1
+    assert (await Repository().stats.get()).statuses == {RunStatus.PENDING: 1}
+
+
+@pytest.mark.asyncio
+async def test_on_created_surfaces_other_integrity_errors(database):
+    task = MagicMock()
+    task.request.id = "run"
+    run = Task(
+        image="alpine",
+        task=task,
+        container=MagicMock(),
+        container_volume=MagicMock(),
+        dispatcher=Dispatcher(MemorySink()),
+    )
+
+    with pytest.raises(IntegrityError):
+        await run.on_created(owner_id="owner", parent_id="missing")
+
+    assert await Run.all().count() == 0
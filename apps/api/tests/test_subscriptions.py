@@ -0,0 +1,126 @@
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from discovery.core.events import Event, FanoutSink, MemorySink, Sink, encode
+from discovery.ws.runs import RunsWebSocket
+from discovery.ws.subscriptions import Relay
+
+
+def websocket(*messages: dict) -> AsyncMock:
+    socket = AsyncMock()
+    socket.receive_json.side_effect = list(messages)
+    return socket
+
+
+async def connect(manager: RunsWebSocket, *messages: dict) -> AsyncMock:
+    socket = websocket(*messages)
+    await manager.connect(socket)
+    return socket
+
+
+def payload(**data) -> str:
+    return encode(Event("runs", "run.status.changed", data))
+
+
+def sent(socket: AsyncMock) -> list[dict]:
+    return [json.loads(call.args[0]) for call in socket.send_text.await_args_list]
+
+
+def pushed(socket: AsyncMock) -> list[dict]:
+    return [
+        message["data"]["run"] for message in sent(socket) if "run" in message["data"]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_by_run_parent_and_owner():
+    manager = RunsWebSocket(relay=Relay(MagicMock()), heartbeat_interval=0)
+    by_run = await connect(
+        manager, {"action": "SUBSCRIBE", "data": {"owner_id": "owner", "id": "a"}}
+    )
+    by_parent = await connect(
+        manager,
+        {"action": "SUBSCRIBE", "data": {"owner_id": "owner", "parent_id": "a"}},
+    )
+    by_owner = await connect(
+        manager, {"action": "SUBSCRIBE", "data": {"owner_id": "owner"}}
+    )
+    for socket in (by_run, by_parent, by_owner):
+        await manager.process(socket)
+        await manager.drain()
+        assert sent(socket)[-1]["success"] is True
+
+    await manager.relay.deliver(payload(id="a", owner_id="owner"))
+    await manager.relay.deliver(payload(id="b", owner_id="owner", parent_id="a"))
+    await manager.relay.deliver(payload(id="c", owner_id="other", parent_id="a"))
+    await manager.drain()
+
+    assert [run["id"] for run in pushed(by_run)] == ["a"]
+    assert [run["id"] for run in pushed(by_parent)] == ["b"]
+    assert [run["id"] for run in pushed(by_owner)] == ["a", "b"]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_and_disconnect_stop_the_events():
+    manager = RunsWebSocket(relay=Relay(MagicMock()), heartbeat_interval=0)
+    socket = await connect(
+        manager,
+        {"action": "SUBSCRIBE", "data": {"owner_id": "owner", "id": "a"}},
+        {"action": "SUBSCRIBE", "data": {"owner_id": "owner", "id": "b"}},
+        {"action": "UNSUBSCRIBE", "data": {"owner_id": "owner", "id": "a"}},
+    )
+    for _ in range(3):
+        await manager.process(socket)
+
+    await manager.relay.deliver(payload(id="a", owner_id="owner"))
+    await manager.relay.deliver(payload(id="b", owner_id="owner"))
+    await manager.drain()
+    assert [run["id"] for run in pushed(socket)] == ["b"]
+
+    await manager.disconnect(socket)
+    assert len(manager.relay.subscriptions) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_sends_drop_the_subscriber():
+    relay = Relay(MagicMock())
+    socket = AsyncMock()
+    socket.send_text.side_effect = RuntimeError("closed")
+    relay.subscriptions.subscribe(socket, [("owner", "owner")])
+
+    await relay.deliver(payload(id="a", owner_id="owner"))
+
+    assert len(relay.subscriptions) == 0
+
+
+@pytest.mark.asyncio
+async def test_subscribe_requires_redis():
+    manager = RunsWebSocket(relay=Relay(None), heartbeat_interval=0)
+    socket = await connect(
+        manager, {"action": "SUBSCRIBE", "data": {"owner_id": "owner"}}
+    )
+
+    await manager.process(socket)
+    await manager.drain()
+
+    assert sent(socket)[-1]["success"] is False
+    await manager.close()
+
+
+class FailingSink(Sink):
+    async def send(self, events: list[Event]) -> None:
+        raise RuntimeError("unavailable")
+
+
+@pytest.mark.asyncio
+async def test_fanout_delivers_to_every_sink():
+    sink = MemorySink()
+    event = Event("runs", "run.created", {"id": "a"})
+
+    with pytest.raises(RuntimeError):
+        await FanoutSink([FailingSink(), sink]).send([event])
+
+    assert sink.events == [event]
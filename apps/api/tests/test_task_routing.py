@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from discovery.core.celery import celery
+from discovery.runs.registry import apply_prefetch_multiplier, registry
+from discovery.runs.schemas import TaskOptions
+
+HTTPX = "discovery.tasks.projectdiscovery.httpx"
+SUBFINDER = "discovery.tasks.projectdiscovery.subfinder"
+RETENTION = "discovery.runs.retention.compact"
+
+
+def worker(queues: list[str], prefetch_multiplier: int = 4) -> SimpleNamespace:
+    consume_from = {name: None for name in queues}
+    return SimpleNamespace(
+        app=SimpleNamespace(
+            amqp=SimpleNamespace(queues=SimpleNamespace(consume_from=consume_from))
+        ),
+        prefetch_multiplier=prefetch_multiplier,
+    )
+
+
+def test_declared_options():
+    assert TaskOptions(queue="q", acks_late=False).declared() == {
+        "queue": "q",
+        "acks_late": False,
+    }
+    assert registry.options(HTTPX).queue == "httpx"
+    assert registry.options(SUBFINDER).prefetch_multiplier == 1
+
+
+def test_tasks_have_their_settings():
+    task = celery.tasks[HTTPX]
+
+    assert task.acks_late is True
+    assert task.time_limit == 3300
+    assert task.soft_time_limit == 3000
+    assert celery.tasks[SUBFINDER].time_limit == 900
+
+
+def test_tasks_published_by_name_are_routed():
+    route = celery.amqp.router.route({}, SUBFINDER)
+
+    assert route["queue"].name == "subfinder"
+    # Bound on their own, or a direct exchange would copy messages to them all.
+    assert route["queue"].exchange.name == "subfinder"
+    assert route["queue"].routing_key == "subfinder"
+    assert celery.amqp.router.route({}, RETENTION)["queue"].name == "celery"
+
+
+def test_every_queue_is_consumed_by_default():
+    names = [queue.name for queue in celery.conf.task_queues]
+
+    assert names == ["celery", "httpx", "subfinder"]
+    assert sorted(celery.amqp.queues) == sorted(names)
+
+
+def test_prefetch_multiplier_of_the_consumed_queues():
+    dedicated = worker(["httpx"])
+    default = worker(["celery"])
+
+    apply_prefetch_multiplier(dedicated)
+    apply_prefetch_multiplier(default)
+
+    assert dedicated.prefetch_multiplier == 1
+    assert default.prefetch_multiplier == 4
+    assert registry.prefetch_multiplier(["celery", "httpx", "subfinder"]) == 1
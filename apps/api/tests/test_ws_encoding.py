@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from discovery.core.events import Event, encode
+from discovery.db.models import RunStatus
+from discovery.db.repositories.runs import RunSummary
+from discovery.ws.encoding import (
+    Frame,
+    JSONEncoder,
+    UnsupportedEncodingError,
+    get_encoder,
+)
+from discovery.ws.runs import RunsWebSocket
+from discovery.ws.subscriptions import Relay, RunVersions
+
+MESSAGE = {
+    "data": {
+        "runs": [
+            RunSummary(
+                id="a",
+                name="subfinder",
+                status=RunStatus.SUCCESS,
+                created_at=datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            )
+        ],
+        "statuses": {RunStatus.PENDING: 1},
+        "at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    },
+    "success": True,
+}
+
+
+def test_json_matches_jsonable_encoder():
+    assert json.loads(JSONEncoder().encode(MESSAGE)) == jsonable_encoder(MESSAGE)
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    encoder = get_encoder("msgpack")
+
+    assert encoder.decode(encoder.encode(MESSAGE)) == jsonable_encoder(MESSAGE)
+
+
+def test_unknown_encoding():
+    with pytest.raises(UnsupportedEncodingError):
+        get_encoder("xml")
+
+
+def test_frame_is_encoded_once_per_encoding():
+    encoder = MagicMock(wraps=JSONEncoder())
+    encoder.name = "json"
+    frame = Frame({"success": True})
+
+    assert frame.encode(encoder) == frame.encode(encoder)
+    assert encoder.encode.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_msgpack_connection_uses_binary_frames():
+    pytest.importorskip("msgpack")
+    encoder = get_encoder("msgpack")
+    manager = RunsWebSocket(relay=Relay(None), heartbeat_interval=0)
+    socket = AsyncMock()
+    socket.receive_bytes.return_value = encoder.encode({"id": 1, "action": "PING"})
+    await manager.connect(socket, encoder=encoder)
+
+    await manager.process(socket)
+    await manager.drain()
+
+    assert encoder.decode(socket.send_bytes.await_args.args[0]) == {
+        "id": 1,
+        "data": {"pong": True},
+        "success": True,
+    }
+    await manager.close()
+
+
+def test_run_versions():
+    versions = RunVersions(size=1)
+
+    assert versions.diff({"id": "a", "name": "x", "status": "PENDING"}) == (
+        1,
+        {"id": "a", "name": "x", "status": "PENDING"},
+        False,
+    )
+    assert versions.diff({"id": "a", "name": "x", "status": "RUNNING"}) == (
+        2,
+        {"id": "a", "status": "RUNNING"},
+        True,
+    )
+    versions.diff({"id": "b"})
+    assert versions.diff({"id": "a", "name": "x"})[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_delta_subscribers_receive_changed_fields():
+    manager = RunsWebSocket(relay=Relay(MagicMock()), heartbeat_interval=0)
+    full, delta = AsyncMock(), AsyncMock()
+    full.receive_json.return_value = {
+        "action": "SUBSCRIBE",
+        "data": {"owner_id": "owner"},
+    }
+    delta.receive_json.return_value = {
+        "action": "SUBSCRIBE",
+        "data": {"owner_id": "owner", "delta": True},
+    }
+    for socket in (full, delta):
+        await manager.connect(socket)
+        await manager.process(socket)
+
+    for status in (["PENDING", "RUNNING"], ["RUNNING", "SUCCESS"]):
+        await manager.relay.deliver(
+            encode(
+                Event(
+                    "runs",
+                    "run.status.changed",
+                    {"id": "a", "name": "httpx", "owner_id": "owner", "status": status},
+                )
+            )
+        )
+    await manager.drain()
+
+    [*_, last] = [json.loads(call.args[0]) for call in delta.send_text.await_args_list]
+    assert last["data"] == {
+        "event": "run.status.changed",
+        "run": {"id": "a", "status": ["RUNNING", "SUCCESS"]},
+        "version": 2,
+        "delta": True,
+    }
+    [*_, last] = [json.loads(call.args[0]) for call in full.send_text.await_args_list]
+    assert last["data"]["run"]["name"] == "httpx"
+    await manager.close()
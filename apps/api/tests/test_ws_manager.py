@@ -0,0 +1,327 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from discovery.ws.encoding import Encoder
+from discovery.ws.manager import TRY_AGAIN_LATER, ConnectionManager
+from discovery.ws.runs import RunsWebSocket
+from discovery.ws.subscriptions import Relay
+
+
+class FakeWebSocket:
+    def __init__(
+        self, delay: float = 0.0, messages: list[dict] = (), close_delay: float = 0.0
+    ) -> None:
+        self.delay = delay
+        self.close_delay = close_delay
+        self.messages = list(messages)
+        self.sent: list[dict] = []
+        self.closed_with = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        await asyncio.sleep(self.close_delay)
+        self.closed_with = code
+
+    async def send_text(self, payload: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(payload))
+
+    async def receive_json(self) -> dict:
+        if not self.messages:
+            raise WebSocketDisconnect()
+        message = self.messages.pop(0)
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    async def receive_bytes(self) -> bytes:
+        # A text frame: Starlette reads the missing "bytes" key of the message.
+        message = await self.receive_json()
+        raise KeyError("bytes") if message == "text" else AssertionError(message)
+
+
+class BinaryEncoder(Encoder):
+    name = "binary"
+    binary = True
+
+    def encode(self, message) -> bytes:
+        return json.dumps(message).encode()
+
+    def decode(self, payload: bytes):
+        return json.loads(payload)
+
+
+class Manager(ConnectionManager):
+    async def handle(self, sender, message: dict) -> None:
+        pass
+
+
+class SleepingManager(ConnectionManager):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(heartbeat_interval=0, **kwargs)
+        self.running = 0
+        self.max_running = 0
+
+    async def handle(self, sender, message: dict) -> None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(message["sleep"])
+        self.running -= 1
+        await self.respond(to=sender, sleep=message["sleep"], success=True)
+
+
+async def serve(manager: ConnectionManager, socket: FakeWebSocket) -> None:
+    await manager.connect(socket)
+    with pytest.raises(WebSocketDisconnect):
+        await manager.serve(socket)
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_the_others():
+    manager = Manager(heartbeat_interval=0)
+    slow, fast = FakeWebSocket(delay=1), FakeWebSocket()
+    await manager.connect(slow)
+    await manager.connect(fast)
+
+    started = time.monotonic()
+    for i in range(3):
+        await manager.respond(to=slow, index=i, success=True)
+        await manager.respond(to=fast, index=i, success=True)
+    await asyncio.sleep(0.01)
+
+    assert time.monotonic() - started < 0.5
+    assert [message["data"]["index"] for message in fast.sent] == [0, 1, 2]
+    assert slow.sent == []
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_evicts_the_client():
+    manager = Manager(queue_size=2, heartbeat_interval=0)
+    slow = FakeWebSocket(delay=1)
+    await manager.connect(slow)
+
+    results = [await manager.send(slow, {"index": i}) for i in range(4)]
+
+    assert results[-1] is False
+    assert not manager.is_connected(slow)
+    await asyncio.sleep(0.01)
+    assert slow.closed_with == TRY_AGAIN_LATER
+    assert manager.metrics.evicted == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_eviction_does_not_wait_for_the_close_frame():
+    manager = Manager(queue_size=1, send_timeout=2, heartbeat_interval=0)
+    stuck, fast = FakeWebSocket(delay=10, close_delay=10), FakeWebSocket()
+    await manager.connect(stuck)
+    await manager.connect(fast)
+
+    started = time.monotonic()
+    for i in range(3):
+        for socket in (stuck, fast):
+            await manager.send(socket, {"index": i})
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - started
+    await manager.drain()
+
+    assert elapsed < 0.5
+    assert not manager.is_connected(stuck)
+    assert [message["index"] for message in fast.sent] == [0, 1, 2]
+    assert manager.metrics.evicted == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_send_timeout_evicts_the_client():
+    manager = Manager(send_timeout=0.01, heartbeat_interval=0)
+    stuck = FakeWebSocket(delay=1)
+    await manager.connect(stuck)
+
+    await manager.send(stuck, {})
+    await asyncio.sleep(0.05)
+
+    assert not manager.is_connected(stuck)
+    await manager.close()
+
+
+class CleaningManager(ConnectionManager):
+    cleaned = False
+
+    async def handle(self, sender, message: dict) -> None:
+        try:
+            await asyncio.sleep(10)
+        finally:
+            await asyncio.sleep(0.01)
+            self.cleaned = True
+
+
+@pytest.mark.asyncio
+async def test_close_waits_for_the_cancelled_tasks():
+    manager = CleaningManager(heartbeat_interval=0)
+    socket = FakeWebSocket(messages=[{"id": 1}])
+    await serve(manager, socket)
+    await asyncio.sleep(0)
+    writer = manager._connections[socket].writer
+
+    await manager.close()
+
+    assert manager.cleaned
+    assert writer.done()
+
+
+@pytest.mark.asyncio
+async def test_connection_limit():
+    manager = Manager(max_connections=1, heartbeat_interval=0)
+    first, second = FakeWebSocket(), FakeWebSocket()
+
+    assert await manager.connect(first)
+    assert not await manager.connect(second)
+    assert second.closed_with == TRY_AGAIN_LATER
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_pings_and_closes_idle_connections():
+    manager = Manager(heartbeat_interval=0, idle_timeout=60)
+    active, idle = FakeWebSocket(messages=[{}]), FakeWebSocket()
+    await manager.connect(active)
+    await manager.connect(idle)
+    manager._connections[idle].last_seen -= 120
+    await manager.receive(active)
+
+    await manager.heartbeat()
+    await manager.drain()
+
+    assert active.sent == [{"data": {"event": "ping"}, "success": True}]
+    assert not manager.is_connected(idle)
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_ping_action():
+    manager = RunsWebSocket(relay=Relay(None), heartbeat_interval=0)
+    socket = FakeWebSocket(messages=[{"action": "PING"}])
+    await manager.connect(socket)
+
+    await manager.process(socket)
+    await manager.drain()
+
+    assert socket.sent == [{"data": {"pong": True}, "success": True}]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_fan_out_to_thousands_of_connections():
+    manager = Manager(heartbeat_interval=0)
+    sockets = [FakeWebSocket() for _ in range(5000)]
+    for socket in sockets:
+        await manager.connect(socket)
+
+    started = time.monotonic()
+    for i in range(10):
+        for socket in sockets:
+            await manager.send(socket, {"index": i})
+    await manager.drain()
+    elapsed = time.monotonic() - started
+
+    assert len(manager) == 5000
+    assert all(len(socket.sent) == 10 for socket in sockets)
+    assert manager.metrics.sent == 50000
+    assert elapsed < 10
+    await manager.close()
+    assert len(manager) == 0
+
+
+@pytest.mark.asyncio
+async def test_pipelined_requests_are_handled_concurrently():
+    manager = SleepingManager()
+    socket = FakeWebSocket(messages=[{"id": 1, "sleep": 0.05}, {"id": "b", "sleep": 0}])
+
+    await serve(manager, socket)
+    await asyncio.sleep(0.1)
+    await manager.drain()
+
+    assert [message["id"] for message in socket.sent] == ["b", 1]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_requests_without_id_are_handled_in_order():
+    manager = SleepingManager()
+    socket = FakeWebSocket(messages=[{"sleep": 0.02}, {"sleep": 0}])
+
+    await serve(manager, socket)
+    await manager.drain()
+
+    assert [message["data"]["sleep"] for message in socket.sent] == [0.02, 0]
+    assert "id" not in socket.sent[0]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_pipelined_requests_are_bounded():
+    manager = SleepingManager(max_inflight=2)
+    socket = FakeWebSocket(messages=[{"id": i, "sleep": 0.01} for i in range(6)])
+
+    await serve(manager, socket)
+    await asyncio.sleep(0.05)
+    await manager.drain()
+
+    assert manager.max_running == 2
+    assert sorted(message["id"] for message in socket.sent) == list(range(6))
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_errors_carry_the_request_id():
+    manager = RunsWebSocket(relay=Relay(None), heartbeat_interval=0)
+    socket = FakeWebSocket(messages=[{"id": 7, "action": "UNKNOWN"}])
+
+    await serve(manager, socket)
+    await asyncio.sleep(0.01)
+    await manager.drain()
+
+    assert socket.sent[0]["id"] == 7
+    assert socket.sent[0]["success"] is False
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_malformed_frames_keep_the_connection_open():
+    manager = RunsWebSocket(relay=Relay(None), heartbeat_interval=0)
+    socket = FakeWebSocket(
+        messages=[json.JSONDecodeError("Expecting value", "{", 1), {"action": "PING"}]
+    )
+
+    await serve(manager, socket)
+    await manager.drain()
+
+    assert socket.sent[0]["success"] is False
+    assert "id" not in socket.sent[0]
+    assert socket.sent[1] == {"data": {"pong": True}, "success": True}
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_text_frame_on_a_binary_connection():
+    manager = RunsWebSocket(relay=Relay(None), heartbeat_interval=0)
+    socket = FakeWebSocket(messages=["text"])
+    socket.send_bytes = socket.send_text
+    await manager.connect(socket, encoder=BinaryEncoder())
+
+    with pytest.raises(WebSocketDisconnect):
+        await manager.serve(socket)
+    await manager.drain()
+
+    assert socket.sent[0]["success"] is False
+    assert manager.is_connected(socket)
+    await manager.close()